@@ -0,0 +1,50 @@
+"""Shared bootstrap for the benchmark scripts in this directory.
+
+Run any benchmark from the project root, e.g. ``python benchmarks/bench_results.py``.
+The database comes from the usual settings (``USE_SQLITE``/``DATABASE_URL``/Postgres
+env vars); a throwaway test database is created and destroyed around the run.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'engauge.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if connection.vendor == 'sqlite':
+        # The historical migrations contain Postgres-only SQL; build the schema from the models.
+        settings.MIGRATION_MODULES = {'polls': None}
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def timed(fn, repeat=5):
+    """Return (best wall time in ms, result of the last call)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
@@ -0,0 +1,80 @@
+"""Coverage and latency of chunked generation as documents grow.
+
+Runs against the fake Groq server from ``bench_llm_concurrency``; here it
+answers with one question per ``[page N]`` marker it sees in the material, so
+the number of distinct pages with a question measures coverage. For each
+document size the single-prompt mode (``generate_all_from_text``, first 12k
+characters only) is compared with ``generate_chunked_from_text``.
+
+Usage: python benchmarks/bench_chunked_generation.py [--latency 0.3] [--in-flight 4]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_llm_concurrency import FakeGroq  # noqa: E402
+from polls import llm_client  # noqa: E402
+from polls.utils import PAGE_BREAK  # noqa: E402
+
+PAGE = '[page {n}] ' + 'Cellular respiration releases energy stored in glucose. ' * 40
+
+
+class PageAwareGroq(FakeGroq):
+    def reply(self, prompt):
+        pages = re.findall(r'\[page (\d+)\]', prompt)
+        if 'exit ticket' in prompt:
+            return json.dumps([{'text': f'Reflect on page {pages[0]}'}])
+        # a question per page (up to the requested count) plus a generic one every chunk repeats
+        n = int(re.search(r'up to (\d+)', prompt).group(1))
+        items = [{'text': f'What does page {p} explain?', 'choices': ['a', 'b', 'c', 'd']} for p in pages[::max(1, len(pages) // n)][:n]]
+        items.append({'text': 'What is the main idea of this lecture?', 'choices': ['a', 'b', 'c', 'd']})
+        return json.dumps(items)
+
+
+def run(fn, text):
+    start = time.perf_counter()
+    questions, _, _ = fn(text)
+    elapsed = (time.perf_counter() - start) * 1000
+    covered = {m for q in questions for m in re.findall(r'page (\d+)', q['text'])}
+    return elapsed, len(questions), len(covered)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--in-flight', type=int, default=4)
+    args = parser.parse_args()
+
+    PageAwareGroq.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageAwareGroq)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'GROQ_API_KEY': 'fake-key',
+        'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+        'GROQ_RATE_LIMIT': '0',  # measure generation, not the rate limiter (bench_llm_guard.py)
+        'GROQ_MAX_CONCURRENT': '0',
+        'GROQ_MAX_IN_FLIGHT': str(args.in_flight),
+    })
+
+    print(f'fake server latency: {args.latency * 1000:.0f} ms, {args.in_flight} chunk requests in flight')
+    print(f"{'pages':>6}{'chunks':>8}{'mode':>10}{'ms':>8}{'questions':>11}{'pages covered':>15}")
+    modes = (('single', lambda t: llm_client.generate_all_from_text(t)),
+             ('chunked', lambda t: llm_client.generate_chunked_from_text(t)))
+    for pages in (10, 40, 80, 160):
+        text = PAGE_BREAK.join(PAGE.format(n=i + 1) for i in range(pages))
+        chunks = len(llm_client.split_into_chunks(text))
+        for mode, fn in modes:
+            ms, n, covered = run(fn, text)
+            print(f'{pages:>6}{chunks:>8}{mode:>10}{ms:>8.0f}{n:>11}{covered:>15}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Peak memory and throughput of the course export in each format.
+
+Loads a course with ``--polls`` polls (formats in rotation) and ``--tickets``
+exit tickets, ``--responses`` responses each, then drains every exporter and
+reports its peak Python memory (tracemalloc), time and output size. Parquet is
+skipped when pyarrow is not installed.
+
+Usage: python benchmarks/bench_course_export.py [--polls 40] [--tickets 10] [--responses 5000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from _setup import setup_django, test_database
+
+setup_django()
+
+FORMATS = ('single_choice', 'speed_ranking', 'team_battle', 'meta_prediction')
+
+
+def vote(fmt, rng):
+    if fmt == 'single_choice':
+        return rng.randrange(4)
+    if fmt == 'speed_ranking':
+        return rng.sample(range(4), 4)
+    if fmt == 'team_battle':
+        return {'team': rng.choice(('left', 'right')), 'answer': rng.randrange(4)}
+    return {'predictions': [40, 30, 20, 10], 'answer': rng.randrange(4)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--polls', type=int, default=40)
+    parser.add_argument('--tickets', type=int, default=10)
+    parser.add_argument('--responses', type=int, default=5000)
+    args = parser.parse_args()
+
+    from django.contrib.auth.models import User
+    from polls import course_export
+    from polls.models import Course, ExitTicket, ExitTicketResponse, Poll, PollResponse
+
+    with test_database() as connection:
+        rng = random.Random(7)
+        prof = User.objects.create_user('prof')
+        course = Course.objects.create(name='Semester', created_by=prof, join_code='SEMESTER')
+        for i in range(args.polls):
+            fmt = FORMATS[i % len(FORMATS)]
+            poll = Poll.objects.create(question_text=f'Question {i}', choices=['a', 'b', 'c', 'd'],
+                                       question_format=fmt, correct_answer=1, course=course)
+            PollResponse.objects.bulk_create(
+                [PollResponse.from_choice(vote(fmt, rng), poll=poll) for _ in range(args.responses)], batch_size=5000)
+        for i in range(args.tickets):
+            ticket = ExitTicket.objects.create(prompt_text=f'Ticket {i}', course=course)
+            ExitTicketResponse.objects.bulk_create(
+                [ExitTicketResponse(ticket=ticket, answer='The light reactions ' * 5) for _ in range(args.responses)],
+                batch_size=5000)
+        rows = (args.polls + args.tickets) * args.responses
+        print(f'backend: {connection.vendor}, rows: {rows}, chunk size: {course_export.CHUNK_SIZE}')
+        print(f"{'format':<10}{'peak MiB':>10}{'seconds':>10}{'rows/s':>10}{'output MiB':>12}")
+        for fmt in course_export.EXPORTERS:
+            try:
+                chunks = course_export.export(course, fmt)
+            except course_export.ExportUnavailable as e:
+                print(f'{fmt:<10}  skipped: {e}')
+                continue
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in chunks)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+            print(f'{fmt:<10}{peak:>10.1f}{elapsed:>10.1f}{rows / elapsed:>10.0f}{size / 1024 / 1024:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""``poll_vote`` request latency with and without the production connection profile.
+
+Each of ``--threads`` worker threads (like gunicorn gthread workers) sends
+``--requests`` votes in total straight through Django's WSGI handler, so
+``request_started``/``request_finished`` open and close connections exactly as
+in production. Modes:
+
+* per-request: no profile (CONN_MAX_AGE=0, a new connection per request)
+* persistent:  CONN_MAX_AGE=60 with health checks
+* pool:        psycopg connection pool (only when psycopg 3 + psycopg_pool and Django >= 5.1)
+
+Meant for a local Postgres (``POSTGRES_*`` or ``DATABASE_URL``). Under SQLite,
+opening a connection is cheap, so the gap is much smaller.
+
+Usage: python benchmarks/bench_db_connections.py [--threads 8] [--requests 2000]
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from _setup import setup_django, test_database
+
+setup_django()
+
+TOKEN = 'x' * 32  # an unmasked CSRF secret, sent as both cookie and form field
+
+
+def vote_environ(poll_id):
+    body = urlencode({'csrfmiddlewaretoken': TOKEN, 'choice': 1}).encode()
+    return {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': f'/poll/{poll_id}/vote/', 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': f'csrftoken={TOKEN}', 'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http',
+        'wsgi.errors': io.StringIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+
+
+def run(mode, app, poll_id, threads, requests):
+    from django.db import connections
+    latencies, statuses = [], []
+
+    def worker(n):
+        for _ in range(n):
+            start = time.perf_counter()
+            response = app(vote_environ(poll_id), lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()  # fires request_finished, which closes or keeps the connection
+            latencies.append((time.perf_counter() - start) * 1000)
+        connections.close_all()
+
+    pool = [threading.Thread(target=worker, args=(requests // threads,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    ok = sum(1 for s in statuses if s.startswith('302'))
+    print(f'{mode:<13}{statistics.median(latencies):>9.2f}{latencies[int(len(latencies) * 0.99)]:>9.2f}'
+          f'{len(latencies) / elapsed:>10.0f}{ok:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+    from polls.models import Poll
+
+    tmp = tempfile.TemporaryDirectory()
+    db = settings.DATABASES['default']
+    if db['ENGINE'].endswith('sqlite3'):
+        # a file: the shared in-memory test database does not survive connections closing
+        db['TEST']['NAME'] = os.path.join(tmp.name, 'bench.sqlite3')
+        db.setdefault('OPTIONS', {})['timeout'] = 30
+    with tmp, test_database() as connection:
+        settings_dict = connections.settings['default']
+        poll = Poll.objects.create(question_text='Q?', choices=['a', 'b', 'c'], question_format='single_choice',
+                                   active=True)
+        app = get_wsgi_application()
+        modes = [('per-request', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}, {}),
+                 ('persistent', {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}, {})]
+        try:
+            import psycopg_pool  # noqa: F401
+            if connection.vendor == 'postgresql' and django.VERSION >= (5, 1):
+                modes.append(('pool', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True}, {'pool': True}))
+        except ImportError:
+            pass
+
+        print(f'backend: {connection.vendor}, threads: {args.threads}, requests: {args.requests}')
+        print(f"{'mode':<13}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>10}{'ok':>8}")
+        for mode, conn_settings, options in modes:
+            # worker threads build their connections from these settings
+            settings_dict.update(conn_settings)
+            settings_dict['OPTIONS'] = {**settings_dict.get('OPTIONS', {}), **options}
+            run(mode, app, poll.id, args.threads, args.requests)
+            settings_dict['OPTIONS'].pop('pool', None)
+
+
+if __name__ == '__main__':
+    main()
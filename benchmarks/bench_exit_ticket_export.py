@@ -0,0 +1,86 @@
+"""Exit-ticket response paging and export on a large ticket.
+
+Loads ``--rows`` responses for one ticket, then reports:
+
+* page time at increasing depth, OFFSET paging vs the keyset cursor
+* peak Python memory (tracemalloc) to export every response as CSV and NDJSON,
+  vs building the whole list in memory first
+
+Usage: python benchmarks/bench_exit_ticket_export.py [--rows 50000]
+"""
+import argparse
+import csv
+import io
+import tracemalloc
+from datetime import timedelta
+
+from _setup import setup_django, test_database, timed
+
+setup_django()
+
+
+def peak_mib(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50_000)
+    args = parser.parse_args()
+
+    from django.utils import timezone
+    from polls import exit_tickets
+    from polls.models import ExitTicket, ExitTicketResponse
+
+    with test_database() as connection:
+        ticket = ExitTicket.objects.create(prompt_text='What was the muddiest point today?')
+        now = timezone.now()
+        for start in range(0, args.rows, 10_000):
+            ExitTicketResponse.objects.bulk_create([
+                ExitTicketResponse(ticket=ticket, answer=f'Answer {i}: ' + 'the Calvin cycle ' * 8,
+                                   created_at=now - timedelta(seconds=i))
+                for i in range(start, min(args.rows, start + 10_000))
+            ])
+        size = exit_tickets.PAGE_SIZE
+        print(f'backend: {connection.vendor}, rows: {args.rows}, page size: {size}')
+
+        print(f"{'page':>8}{'offset ms':>12}{'keyset ms':>12}")
+        rows = ticket.responses.order_by('-created_at', '-id')
+        cursor, depth = None, 0
+        for target in (1, 10, 50, args.rows // size):
+            while depth < target - 1:  # walk the cursor to the page before ``target``
+                _, cursor = exit_tickets.response_page(ticket, cursor)
+                depth += 1
+            offset_ms, _ = timed(lambda: list(rows[(target - 1) * size:target * size]))
+            keyset_ms, _ = timed(lambda: exit_tickets.response_page(ticket, cursor))
+            print(f'{target:>8}{offset_ms:>12.2f}{keyset_ms:>12.2f}')
+
+        def drain(export):
+            for _ in export(ticket):
+                pass
+
+        def list_then_csv():
+            # the naive export: load every row, then build the whole file
+            out = io.StringIO()
+            writer = csv.writer(out)
+            for r in list(ticket.responses.order_by('created_at', 'id')):
+                writer.writerow((r.id, r.created_at.isoformat(), r.answer))
+            return out.getvalue()
+
+        print(f"{'export':<20}{'peak MiB':>10}{'ms':>10}")
+        for label, fn in (
+            ('list then CSV', list_then_csv),
+            ('streamed CSV', lambda: drain(exit_tickets.export_csv)),
+            ('streamed NDJSON', lambda: drain(exit_tickets.export_ndjson)),
+        ):
+            ms, _ = timed(fn, repeat=1)
+            print(f'{label:<20}{peak_mib(fn):>10.1f}{ms:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Full versus budgeted text extraction on synthetic large PDF and PPTX files.
+
+Generates a ``--pages``-page PDF and a slide deck of the same length, then
+measures wall time and peak Python memory (tracemalloc) for:
+
+* full:     ``extract_text_from_file(path)`` (what uploads used to do)
+* budgeted: ``extract_text_from_file(path, max_chars=MATERIAL_CHAR_LIMIT)``
+* parallel: full extraction on a process pool of ``--workers`` (peak memory
+  covers the parent process only)
+
+Usage: python benchmarks/bench_extraction.py [--pages 300] [--workers 4] [--no-trace]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polls.llm_client import MATERIAL_CHAR_LIMIT  # noqa: E402
+from polls.utils import extract_text_from_file  # noqa: E402
+
+LINE = 'Lecture {page}: the mitochondria converts nutrients into ATP through cellular respiration, line {line}.'
+
+
+def write_pdf(path, pages, lines_per_page=40):
+    """Write a minimal multi-page PDF with Helvetica text (no external dependencies)."""
+    objects = {1: b'<< /Type /Catalog /Pages 2 0 R >>', 3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'}
+    kids = []
+    for p in range(pages):
+        page_id, content_id = 4 + 2 * p, 5 + 2 * p
+        kids.append(f'{page_id} 0 R')
+        body = ['BT /F1 10 Tf 12 TL 40 800 Td']
+        body += [f'({LINE.format(page=p + 1, line=i + 1)}) Tj T*' for i in range(lines_per_page)]
+        stream = ('\n'.join(body) + '\nET').encode()
+        objects[page_id] = (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] '
+                            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>').encode()
+        objects[content_id] = b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream)
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {pages} >>'.encode()
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b'%d 0 obj\n%s\nendobj\n' % (num, objects[num])
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offsets[num] for num in sorted(objects))
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def write_pptx(path, slides, lines_per_slide=12):
+    from pptx import Presentation
+    from pptx.util import Inches
+    prs = Presentation()
+    for s in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6))
+        box.text_frame.text = '\n'.join(LINE.format(page=s + 1, line=i + 1) for i in range(lines_per_slide))
+    prs.save(path)
+
+
+def measure(path, trace, **kwargs):
+    # tracemalloc slows pdfminer down a lot; --no-trace gives realistic timings
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    text = extract_text_from_file(path, **kwargs)
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--no-trace', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {'pdf': os.path.join(tmp, 'deck.pdf'), 'pptx': os.path.join(tmp, 'deck.pptx')}
+        write_pdf(files['pdf'], args.pages)
+        write_pptx(files['pptx'], args.pages)
+        print(f'{args.pages} pages/slides, budget {MATERIAL_CHAR_LIMIT} chars, {args.workers} workers')
+        print(f"{'file':<6}{'mode':<10}{'ms':>10}{'peak MiB':>10}{'chars':>10}")
+        modes = (('full', {}), ('budgeted', {'max_chars': MATERIAL_CHAR_LIMIT}),
+                 ('parallel', {'workers': args.workers, 'min_parallel_pages': 1}))
+        for kind, path in files.items():
+            for mode, kwargs in modes:
+                ms, mib, chars = measure(path, not args.no_trace, **kwargs)
+                print(f'{kind:<6}{mode:<10}{ms:>10.0f}{mib:>10.1f}{chars:>10}')
+
+
+if __name__ == '__main__':
+    main()
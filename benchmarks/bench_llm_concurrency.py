@@ -0,0 +1,128 @@
+"""Upload generation latency against a local fake Groq server.
+
+The fake server answers ``/openai/v1/chat/completions`` after ``--latency``
+seconds and counts TCP connections. Each scenario is run three ways:
+
+* legacy:     a new Groq client per call, MCQs then exit tickets (the old upload flow)
+* pooled:     the shared client, still one generation after the other
+* concurrent: ``generate_all_from_text`` (shared client, both prompts in parallel)
+
+The "primary down" scenario makes the primary model fail (HTTP 404 after the
+same latency) so the fallback chain is exercised; it is also run with
+``GROQ_RACE_FALLBACKS=1``.
+
+Usage: python benchmarks/bench_llm_concurrency.py [--latency 0.3] [--uploads 5]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polls import llm_client  # noqa: E402
+
+MCQ_JSON = json.dumps([{'text': f'Question {i}?', 'choices': ['a', 'b', 'c', 'd']} for i in range(6)])
+EXIT_JSON = json.dumps([{'text': f'Prompt {i}'} for i in range(3)])
+
+
+class FakeGroq(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    latency = 0.3
+    failing_models = set()
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeGroq.lock:
+            FakeGroq.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, prompt):
+        return EXIT_JSON if 'exit ticket' in prompt else MCQ_JSON
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.latency)
+        if body['model'] in self.failing_models:
+            payload, status = {'error': {'message': 'model not found', 'type': 'invalid_request_error'}}, 404
+        else:
+            content = self.reply(body['messages'][1]['content'])
+            payload, status = {
+                'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            }, 200
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def legacy_generate(text):
+    """Old upload flow: a fresh client for each generator, run back to back."""
+    llm_client._clients.clear()
+    llm_client.generate_questions_from_text(text)
+    llm_client._clients.clear()
+    llm_client.generate_exit_tickets_from_text(text)
+
+
+def pooled_generate(text):
+    llm_client.generate_questions_from_text(text)
+    llm_client.generate_exit_tickets_from_text(text)
+
+
+def concurrent_generate(text):
+    llm_client.generate_all_from_text(text)
+
+
+def measure(fn, uploads):
+    FakeGroq.connections = 0
+    start = time.perf_counter()
+    for _ in range(uploads):
+        fn('Photosynthesis converts light energy into chemical energy.')
+    return (time.perf_counter() - start) / uploads * 1000, FakeGroq.connections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--uploads', type=int, default=5)
+    args = parser.parse_args()
+
+    FakeGroq.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGroq)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'GROQ_API_KEY': 'fake-key',
+        'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+        'GROQ_RATE_LIMIT': '0',  # measure generation, not the rate limiter (bench_llm_guard.py)
+        'GROQ_MAX_CONCURRENT': '0',
+        'GROQ_MODEL': 'primary-model',
+        'GROQ_FALLBACK_MODEL': 'fallback-model',
+    })
+
+    print(f'fake server latency: {args.latency * 1000:.0f} ms, {args.uploads} uploads per row')
+    print(f"{'scenario':<22}{'mode':<12}{'ms/upload':>10}{'connections':>13}")
+    scenarios = [('healthy', set(), '0'), ('primary down', {'primary-model'}, '0'),
+                 ('primary down, race', {'primary-model'}, '1')]
+    for name, failing, race in scenarios:
+        FakeGroq.failing_models = failing
+        os.environ['GROQ_RACE_FALLBACKS'] = race
+        for mode, fn in (('legacy', legacy_generate), ('pooled', pooled_generate), ('concurrent', concurrent_generate)):
+            llm_client._clients.clear()
+            ms, conns = measure(fn, args.uploads)
+            print(f'{name:<22}{mode:<12}{ms:>10.0f}{conns:>13}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
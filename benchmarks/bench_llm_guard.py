@@ -0,0 +1,86 @@
+"""Uploads while the LLM provider is failing, with and without the circuit breaker.
+
+The fake server answers every request with ``--status`` (503, or 429 with a
+``Retry-After``) after ``--latency`` seconds, as an overloaded provider does.
+``--uploads`` generations run back to back and the table shows the time per
+upload and how many requests reached the server:
+
+* no breaker: every upload walks each prompt's whole model fallback chain
+* breaker:    after GROQ_BREAKER_THRESHOLD failures the rest go straight to
+              the mock content without touching the network
+
+Usage: python benchmarks/bench_llm_guard.py [--latency 0.5] [--uploads 20] [--status 503]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polls import llm_client, llm_guard  # noqa: E402
+
+
+class FailingGroq(BaseHTTPRequestHandler):
+    latency = 0.5
+    status = 503
+    requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        with FailingGroq.lock:
+            FailingGroq.requests += 1
+        time.sleep(self.latency)
+        data = json.dumps({'error': {'message': 'overloaded', 'type': 'server_error'}}).encode()
+        self.send_response(self.status)
+        if self.status == 429:
+            self.send_header('Retry-After', '0.2')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--uploads', type=int, default=20)
+    parser.add_argument('--status', type=int, default=503)
+    args = parser.parse_args()
+
+    FailingGroq.latency, FailingGroq.status = args.latency, args.status
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FailingGroq)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'GROQ_API_KEY': 'fake-key',
+        'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+        'GROQ_MODEL': 'primary-model',
+        'GROQ_FALLBACK_MODEL': 'fallback-model',
+        'GROQ_RATE_LIMIT': '0',
+    })
+
+    print(f'fake server: HTTP {args.status} after {args.latency * 1000:.0f} ms, {args.uploads} uploads')
+    print(f"{'mode':<12}{'ms/upload':>10}{'requests':>10}{'mock uploads':>14}")
+    for mode, threshold in (('no breaker', '0'), ('breaker', '5')):
+        os.environ['GROQ_BREAKER_THRESHOLD'] = threshold
+        llm_guard.reset()
+        FailingGroq.requests = 0
+        mocked = 0
+        start = time.perf_counter()
+        for _ in range(args.uploads):
+            questions, _, _ = llm_client.generate_all_from_text('Photosynthesis converts light energy into chemical energy.')
+            mocked += questions == llm_client.MOCK_QUESTIONS
+        ms = (time.perf_counter() - start) / args.uploads * 1000
+        print(f'{mode:<12}{ms:>10.0f}{FailingGroq.requests:>10}{mocked:>14}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Tokens sent and generation latency with and without prompt packing.
+
+Synthetic lecture decks look like pdfminer output: a running header and a
+"Page N of M" footer on every page, a course boilerplate line repeated on
+each slide, runs of spaces and words hyphenated across line ends. Every page
+has one ``[page N]`` fact, so the number of distinct pages in the material
+measures how much of the deck the model sees.
+
+The fake Groq server from ``bench_llm_concurrency`` answers after
+``--latency`` seconds plus ``--ms-per-1k`` per thousand prompt tokens, a
+rough model of prefill time. Per document it compares:
+
+* blind:  the old path, the first 12k characters as they are (LLM_PROMPT_TOKENS=0)
+* packed: ``prompt_packing.prepare`` (clean, then pack into the budget)
+
+in single-prompt mode, and raw vs cleaned text in chunked mode.
+
+Usage: python benchmarks/bench_prompt_packing.py [--latency 0.2] [--ms-per-1k 150]
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_llm_concurrency import FakeGroq  # noqa: E402
+from polls import llm_client, prompt_packing  # noqa: E402
+from polls.utils import PAGE_BREAK  # noqa: E402
+
+PAGE = (
+    'BIO 101    Introduction to Cell Biology    Fall term\n'
+    'Lecture {lecture}:   Energy  in  the  cell\n\n'
+    '[page {n}] Enzyme E{n} catalyses step {n} of the metabolic path-\nway and is inhibited by its own product.\n'
+    'The reaction   releases energy that the cell stores as ATP\nfor later use.\n'
+    '{filler}'
+    'Questions? Post them on the course forum before Friday.\n'
+    '   Page {n} of {pages}   \n'
+)
+FILLER = 'Mitochondria produce most of the ATP through cellular respiration in stage {k}.\n'
+
+
+class TimedGroq(FakeGroq):
+    ms_per_1k = 150.0
+    sent = []
+
+    def reply(self, prompt):
+        tokens = prompt_packing.estimate_tokens(prompt)
+        with self.lock:
+            self.sent.append((tokens, set(re.findall(r'\[page (\d+)\]', prompt))))
+        time.sleep(tokens / 1000 * self.ms_per_1k / 1000)
+        return super().reply(prompt)
+
+
+def deck(pages):
+    return PAGE_BREAK.join(
+        PAGE.format(n=i + 1, pages=pages, lecture=4, filler=''.join(FILLER.format(k=k) for k in range(i % 3 + 2)))
+        for i in range(pages)
+    )
+
+
+def run(fn, text):
+    TimedGroq.sent = []
+    start = time.perf_counter()
+    fn(text)
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, sum(t for t, _ in TimedGroq.sent), len(TimedGroq.sent), len(set().union(*(p for _, p in TimedGroq.sent)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--ms-per-1k', type=float, default=150.0)
+    args = parser.parse_args()
+
+    TimedGroq.latency = args.latency
+    TimedGroq.ms_per_1k = args.ms_per_1k
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TimedGroq)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'GROQ_API_KEY': 'fake-key',
+        'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+        'GROQ_RATE_LIMIT': '0',  # measure generation, not the rate limiter (bench_llm_guard.py)
+        'GROQ_MAX_CONCURRENT': '0',
+    })
+    budget = int(os.getenv('LLM_PROMPT_TOKENS', str(llm_client.prompt_budget())))
+    window = 4 * budget * prompt_packing.CHARS_PER_TOKEN  # jobs.PACKING_WINDOW
+
+    run(llm_client.generate_all_from_text, 'warm-up')  # client and connection setup
+    print(f'fake server: {args.latency * 1000:.0f} ms + {args.ms_per_1k:.0f} ms per 1k prompt tokens, '
+          f'budget {budget} tokens')
+    print(f"{'pages':>6}{'mode':>9}{'path':>8}{'doc tokens':>12}{'sent tokens':>13}{'requests':>10}"
+          f"{'ms':>8}{'pages seen':>12}")
+    for pages in (3, 10, 40, 120):
+        text = deck(pages)
+        doc_tokens = prompt_packing.estimate_tokens(text)
+        for mode, generate in (('single', llm_client.generate_all_from_text),
+                               ('chunked', llm_client.generate_chunked_from_text)):
+            for path in ('blind', 'packed'):
+                if path == 'blind':
+                    os.environ['LLM_PROMPT_TOKENS'] = '0'
+                    material = text if mode == 'chunked' else text[:llm_client.MATERIAL_CHAR_LIMIT]
+                else:
+                    os.environ['LLM_PROMPT_TOKENS'] = str(budget)
+                    material = prompt_packing.prepare(
+                        text if mode == 'chunked' else text[:window], None if mode == 'chunked' else budget
+                    ).text
+                ms, sent, requests, seen = run(generate, material)
+                print(f'{pages:>6}{mode:>9}{path:>8}{doc_tokens:>12}{sent:>13}{requests:>10}{ms:>8.0f}{seen:>12}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Generation latency with two fake providers, fixed order vs latency-aware routing vs hedging.
+
+Provider ``a`` is listed first (as Groq is by default), ``b`` second:
+
+* degrading: ``a`` answers in 20 ms, then in 150 ms from a third of the way in;
+  ``b`` always takes 60 ms
+* tail: ``a`` answers in 20 ms but 5% of calls take 400 ms; ``b`` always takes 60 ms
+
+Modes:
+
+* fixed:  the stats are cleared before every generation, so ``a`` is always tried first
+* routed: ``providers.plan`` orders providers by their measured p50
+* hedged: routed, plus LLM_HEDGE=1 (a second request to ``b`` after ``a``'s p95)
+
+Usage: python benchmarks/bench_provider_routing.py [--generations 150]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polls import llm_client, providers  # noqa: E402
+
+ANSWER = providers.Completion(json.dumps([{'text': 'Q?', 'choices': ['a', 'b', 'c', 'd']}]))
+
+
+def fake(name, latency):
+    def complete(model, task):
+        time.sleep(latency())
+        return ANSWER
+
+    return providers.Provider(name=name, available=lambda: True, models=lambda task: [f'{name}-model'],
+                              complete=complete, stream=None)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--generations', type=int, default=150)
+    args = parser.parse_args()
+    os.environ['LLM_PROVIDERS'] = 'a,b'
+
+    print(f'{args.generations} generations per row')
+    print(f"{'scenario':<11}{'mode':<8}{'mean ms':>9}{'p50 ms':>8}{'p95 ms':>8}{'via b':>7}")
+    for scenario in ('degrading', 'tail'):
+        for mode in ('fixed', 'routed', 'hedged'):
+            rng = random.Random(7)
+            state = {'calls': 0}
+
+            def a_latency():
+                state['calls'] += 1
+                if scenario == 'degrading':
+                    return 0.15 if state['calls'] > args.generations // 3 else 0.02
+                return 0.4 if rng.random() < 0.05 else 0.02
+
+            providers.register(fake('a', a_latency))
+            providers.register(fake('b', lambda: 0.06))
+            os.environ['LLM_HEDGE'] = '1' if mode == 'hedged' else '0'
+            providers.reset()
+            times, via_b = [], 0
+            for _ in range(args.generations):
+                if mode == 'fixed':
+                    providers.reset()
+                start = time.perf_counter()
+                _, result = llm_client.generate_questions_from_text(
+                    'Photosynthesis converts light energy into chemical energy.')
+                times.append((time.perf_counter() - start) * 1000)
+                via_b += result.source == 'b'
+            print(f'{scenario:<11}{mode:<8}{sum(times) / len(times):>9.0f}{percentile(times, 0.5):>8.0f}'
+                  f'{percentile(times, 0.95):>8.0f}{via_b:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Near-duplicate lookup time as a course's generated questions grow.
+
+Indexes ``--sizes`` synthetic questions in one course, then times checking a
+batch of new questions (half of them light rewrites of stored ones) with the
+MinHash bucket index, and with a linear scan comparing word sets against every
+stored question. Reports the recall of the index against the scan.
+
+Usage: python benchmarks/bench_question_index.py [--sizes 1000 5000 20000]
+"""
+import argparse
+import random
+import re
+
+from _setup import setup_django, test_database, timed
+
+setup_django()
+
+def question(rng):
+    # short questions over a realistic vocabulary: a few common words plus topic words
+    words = [rng.choice(COMMON) for _ in range(3)] + [f'term{rng.randrange(3000)}' for _ in range(7)]
+    return 'Which ' + ' '.join(words) + '?'
+
+
+COMMON = ('role', 'process', 'stage', 'product', 'cell', 'energy', 'rate', 'factor', 'cause', 'effect')
+
+
+def rewrite(text, rng):
+    words = text.split()
+    words[rng.randrange(1, len(words))] = f'term{rng.randrange(3000)}'  # one word replaced
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--probes', type=int, default=40)
+    args = parser.parse_args()
+
+    from django.contrib.auth.models import User
+    from polls import question_index
+    from polls.models import Course, Document, GeneratedQuestion
+
+    def words(text):
+        return set(re.findall(r'[a-z0-9]+', text.lower()))
+
+    with test_database() as connection:
+        rng = random.Random(3)
+        course = Course.objects.create(name='Bio', created_by=User.objects.create_user('prof'), join_code='BIO')
+        doc = Document.objects.create(title='Deck', course=course)
+        stored = []
+        print(f'backend: {connection.vendor}, probes: {args.probes}')
+        print(f"{'questions':>10}{'index ms':>11}{'scan ms':>10}{'flagged':>9}{'recall':>8}")
+        for size in args.sizes:
+            new = [question(rng) for _ in range(size - len(stored))]
+            for start in range(0, len(new), 500):
+                question_index.add_questions(doc, [GeneratedQuestion(document=doc, text=t) for t in new[start:start + 500]])
+            stored.extend(new)
+            probes = [rewrite(rng.choice(stored), rng) if i % 2 else question(rng) for i in range(args.probes)]
+
+            def lookup():
+                found = 0
+                for text in probes:
+                    tokens = words(text)
+                    found += question_index.find_duplicate(course.id, tokens, question_index.buckets(tokens, 'mcq')) is not None
+                return found
+
+            def scan():
+                found = 0
+                for text in probes:
+                    w = words(text)
+                    rows = GeneratedQuestion.objects.filter(document__course=course).values_list('text', flat=True)
+                    found += any(len(w & o) >= 0.8 * len(w | o) for o in map(words, rows))
+                return found
+
+            index_ms, flagged = timed(lookup, repeat=3)
+            scan_ms, expected = timed(scan, repeat=1)
+            print(f'{size:>10}{index_ms / args.probes:>11.2f}{scan_ms / args.probes:>10.2f}{flagged:>9}'
+                  f'{flagged / expected if expected else 1:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Query count and latency of poll result aggregation versus response volume.
+
+Compares the previous per-row implementation of ``poll_results`` (one COUNT per
+choice, or every row loaded into Python) with ``polls.aggregation``'s single
+aggregate query and a plain ``.iterator()`` pass over every response.
+"""
+import random
+
+from _setup import setup_django, test_database, timed
+
+setup_django()
+
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+SIZES = (100, 1000, 10000)
+CHOICES = ['a', 'b', 'c', 'd']
+
+
+def legacy_tallies(poll):
+    """The aggregation that ``views.poll_results`` used to do inline."""
+    fmt = poll.question_format
+    if fmt == 'single_choice':
+        return [poll.responses.filter(answer=i).count() for i in range(len(poll.choices))]
+    rows = [r.value for r in poll.responses.all()]
+    return len(rows)
+
+
+def iterator_tallies(poll):
+    """Stream every response through ``add_response`` without grouping."""
+    from polls.aggregation import add_response, empty_tallies
+    from polls.models import PollResponse
+
+    tallies = empty_tallies(poll)
+    for values in poll.responses.values_list(*PollResponse.TYPED_FIELDS).iterator(chunk_size=2000):
+        add_response(poll, tallies, *values)
+    return tallies
+
+
+def make_choice(fmt):
+    if fmt == 'single_choice':
+        return random.randrange(4)
+    if fmt == 'speed_ranking':
+        order = list(range(4))
+        random.shuffle(order)
+        return order
+    if fmt == 'team_battle':
+        return {'team': random.choice(['left', 'right']), 'answer': random.randrange(4)}
+    return {'predictions': [25, 25, 25, 25], 'answer': random.randrange(4)}
+
+
+def main():
+    from polls.aggregation import compute_tallies
+    from polls.models import Poll, PollResponse
+
+    with test_database() as connection:
+        print(f'backend: {connection.vendor}')
+        print(f"{'format':<16}{'responses':>10}  {'legacy q/ms':>14}  {'aggregate q/ms':>16}  {'iterator q/ms':>15}")
+        for fmt in ('single_choice', 'speed_ranking', 'team_battle', 'meta_prediction'):
+            for n in SIZES:
+                poll = Poll.objects.create(question_text='bench', choices=CHOICES, question_format=fmt, correct_answer=1)
+                PollResponse.objects.bulk_create(
+                    [PollResponse.from_choice(make_choice(fmt), poll=poll) for _ in range(n)], batch_size=1000
+                )
+                cols = []
+                for fn in (legacy_tallies, compute_tallies, iterator_tallies):
+                    with CaptureQueriesContext(connection) as ctx:
+                        fn(poll)
+                    ms, _ = timed(lambda: fn(poll))
+                    cols.append(f'{len(ctx.captured_queries)} / {ms:.1f}')
+                print(f'{fmt:<16}{n:>10}  {cols[0]:>14}  {cols[1]:>16}  {cols[2]:>15}')
+
+
+if __name__ == '__main__':
+    main()
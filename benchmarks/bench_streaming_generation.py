@@ -0,0 +1,110 @@
+"""Time to the first generated question, streamed vs waiting for the whole completion.
+
+The fake server produces each generated item over ``--item-time`` seconds, as
+a model emitting tokens would: the streamed response sends it piece by piece,
+the blocking one answers once everything is generated. Reports the time until
+the first MCQ is available and until generation is complete.
+
+Usage: python benchmarks/bench_streaming_generation.py [--item-time 0.4] [--runs 3]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polls import llm_client  # noqa: E402
+
+MCQ = [{'text': f'Question {i} about the light reactions?', 'choices': ['a', 'b', 'c', 'd']} for i in range(6)]
+EXIT = [{'text': f'Prompt {i}'} for i in range(3)]
+
+
+class TokenGroq(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    item_time = 0.4
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        items = EXIT if 'exit ticket' in body['messages'][1]['content'] else MCQ
+        content = json.dumps(items)
+        if not body.get('stream'):
+            time.sleep(self.item_time * len(items))
+            data = json.dumps({
+                'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        pieces = [json.dumps(item) for item in items]
+        for i, piece in enumerate(pieces):
+            # ~8 tokens per item, each arriving item_time / 8 after the last
+            text = ('[' if i == 0 else ', ') + piece + (']' if i == len(pieces) - 1 else '')
+            step = -(-len(text) // 8)
+            for start in range(0, len(text), step):
+                time.sleep(self.item_time / 8)
+                chunk = {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                         'choices': [{'index': 0, 'delta': {'content': text[start:start + step]}, 'finish_reason': None}]}
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                self.wfile.flush()
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+def blocking():
+    start = time.perf_counter()
+    llm_client.generate_all_from_text('Photosynthesis converts light energy into chemical energy.')
+    total = time.perf_counter() - start
+    return total, total
+
+
+def streamed():
+    start = time.perf_counter()
+    first = None
+    for kind, _ in llm_client.stream_all_from_text('Photosynthesis converts light energy into chemical energy.'):
+        if kind == 'mcq' and first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--item-time', type=float, default=0.4)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    TokenGroq.item_time = args.item_time
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TokenGroq)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'GROQ_API_KEY': 'fake-key',
+        'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+        'GROQ_RATE_LIMIT': '0',
+    })
+
+    print(f'{args.item_time * 1000:.0f} ms per generated item, {len(MCQ)} MCQs + {len(EXIT)} exit tickets')
+    print(f"{'mode':<10}{'first MCQ ms':>14}{'complete ms':>13}")
+    for mode, fn in (('blocking', blocking), ('streamed', streamed)):
+        runs = [fn() for _ in range(args.runs)]
+        first = sum(r[0] for r in runs) / len(runs) * 1000
+        total = sum(r[1] for r in runs) / len(runs) * 1000
+        print(f'{mode:<10}{first:>14.0f}{total:>13.0f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
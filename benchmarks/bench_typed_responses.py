@@ -0,0 +1,122 @@
+"""Storage and aggregation time: JSON ``choice`` rows vs typed response columns.
+
+Loads ``--rows`` responses (split evenly over the four poll formats) in the old
+JSON-only shape with the old ``(poll, choice)`` index, measures them, converts
+them in place with the 0014 data migration, and measures again:
+
+* table MiB:  table plus index size (SQLite ``dbstat``, Postgres ``pg_total_relation_size``)
+* payload B:  average bytes per row of the vote columns
+* per-format: best-of-3 time to compute the tallies with one query
+
+Usage: python benchmarks/bench_typed_responses.py [--rows 1000000]
+"""
+import argparse
+import importlib
+import os
+import random
+import tempfile
+import time
+
+from _setup import setup_django, test_database, timed
+
+setup_django()
+
+FORMATS = ('single_choice', 'speed_ranking', 'team_battle', 'meta_prediction')
+CHOICES = ['a', 'b', 'c', 'd']
+
+
+def legacy_choice(fmt, rng):
+    if fmt == 'single_choice':
+        return rng.randrange(4)
+    if fmt == 'speed_ranking':
+        return rng.sample(range(4), 4)
+    if fmt == 'team_battle':
+        return {'team': rng.choice(('left', 'right')), 'answer': rng.randrange(4)}
+    split = [rng.randrange(0, 101, 5) for _ in range(3)]
+    return {'predictions': split + [max(0, 100 - sum(split))], 'answer': rng.randrange(4)}
+
+
+def legacy_tallies(poll):
+    """The pre-0014 aggregation: GROUP BY the JSON column, JSON-path sums for predictions."""
+    from django.db.models import Count, IntegerField, Q, Sum
+    from django.db.models.fields.json import KT
+    from django.db.models.functions import Cast
+    if poll.question_format != 'meta_prediction':
+        return list(poll.responses.order_by().values_list('choice').annotate(n=Count('id')))
+    aggs = {'total': Count('id')}
+    for i in range(len(CHOICES)):
+        aggs[f'a{i}'] = Count('id', filter=Q(choice__answer=i))
+        aggs[f'p{i}'] = Sum(Cast(KT(f'choice__predictions__{i}'), IntegerField()))
+    return poll.responses.aggregate(**aggs)
+
+
+def table_size(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+            cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                           "(SELECT name FROM sqlite_master WHERE tbl_name = 'polls_pollresponse')")
+        else:
+            cursor.execute('VACUUM FULL polls_pollresponse')
+            cursor.execute("SELECT pg_total_relation_size('polls_pollresponse')")
+        return cursor.fetchone()[0] / 1024 / 1024
+
+
+def payload_bytes(connection, columns):
+    size = 'length({})' if connection.vendor == 'sqlite' else 'pg_column_size({})'
+    expr = ' + '.join(f'COALESCE({size.format(c)}, 0)' for c in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT AVG({expr}) FROM polls_pollresponse')
+        return float(cursor.fetchone()[0])
+
+
+def report(label, connection, polls, columns, aggregate):
+    times = [timed(lambda p=p: aggregate(p), repeat=3)[0] for p in polls]
+    print(f'{label:<8}{table_size(connection):>11.1f}{payload_bytes(connection, columns):>11.1f}'
+          + ''.join(f'{ms:>17.1f}' for ms in times))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    from django.apps import apps
+    from django.conf import settings
+    from polls.aggregation import compute_tallies
+    from polls.models import Poll, PollResponse
+
+    migration = importlib.import_module('polls.migrations.0014_typed_poll_responses')
+    with tempfile.TemporaryDirectory() as tmp:
+        db = settings.DATABASES['default']
+        if db['ENGINE'].endswith('sqlite3'):
+            db['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')  # on disk, so sizes are real
+        with test_database() as connection:
+            rng = random.Random(42)
+            polls = [Poll.objects.create(question_text=fmt, choices=CHOICES, question_format=fmt, correct_answer=1)
+                     for fmt in FORMATS]
+            per_poll = args.rows // len(polls)
+            for poll in polls:
+                for start in range(0, per_poll, 10_000):
+                    PollResponse.objects.bulk_create([
+                        PollResponse(poll=poll, choice=legacy_choice(poll.question_format, rng))
+                        for _ in range(min(10_000, per_poll - start))
+                    ])
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE INDEX legacy_poll_choice ON polls_pollresponse (poll_id, choice)')
+
+            print(f'backend: {connection.vendor}, rows: {per_poll * len(polls)}')
+            print(f"{'layout':<8}{'table MiB':>11}{'payload B':>11}" + ''.join(f'{fmt:>17}' for fmt in FORMATS))
+            report('json', connection, polls, ['choice'], legacy_tallies)
+
+            start = time.perf_counter()
+            migration.to_typed_columns(apps, connection.schema_editor())
+            migrated = time.perf_counter() - start
+            with connection.cursor() as cursor:
+                cursor.execute('DROP INDEX legacy_poll_choice')
+            report('typed', connection, polls, ['answer', 'team', 'ranking', 'predictions', 'choice'], compute_tallies)
+            print(f'data migration: {migrated:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Vote throughput under concurrent load: direct vs buffered ingestion.
+
+``--clients`` threads post ``--votes`` team-battle votes in total through the
+full Django stack (test client, so middleware and ``poll_vote`` run as in
+production). Reported per mode:
+
+* acked/s:  votes acknowledged per second (what students experience)
+* stored/s: votes durably stored per second, including the final flush
+* p99 ms:   99th percentile latency of a vote request
+
+Runs against whatever database the settings select: SQLite by default with
+``USE_SQLITE=1``, Postgres via ``DATABASE_URL``/``POSTGRES_*``.
+
+Usage: python benchmarks/bench_vote_ingest.py [--clients 16] [--votes 2000]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from _setup import setup_django, test_database
+
+setup_django()
+
+
+def p99(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))] if values else 0.0
+
+
+def run(mode, clients, votes):
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from polls import ingest
+    from polls.aggregation import compute_tallies
+    from polls.models import Poll
+    from polls.tallies import read_tallies
+
+    settings.VOTE_INGEST_MODE = mode
+    poll = Poll.objects.create(question_text='Which?', choices=['a', 'b', 'c', 'd'],
+                               question_format='team_battle', correct_answer=1, active=True)
+    latencies = []
+    errors = []
+
+    def student(n):
+        client = Client()
+        url = f'/poll/{poll.id}/vote/'
+        for i in range(n):
+            start = time.perf_counter()
+            try:
+                client.post(url, {'team_side': 'left' if i % 2 else 'right', 'answer_choice': i % 4})
+            except Exception as e:
+                errors.append(e)
+            latencies.append((time.perf_counter() - start) * 1000)
+        connection.close()
+
+    per_client = votes // clients
+    threads = [threading.Thread(target=student, args=(per_client,)) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    acked = time.perf_counter() - start
+    ingest.flush()
+    stored = time.perf_counter() - start
+
+    poll.refresh_from_db()
+    total = poll.responses.count()
+    consistent = read_tallies(poll) == compute_tallies(poll)
+    print(f'{mode:<10}{total / acked:>10.0f}{total / stored:>10.0f}{p99(latencies):>10.1f}'
+          f'{total:>8}{len(errors):>8}{str(consistent):>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--votes', type=int, default=2000)
+    args = parser.parse_args()
+
+    from django.conf import settings
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.VOTE_BUFFER_INTERVAL = 0.2
+    with tempfile.TemporaryDirectory() as tmp:
+        db = settings.DATABASES['default']
+        if db['ENGINE'].endswith('sqlite3'):
+            # a file, not the shared in-memory database, so concurrent writers behave as in production
+            db['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            db.setdefault('OPTIONS', {})['timeout'] = 30
+        with test_database() as connection:
+            print(f'backend: {connection.vendor}, clients: {args.clients}, votes: {args.votes}, '
+                  f'buffer: {settings.VOTE_BUFFER_SIZE} votes / {settings.VOTE_BUFFER_INTERVAL}s')
+            print(f"{'mode':<10}{'acked/s':>10}{'stored/s':>10}{'p99 ms':>10}{'votes':>8}{'errors':>8}{'consistent':>12}")
+            for mode in ('direct', 'buffered'):
+                run(mode, args.clients, args.votes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Load test: students waiting for a speed-ranking countdown.
+
+Serves the app from a local threaded WSGI server and simulates ``--students``
+clients sitting on the waiting screen for ``--wait`` seconds before the
+instructor starts the countdown. Compares the old 2-second ``location.reload()``
+loop with long-polling ``poll_state``:
+
+* requests: total HTTP requests the server handled while students waited
+* page p99: 99th percentile latency of full ``poll_display`` renders
+* notify p99: 99th percentile delay between start_countdown and the client noticing
+
+Usage: python benchmarks/load_poll_state.py [--students 100] [--wait 6]
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import urllib.request
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from _setup import setup_django, test_database
+
+setup_django()
+
+
+class _ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def p99(values):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))]
+
+
+def fetch(url, stats):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=60) as resp:
+        body = resp.read()
+    stats['requests'] += 1
+    return body, (time.perf_counter() - start) * 1000
+
+
+def reload_student(base, poll_id, started, stats):
+    while True:
+        body, ms = fetch(f'{base}/poll/{poll_id}/', stats)
+        stats['page_ms'].append(ms)
+        if b'countdownNumber' in body:
+            stats['notify_ms'].append((time.perf_counter() - started['at']) * 1000)
+            return
+        time.sleep(2)
+
+
+def longpoll_student(base, poll_id, started, stats):
+    body, ms = fetch(f'{base}/poll/{poll_id}/', stats)
+    stats['page_ms'].append(ms)
+    # the waiting page embeds the current state version, as in poll_display.html
+    version = re.search(rb'\}\)\("([^"]*)"\);', body).group(1).decode()
+    while True:
+        state, _ = fetch(f'{base}/poll/{poll_id}/state/?wait=1&since={version}', stats)
+        state = json.loads(state)
+        if state['countdown_started']:
+            body, ms = fetch(f'{base}/poll/{poll_id}/', stats)
+            stats['page_ms'].append(ms)
+            stats['notify_ms'].append((time.perf_counter() - started['at']) * 1000)
+            return
+        version = state['version']
+
+
+def run(mode, base, students, wait):
+    from django.utils import timezone
+    from polls.live import notify_changed
+    from polls.models import Poll
+
+    poll = Poll.objects.create(question_text='Rank these', choices=['a', 'b', 'c', 'd'],
+                               question_format='speed_ranking', active=True)
+    stats = {'requests': 0, 'page_ms': [], 'notify_ms': []}
+    started = {'at': None}
+    target = reload_student if mode == 'reload' else longpoll_student
+    threads = [threading.Thread(target=target, args=(base, poll.id, started, stats)) for _ in range(students)]
+    for t in threads:
+        t.start()
+        time.sleep(2.0 / students)  # spread arrivals over one reload period
+    time.sleep(wait)
+    waiting_requests = stats['requests']
+    started['at'] = time.perf_counter()
+    Poll.objects.filter(id=poll.id).update(countdown_started=True, countdown_start_time=timezone.now())
+    notify_changed(poll.id)
+    for t in threads:
+        t.join()
+    print(f"{mode:<10}{waiting_requests:>10}{waiting_requests / wait:>10.1f}"
+          f"{p99(stats['page_ms']):>12.1f}{p99(stats['notify_ms']):>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--wait', type=float, default=6.0)
+    args = parser.parse_args()
+
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    with test_database() as connection:
+        settings.LIVE_LONG_POLL_INTERVAL = 0.25
+        server = make_server('127.0.0.1', 0, get_wsgi_application(),
+                             server_class=_ThreadingServer, handler_class=_QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{server.server_port}'
+        print(f'backend: {connection.vendor}, students: {args.students}, waiting: {args.wait}s')
+        print(f"{'mode':<10}{'requests':>10}{'req/s':>10}{'page p99':>12}{'notify p99':>12}")
+        for mode in ('reload', 'longpoll'):
+            run(mode, base, args.students, args.wait)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -76,6 +76,36 @@ else:
         }
     }
 
+# Production connection profile (DB_PROFILE=production, Postgres only). Without it
+# every request opens and closes its own database connection.
+# - DB_POOL=auto (default) uses psycopg's connection pool when psycopg 3 with
+#   psycopg_pool is installed and Django >= 5.1; DB_POOL=1 requires it, DB_POOL=0 disables it.
+# - Otherwise connections persist per worker thread for DB_CONN_MAX_AGE seconds.
+# - DB_CONN_HEALTH_CHECKS=1 (default) checks a reused connection before the request uses it.
+if os.getenv('DB_PROFILE', 'default') == 'production' and DATABASES['default']['ENGINE'].endswith('postgresql'):
+    def _pool_available():
+        import django
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return django.VERSION >= (5, 1)
+
+    _db = DATABASES['default']
+    _pool = os.getenv('DB_POOL', 'auto')
+    if _pool == '1' or (_pool == 'auto' and _pool_available()):
+        # the pool hands out connections per request; persistent connections must stay off
+        _db['CONN_MAX_AGE'] = 0
+        _db.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }
+    else:
+        _db['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+    _db['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1'
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'en-us'
@@ -93,6 +123,87 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Uploaded documents are processed by `python manage.py process_documents`. Set
+# PROCESS_DOCUMENTS_INLINE=1 to process them inside the upload request instead
+# (handy for local development without a worker running).
+PROCESS_DOCUMENTS_INLINE = os.getenv('PROCESS_DOCUMENTS_INLINE', '0') == '1'
+# A document whose worker died mid-processing is requeued, but only until it has
+# been claimed this many times; after that it is marked failed, so a file that
+# crashes the worker is not retried forever.
+DOCUMENT_MAX_ATTEMPTS = int(os.getenv('DOCUMENT_MAX_ATTEMPTS', '3'))
+
+# Cache of extracted text and generated questions keyed by uploaded file content
+# (polls.content_cache). Least recently used entries are evicted past these limits.
+CONTENT_CACHE_MAX_BYTES = int(os.getenv('CONTENT_CACHE_MAX_MB', '500')) * 1024 * 1024
+CONTENT_CACHE_MAX_AGE_DAYS = int(os.getenv('CONTENT_CACHE_MAX_AGE_DAYS', '30'))
+
+# Full-text extraction of large PDFs/PPTX decks is split into page ranges parsed
+# on a process pool of EXTRACTION_WORKERS (default: all cores; 1 disables it) for
+# documents with at least EXTRACTION_PARALLEL_MIN_PAGES pages.
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '0')) or (os.cpu_count() or 1)
+EXTRACTION_PARALLEL_MIN_PAGES = int(os.getenv('EXTRACTION_PARALLEL_MIN_PAGES', '40'))
+
+# Generate questions from the whole document, chunk by chunk at page/slide boundaries,
+# instead of only its first 12k characters (see GROQ_MAX_CHUNKS / GROQ_MAX_IN_FLIGHT).
+CHUNKED_GENERATION = os.getenv('CHUNKED_GENERATION', '1') == '1'
+
+# Stream LLM completions and store each generated question as soon as its JSON object
+# closes, so the review page shows the first questions before the whole reply is in.
+STREAM_GENERATION = os.getenv('STREAM_GENERATION', '1') == '1'
+
+# Generated questions that nearly repeat an earlier one of the same course (MinHash
+# index, polls/question_index.py): 'flag' marks them on the review page, 'suppress'
+# drops them, 'off' stores them unchecked.
+QUESTION_DEDUP = os.getenv('QUESTION_DEDUP', 'flag')
+
+# Vote ingestion: 'direct' stores each vote in its request; 'buffered' batches them
+# in-process and flushes every VOTE_BUFFER_SIZE votes or VOTE_BUFFER_INTERVAL seconds
+# (see polls/ingest.py for the delivery guarantees).
+VOTE_INGEST_MODE = os.getenv('VOTE_INGEST_MODE', 'direct')
+VOTE_BUFFER_SIZE = int(os.getenv('VOTE_BUFFER_SIZE', '200'))
+VOTE_BUFFER_INTERVAL = float(os.getenv('VOTE_BUFFER_INTERVAL', '0.5'))
+# When flushes fail: a poll's batch is retried on VOTE_FLUSH_RETRIES flushes, then
+# written vote by vote (votes that still fail go to the polls.ingest.dead_letter
+# logger), and once VOTE_BUFFER_MAX votes are waiting new votes are written directly.
+VOTE_FLUSH_RETRIES = int(os.getenv('VOTE_FLUSH_RETRIES', '3'))
+VOTE_BUFFER_MAX = int(os.getenv('VOTE_BUFFER_MAX', '2000'))
+
+# Django's cache framework, selected by CACHE_BACKEND:
+#   locmem (default) - per process; tests and single-process runs
+#   file             - FileBasedCache in CACHE_DIR, shared by processes on one host
+#   redis            - shared by every process and host (CACHE_URL/REDIS_URL; needs `pip install redis`)
+# Poll rows for the student pages (polls/poll_cache.py) and the rows behind the
+# list pages (polls/view_cache.py) are cached here. With locmem, a change only reaches
+# the process that made it; the others catch up within the *_CACHE_TIMEOUT below.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'redis':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL') or os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+elif CACHE_BACKEND == 'file':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / 'cache')),
+    }
+else:
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'engauge',
+    }
+_cache['KEY_PREFIX'] = os.getenv('CACHE_KEY_PREFIX', 'engauge')
+CACHES = {'default': _cache}
+POLL_CACHE_TIMEOUT = int(os.getenv('POLL_CACHE_TIMEOUT', '60'))
+VIEW_CACHE_TIMEOUT = int(os.getenv('VIEW_CACHE_TIMEOUT', '300'))
+
+# Live updates: how long a long-poll request is held open, and how often it re-checks
+# the database for changes made by other worker processes (seconds; one query per
+# poll per process, shared by all its waiters). Long-polling holds a worker thread
+# per waiting client, so run gunicorn with threaded or async workers, e.g.
+# `gunicorn --worker-class gthread --threads 50 engauge.wsgi`.
+LIVE_LONG_POLL_TIMEOUT = float(os.getenv('LIVE_LONG_POLL_TIMEOUT', '25'))
+LIVE_LONG_POLL_INTERVAL = float(os.getenv('LIVE_LONG_POLL_INTERVAL', '1'))
+
 # Auth redirects
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
@@ -1,5 +1,73 @@
 from django.contrib import admin
-from .models import Document, GeneratedQuestion, Poll, PollResponse, ExitTicket, ExitTicketResponse, Course, Enrollment, Profile
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, router
+from django.utils.functional import cached_property
+
+from .models import (
+    Document, GeneratedQuestion, Poll, PollResponse, ExitTicket, ExitTicketResponse, Course, Enrollment, Profile,
+    ContentCacheEntry, ContentCacheStat,
+)
+
+
+def estimated_row_count(model):
+    """The database's own row estimate for ``model``'s table, or None when it has none.
+
+    Postgres keeps one in ``pg_class`` (refreshed by autovacuum/ANALYZE); SQLite
+    only after ``ANALYZE`` has filled ``sqlite_stat1``.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            else:
+                return None
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    counts = [int(str(row[0]).split()[0]) for row in rows if row[0] is not None]
+    return max(counts) if counts and max(counts) > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses the table's row estimate instead of COUNT(*) for unfiltered listings of large tables."""
+    # below this many rows an exact count is cheap enough
+    EXACT_BELOW = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate >= self.EXACT_BELOW:
+                return estimate
+        return super().count
+
+
+class HighVolumeAdmin(admin.ModelAdmin):
+    """Change list settings for tables with millions of rows.
+
+    Rows are listed newest first from the ``(created_at, id)`` indexes with their
+    parent joined in (``list_select_related``), pages are counted from the row
+    estimate, and the unfiltered total is not recounted on filtered pages.
+    Dates are narrowed with range filters on the indexed ``created_at`` rather
+    than ``date_hierarchy``, whose links come from a DISTINCT over every row.
+    There are no list filters on the parent or its course, which would render a
+    link per row of those tables on every page; ``url_lookups`` names the
+    filters that can still be applied from the URL (``?poll__course__id__exact=3``).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-created_at', '-id')
+    list_per_page = 50
+    date_filter = ('created_at', admin.DateFieldListFilter)
+    url_lookups = ()
+
+    def lookup_allowed(self, lookup, value, request=None):
+        return lookup in self.url_lookups or super().lookup_allowed(lookup, value, request)
 
 
 @admin.register(Document)
@@ -24,8 +92,12 @@ class PollAdmin(admin.ModelAdmin):
 
 
 @admin.register(PollResponse)
-class PollResponseAdmin(admin.ModelAdmin):
-    list_display = ('poll', 'choice', 'created_at')
+class PollResponseAdmin(HighVolumeAdmin):
+    list_display = ('poll', 'value', 'created_at')
+    list_select_related = ('poll',)
+    list_filter = (HighVolumeAdmin.date_filter,)
+    url_lookups = ('poll__course__id__exact',)
+    raw_id_fields = ('poll',)
 
 
 @admin.register(Course)
@@ -51,5 +123,21 @@ class ExitTicketAdmin(admin.ModelAdmin):
 
 
 @admin.register(ExitTicketResponse)
-class ExitTicketResponseAdmin(admin.ModelAdmin):
+class ExitTicketResponseAdmin(HighVolumeAdmin):
     list_display = ('ticket', 'created_at')
+    list_select_related = ('ticket',)
+    list_filter = (HighVolumeAdmin.date_filter,)
+    url_lookups = ('ticket__course__id__exact',)
+    raw_id_fields = ('ticket',)
+
+
+@admin.register(ContentCacheEntry)
+class ContentCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('key', 'kind', 'size', 'hits', 'last_used_at')
+    list_filter = ('kind',)
+    exclude = ('value',)
+
+
+@admin.register(ContentCacheStat)
+class ContentCacheStatAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'hits', 'misses')
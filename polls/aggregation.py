@@ -0,0 +1,229 @@
+from typing import Dict, List
+
+from django.db.models import Count
+from django.template.defaultfilters import pluralize
+
+from .models import PollResponse, unpack_predictions, unpack_ranking
+
+FORMATS = ('single_choice', 'speed_ranking', 'team_battle', 'meta_prediction')
+
+
+def empty_tallies(poll) -> Dict:
+    """Return zeroed tallies in the shape used for ``poll.question_format``."""
+    num_choices = len(poll.choices)
+    tallies: Dict = {'total': 0}
+    fmt = poll.question_format
+    if fmt == 'single_choice':
+        tallies['counts'] = [0] * num_choices
+    elif fmt == 'speed_ranking':
+        tallies['rank_counts'] = [[0] * num_choices for _ in range(num_choices)]
+    elif fmt == 'team_battle':
+        tallies.update(left_total=0, left_correct=0, right_total=0, right_correct=0)
+    elif fmt == 'meta_prediction':
+        tallies['actual_counts'] = [0] * num_choices
+        tallies['prediction_totals'] = [0] * num_choices
+    return tallies
+
+
+def add_response(poll, tallies: Dict, answer, team, ranking, predictions, weight: int = 1) -> None:
+    """Fold ``weight`` responses with these typed column values (``PollResponse.TYPED_FIELDS``) into ``tallies``."""
+    num_choices = len(poll.choices)
+    fmt = poll.question_format
+    tallies['total'] += weight
+    if fmt == 'single_choice':
+        if answer is not None and 0 <= answer < num_choices:
+            tallies['counts'][answer] += weight
+    elif fmt == 'speed_ranking':
+        for rank_pos, choice_idx in enumerate(unpack_ranking(ranking)[:num_choices]):
+            if choice_idx < num_choices:
+                tallies['rank_counts'][choice_idx][rank_pos] += weight
+    elif fmt == 'team_battle':
+        if team in ('left', 'right'):
+            tallies[f'{team}_total'] += weight
+            if poll.correct_answer is not None and answer == poll.correct_answer:
+                tallies[f'{team}_correct'] += weight
+    elif fmt == 'meta_prediction':
+        if answer is not None and 0 <= answer < num_choices:
+            tallies['actual_counts'][answer] += weight
+        for i, pred in enumerate(unpack_predictions(predictions)[:num_choices]):
+            tallies['prediction_totals'][i] += pred * weight
+
+
+# The typed columns each format is grouped on; the others are always empty for it
+GROUP_FIELDS = {
+    'single_choice': ('answer',),
+    'speed_ranking': ('ranking',),
+    'team_battle': ('team', 'answer'),
+}
+
+
+def _aggregate_in_db(poll) -> Dict:
+    """Compute the raw tallies for ``poll`` with a single query.
+
+    Responses are grouped on the format's typed columns, which take a handful of
+    distinct values per poll (answer index, team side, packed ranking), and the
+    groups are folded here. Single choice and team battle groups are read
+    straight from the ``(poll, answer)`` and ``(poll, team, answer)`` indexes.
+    Meta prediction responses carry a packed prediction vector that is nearly
+    unique per response, so grouping on it buys nothing; those are decoded in
+    one streaming pass over just the two columns instead.
+    """
+    tallies = empty_tallies(poll)
+    if poll.question_format == 'meta_prediction':
+        rows = poll.responses.order_by().values_list('answer', 'predictions').iterator(chunk_size=2000)
+        for answer, predictions in rows:
+            add_response(poll, tallies, answer, None, None, predictions)
+        return tallies
+    fields = GROUP_FIELDS[poll.question_format]
+    grouped = poll.responses.order_by().values_list(*fields).annotate(n=Count('*'))
+    for row in grouped:
+        values = dict(zip(fields, row))
+        add_response(poll, tallies, *(values.get(f) for f in PollResponse.TYPED_FIELDS), weight=row[-1])
+    return tallies
+
+
+def compute_tallies(poll) -> Dict:
+    """Return the raw per-format tallies for ``poll`` (one query)."""
+    if poll.question_format not in FORMATS:
+        return {'total': poll.responses.count()}
+    return _aggregate_in_db(poll)
+
+
+def build_results_context(poll, tallies: Dict) -> Dict:
+    """Turn raw tallies into the template context used by ``results.html``."""
+    total = tallies['total']
+    num_choices = len(poll.choices)
+    fmt = poll.question_format
+
+    if fmt == 'single_choice':
+        return {
+            'poll': poll,
+            'paired': list(zip(poll.choices, tallies['counts'])),
+            'total': total,
+            'format': 'single_choice',
+        }
+
+    if fmt == 'speed_ranking':
+        rank_counts = tallies['rank_counts']
+        results_data = []
+        for i, choice_text in enumerate(poll.choices):
+            # average rank (lower is better)
+            total_rank = sum((rank_pos + 1) * count for rank_pos, count in enumerate(rank_counts[i]))
+            avg_rank = total_rank / total if total > 0 else 0
+            results_data.append({
+                'choice': choice_text,
+                'rank_counts': rank_counts[i],
+                'avg_rank': round(avg_rank, 2),
+            })
+        return {
+            'poll': poll,
+            'results_data': results_data,
+            'total': total,
+            'format': 'speed_ranking',
+            'num_choices': num_choices,
+        }
+
+    if fmt == 'team_battle':
+        left_total, right_total = tallies['left_total'], tallies['right_total']
+        left_correct, right_correct = tallies['left_correct'], tallies['right_correct']
+        left_percentage = (left_correct / left_total * 100) if left_total > 0 else 0
+        right_percentage = (right_correct / right_total * 100) if right_total > 0 else 0
+        if left_percentage > right_percentage:
+            winner = 'left'
+        elif right_percentage > left_percentage:
+            winner = 'right'
+        else:
+            winner = 'tie'
+        return {
+            'poll': poll,
+            'left_count': left_total,
+            'right_count': right_total,
+            'left_correct': left_correct,
+            'right_correct': right_correct,
+            'left_percentage': round(left_percentage, 1),
+            'right_percentage': round(right_percentage, 1),
+            'total': total,
+            'winner': winner,
+            'format': 'team_battle',
+        }
+
+    if fmt == 'meta_prediction':
+        actual_counts = tallies['actual_counts']
+        avg_predictions = [
+            round(p / total, 1) if total > 0 else 0 for p in tallies['prediction_totals']
+        ]
+        actual_percentages = [
+            round((count / total * 100), 1) if total > 0 else 0 for count in actual_counts
+        ]
+        # prediction accuracy: 100 = perfect, 0 = way off
+        accuracy_scores: List[float] = [
+            round(max(0, 100 - abs(avg_predictions[i] - actual_percentages[i])), 1)
+            for i in range(num_choices)
+        ]
+        overall_accuracy = round(sum(accuracy_scores) / num_choices, 1) if num_choices > 0 else 0
+        results_data = []
+        for i in range(num_choices):
+            results_data.append({
+                'choice': poll.choices[i],
+                'predicted_pct': avg_predictions[i],
+                'actual_pct': actual_percentages[i],
+                'actual_count': actual_counts[i],
+                'accuracy': accuracy_scores[i],
+                'accuracy_grade': accuracy_grade(accuracy_scores[i]),
+            })
+        return {
+            'poll': poll,
+            'results_data': results_data,
+            'total': total,
+            'overall_accuracy': overall_accuracy,
+            'overall_grade': accuracy_grade(overall_accuracy),
+            'format': 'meta_prediction',
+        }
+
+    return {'poll': poll, 'total': 0}
+
+
+def accuracy_grade(accuracy: float) -> str:
+    """How ``results.html`` colours a meta prediction accuracy: ``high`` (80+), ``mid`` (60+) or ``low``."""
+    return 'high' if accuracy >= 80 else 'mid' if accuracy >= 60 else 'low'
+
+
+def _share(count: int, total: int) -> int:
+    # same rounding as the {% widthratio %} tag
+    return round(count / total * 100) if total > 0 else 0
+
+
+def live_values(context: Dict) -> Dict[str, str]:
+    """The values ``results.html`` derives from the counters, keyed by their ``data-derived`` names.
+
+    The results feed sends these alongside the raw counters so percentages,
+    average ranks and the winner update live with the counts. Values are
+    rendered as the template renders them.
+    """
+    fmt = context.get('format')
+    values: Dict[str, object] = {}
+    if fmt == 'single_choice':
+        for i, (_, count) in enumerate(context['paired']):
+            values[f'plural:{i}'] = pluralize(count)
+    elif fmt == 'speed_ranking':
+        for i, item in enumerate(context['results_data']):
+            values[f'avg_rank:{i}'] = item['avg_rank']
+    elif fmt == 'team_battle':
+        for side in ('left', 'right'):
+            count = context[f'{side}_count']
+            share = _share(count, context['total'])
+            values[f'{side}_plural'] = pluralize(count)
+            values[f'{side}_share'] = share
+            values[f'{side}_share_label'] = f'{share}%' if count > 0 else ''
+            values[f'{side}_percentage'] = context[f'{side}_percentage']
+        values['winner'] = context['winner']
+    elif fmt == 'meta_prediction':
+        for i, item in enumerate(context['results_data']):
+            values[f'plural:{i}'] = pluralize(item['actual_count'])
+            values[f'predicted_pct:{i}'] = item['predicted_pct']
+            values[f'actual_pct:{i}'] = item['actual_pct']
+            values[f'accuracy:{i}'] = item['accuracy']
+            values[f'accuracy_grade:{i}'] = accuracy_grade(item['accuracy'])
+        values['overall_accuracy'] = context['overall_accuracy']
+        values['overall_grade'] = accuracy_grade(context['overall_accuracy'])
+    return {name: str(value) for name, value in values.items()}
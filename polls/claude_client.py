@@ -1,117 +1,146 @@
+"""Anthropic (Claude) as an LLM provider.
+
+Uses the prompts, output parsing and mock content of ``llm_client``, and
+registers itself with ``providers`` so generation can be routed here when
+LLM_PROVIDERS includes ``anthropic``. Needs ``pip install anthropic`` and
+ANTHROPIC_API_KEY (or CLAUDE_API_KEY).
+"""
 import os
-import json
-import re
-from typing import List, Dict
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from . import llm_guard, providers
+from .llm_client import MOCK_QUESTIONS, GenerationResult, Task, mcq_task, parse_json_array
 
-import anthropic
+try:
+    import anthropic
+except Exception:
+    anthropic = None  # type: ignore
 
 
 DEFAULT_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-3-5-sonnet-latest')
-API_KEY = os.getenv('ANTHROPIC_API_KEY') or os.getenv('CLAUDE_API_KEY')
-
-
-MOCK_QUESTIONS: List[Dict] = [
-    {
-        'text': 'Which statement best describes formative assessment?',
-        'choices': [
-            'An evaluation at the end of a course to assign grades',
-            'A process to monitor learning and give feedback during instruction',
-            'A standardized test administered annually',
-            'An accreditation requirement for institutions',
-        ],
-    },
-    {
-        'text': 'In a multiple-choice question, what is the distractor?',
-        'choices': [
-            'The correct answer',
-            'Any incorrect option intended to mislead',
-            'The question stem',
-            'The explanation after submission',
-        ],
-    },
-    {
-        'text': 'Which Python library is commonly used to parse PDF text?',
-        'choices': [
-            'matplotlib',
-            'numpy',
-            'pdfminer.six',
-            'scikit-learn',
-        ],
-    },
-]
-
-
-def _extract_json_array(s: str) -> str | None:
-    if not s:
-        return None
-    # Try to find the first JSON array in the text
-    m = re.search(r"\[.*\]", s, flags=re.DOTALL)
-    return m.group(0) if m else None
-
-
-def _normalize_items(items: List[Dict]) -> List[Dict]:
-    out: List[Dict] = []
-    for it in items:
-        qtext = it.get('text') or it.get('question') or it.get('prompt')
-        choices = it.get('choices') or it.get('options') or []
-        if qtext and isinstance(choices, list):
-            # keep up to 4 choices; pad is not necessary
-            out.append({'text': str(qtext).strip(), 'choices': [str(c).strip() for c in choices[:4]]})
-    return out
-
-
-def generate_questions_from_text(text: str, max_questions: int = 6) -> List[Dict]:
-    """Create multiple-choice questions from text using Claude.
-
-    Returns a list of dicts with keys: text, choices (list[str]).
-    Falls back to a small mock set when the API key is missing or on errors.
-    """
-    if not API_KEY:
-        return MOCK_QUESTIONS[:max_questions]
 
-    client = anthropic.Anthropic(api_key=API_KEY)
 
-    system_msg = (
-        "You generate clear, concise multiple-choice questions from provided teaching materials. "
-        "Only output valid JSON as requested; do not include prose or markdown."
+def _get_api_key() -> str | None:
+    return os.getenv('ANTHROPIC_API_KEY') or os.getenv('CLAUDE_API_KEY')
+
+
+def _get_model() -> str:
+    return os.getenv('ANTHROPIC_MODEL', DEFAULT_MODEL)
+
+
+_client_lock = threading.Lock()
+_clients: Dict[str | None, 'anthropic.Anthropic'] = {}
+
+
+def _get_client():
+    """Return the process-wide Anthropic client for the current API key, as ``llm_client`` does for Groq."""
+    api_key = _get_api_key()
+    with _client_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # SDK retries would bypass the rate limiter and circuit breaker (see llm_guard)
+            client = anthropic.Anthropic(api_key=api_key, max_retries=int(os.getenv('ANTHROPIC_MAX_RETRIES', '0')))
+            _clients[api_key] = client
+        return client
+
+
+def _text(resp) -> str:
+    # Concatenate text blocks
+    parts = []
+    for block in getattr(resp, 'content', []) or []:
+        if getattr(block, 'type', None) == 'text':
+            parts.append(block.text)
+        elif isinstance(block, dict) and block.get('type') == 'text':
+            parts.append(block.get('text', ''))
+    return ''.join(parts)
+
+
+def _usage(usage) -> providers.Usage:
+    return providers.Usage(getattr(usage, 'input_tokens', 0) or 0, getattr(usage, 'output_tokens', 0) or 0)
+
+
+def complete(model: str, task: Task) -> providers.Completion:
+    """The Claude completion of ``task`` on ``model`` (the ``providers`` interface)."""
+    resp = _get_client().messages.create(
+        model=model,
+        max_tokens=task.max_tokens,
+        temperature=0.2,
+        system=task.system_msg,
+        messages=[{"role": "user", "content": task.user_prompt}],
     )
+    return providers.Completion(_text(resp), _usage(getattr(resp, 'usage', None)))
 
-    user_prompt = (
-        "From the material below, write up to {n} multiple-choice questions.\n"
-        "Each item must be a JSON object with keys: text (string), choices (array of exactly 4 strings).\n"
-        "Return a single JSON array only. No explanations.\n\n"
-        "MATERIAL:\n{material}"
-    ).format(n=max_questions, material=(text or '')[:12000])
 
+def stream(model: str, task: Task) -> Iterator:
+    events = _get_client().messages.create(
+        model=model,
+        max_tokens=task.max_tokens,
+        temperature=0.2,
+        system=task.system_msg,
+        messages=[{"role": "user", "content": task.user_prompt}],
+        stream=True,
+    )
+    usage = providers.Usage()
+    try:
+        for event in events:
+            kind = getattr(event, 'type', None)
+            if kind == 'content_block_delta':
+                text = getattr(event.delta, 'text', None)
+                if text:
+                    yield text
+            elif kind == 'message_start':
+                usage = _usage(getattr(event.message, 'usage', None))
+            elif kind == 'message_delta':
+                # the output count here is cumulative
+                usage = usage._replace(completion_tokens=getattr(event.usage, 'output_tokens', 0) or 0)
+        yield usage
+    finally:
+        close = getattr(events, 'close', None)
+        if close:
+            close()
+
+
+def _guarded(fn, *args, **kwargs):
+    return llm_guard.get('anthropic').call(fn, *args, **kwargs)
+
+
+providers.register(providers.Provider(
+    name='anthropic',
+    available=lambda: anthropic is not None and bool(_get_api_key()),
+    models=lambda task: [_get_model()],
+    complete=complete,
+    stream=stream,
+    guard=_guarded,
+    down=lambda: llm_guard.circuit_open('anthropic'),
+))
+
+
+def generate_questions_from_text(text: str, max_questions: int = 6) -> Tuple[List[Dict], GenerationResult]:
+    """Create multiple-choice questions from text using Claude only, without provider routing.
+
+    Returns ``(questions, result)`` like ``llm_client.generate_questions_from_text``;
+    each question is a dict with keys: text, choices (list[str]). Falls back to
+    a small mock set when the SDK or API key is missing or on errors.
+    """
+    started = time.monotonic()
+    if anthropic is None or not _get_api_key():
+        missing = 'ANTHROPIC_API_KEY' if anthropic is not None else 'the anthropic package'
+        return MOCK_QUESTIONS[:max_questions], GenerationResult('mock', errors=(f'Missing {missing}',))
+    model = _get_model()
+    task = mcq_task(text, max_questions)
+    usage = providers.Usage()
     try:
-        resp = client.messages.create(
-            model=DEFAULT_MODEL,
-            max_tokens=1000,
-            temperature=0.2,
-            system=system_msg,
-            messages=[{"role": "user", "content": user_prompt}],
-        )
-
-        # Concatenate text blocks
-        parts = []
-        for block in getattr(resp, 'content', []) or []:
-            if getattr(block, 'type', None) == 'text':
-                parts.append(block.text)
-            elif isinstance(block, dict) and block.get('type') == 'text':
-                parts.append(block.get('text', ''))
-        text_out = "".join(parts)
-
-        # Parse JSON strictly, or extract array substring
-        payload = text_out
-        try:
-            data = json.loads(payload)
-        except Exception:
-            arr = _extract_json_array(payload)
-            data = json.loads(arr) if arr else []
-
-        normalized = _normalize_items(data)
-        if normalized:
-            return normalized[:max_questions]
-        return MOCK_QUESTIONS[:max_questions]
-    except Exception:
-        return MOCK_QUESTIONS[:max_questions]
+        completion = _guarded(complete, model, task)
+        usage = completion.usage
+        questions = task.normalize(parse_json_array(completion.text))[:max_questions]
+        error = '' if questions else 'Empty or unparseable model output'
+    except Exception as e:
+        questions, error = [], str(e)[:200]
+    result = GenerationResult(
+        'anthropic' if questions else 'mock', model=model, latency=time.monotonic() - started,
+        prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+        errors=(f'anthropic/{model}: {error}',) if error else (),
+    )
+    return questions or MOCK_QUESTIONS[:max_questions], result
@@ -0,0 +1,83 @@
+"""Content-addressed cache for expensive upload processing.
+
+Entries are keyed by the SHA-256 of the uploaded file plus whatever else the
+result depends on (model name, prompt version), so re-uploading the same deck
+for another section skips text extraction and LLM generation entirely.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Dict, Sequence
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import ContentCacheEntry, ContentCacheStat
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _key(kind: str, parts: Sequence[str]) -> str:
+    return hashlib.sha256('\x1f'.join([kind, *parts]).encode()).hexdigest()
+
+
+def _count(kind: str, field: str) -> None:
+    if not ContentCacheStat.objects.filter(kind=kind).update(**{field: F(field) + 1}):
+        ContentCacheStat.objects.get_or_create(kind=kind)
+        ContentCacheStat.objects.filter(kind=kind).update(**{field: F(field) + 1})
+
+
+def get(kind: str, parts: Sequence[str]) -> Any:
+    """Return the cached value or ``None``, recording a hit or miss for ``kind``."""
+    key = _key(kind, parts)
+    entry = ContentCacheEntry.objects.filter(key=key).only('value').first()
+    if entry is None:
+        _count(kind, 'misses')
+        return None
+    ContentCacheEntry.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    _count(kind, 'hits')
+    return entry.value
+
+
+def put(kind: str, parts: Sequence[str], value: Any) -> None:
+    ContentCacheEntry.objects.update_or_create(
+        key=_key(kind, parts),
+        defaults={'kind': kind, 'value': value, 'size': len(json.dumps(value)), 'last_used_at': timezone.now()},
+    )
+    evict()
+
+
+def evict() -> int:
+    """Drop entries unused for CONTENT_CACHE_MAX_AGE_DAYS, then least recently used
+    entries until the cache fits in CONTENT_CACHE_MAX_BYTES. Returns the number removed."""
+    cutoff = timezone.now() - timedelta(days=settings.CONTENT_CACHE_MAX_AGE_DAYS)
+    removed, _ = ContentCacheEntry.objects.filter(last_used_at__lt=cutoff).delete()
+    total = ContentCacheEntry.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total > settings.CONTENT_CACHE_MAX_BYTES:
+        doomed = []
+        for key, size in ContentCacheEntry.objects.order_by('last_used_at').values_list('key', 'size').iterator():
+            if total <= settings.CONTENT_CACHE_MAX_BYTES:
+                break
+            doomed.append(key)
+            total -= size
+        removed += ContentCacheEntry.objects.filter(key__in=doomed).delete()[0]
+    return removed
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Per-kind hit/miss counters with current entry count and size."""
+    out: Dict[str, Dict[str, int]] = {}
+    for stat in ContentCacheStat.objects.all():
+        out[stat.kind] = {'hits': stat.hits, 'misses': stat.misses, 'entries': 0, 'bytes': 0}
+    rows = ContentCacheEntry.objects.order_by().values('kind').annotate(n=Count('key'), size=Sum('size'))
+    for row in rows:
+        bucket = out.setdefault(row['kind'], {'hits': 0, 'misses': 0, 'entries': 0, 'bytes': 0})
+        bucket['entries'], bucket['bytes'] = row['n'], row['size'] or 0
+    return out
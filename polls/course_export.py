@@ -0,0 +1,169 @@
+"""Streaming export of every poll and exit-ticket response in a course.
+
+Responses are read question by question with ``.iterator()`` (a server-side
+cursor on Postgres) and written out ``CHUNK_SIZE`` rows at a time, so memory
+stays flat however large the course is. Every format has the same columns:
+
+* kind: ``poll`` or ``exit_ticket``
+* question_id, question
+* response_id, created_at
+* answer, team, ranking, predictions: a poll vote's typed columns
+* text: an exit-ticket answer, or a poll vote's raw JSON when it has no typed form
+
+Formats:
+
+* ``ndjson``: one JSON object per row
+* ``csv``: a header, then one line per row, with list columns as JSON
+* ``columns``: one JSON object of column arrays per chunk (a row group, as in Parquet)
+* ``parquet``: real Parquet row groups (needs ``pip install pyarrow``)
+"""
+import csv
+import io
+import itertools
+import json
+from typing import Iterator, List, Optional
+
+from .models import Course, ExitTicketResponse, PollResponse, unpack_predictions, unpack_ranking
+
+CHUNK_SIZE = 2000
+COLUMNS = (
+    'kind', 'question_id', 'question', 'response_id', 'created_at',
+    'answer', 'team', 'ranking', 'predictions', 'text',
+)
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def _poll_rows(course: Course) -> Iterator[tuple]:
+    for poll_id, question in course.polls.order_by('created_at', 'id').values_list('id', 'question_text'):
+        responses = PollResponse.objects.filter(poll_id=poll_id).order_by('created_at', 'id').values_list(
+            'id', 'created_at', 'answer', 'team', 'ranking', 'predictions', 'choice',
+        )
+        for pk, created_at, answer, team, ranking, predictions, choice in responses.iterator(chunk_size=CHUNK_SIZE):
+            yield (
+                'poll', str(poll_id), question, str(pk), created_at, answer, team or None,
+                unpack_ranking(ranking) if ranking is not None else None,
+                unpack_predictions(predictions) if predictions is not None else None,
+                json.dumps(choice) if choice is not None else None,
+            )
+
+
+def _ticket_rows(course: Course) -> Iterator[tuple]:
+    for ticket_id, prompt in course.exit_tickets.order_by('created_at', 'id').values_list('id', 'prompt_text'):
+        responses = ExitTicketResponse.objects.filter(ticket_id=ticket_id).order_by('created_at', 'id')
+        for pk, created_at, text in responses.values_list('id', 'created_at', 'answer').iterator(chunk_size=CHUNK_SIZE):
+            yield ('exit_ticket', str(ticket_id), prompt, str(pk), created_at, None, None, None, None, text)
+
+
+def iter_chunks(course: Course, size: Optional[int] = None) -> Iterator[List[tuple]]:
+    """Yield the course's response rows (``COLUMNS`` order) in lists of up to ``size`` (CHUNK_SIZE)."""
+    size = size or CHUNK_SIZE
+    rows = itertools.chain(_poll_rows(course), _ticket_rows(course))
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _jsonable(row: tuple) -> dict:
+    record = dict(zip(COLUMNS, row))
+    record['created_at'] = record['created_at'].isoformat()
+    return record
+
+
+def export_ndjson(course: Course) -> Iterator[str]:
+    for chunk in iter_chunks(course):
+        yield ''.join(json.dumps(_jsonable(row)) + '\n' for row in chunk)
+
+
+def export_csv(course: Course) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    for chunk in iter_chunks(course):
+        for row in chunk:
+            record = _jsonable(row)
+            for key in ('ranking', 'predictions'):
+                if record[key] is not None:
+                    record[key] = json.dumps(record[key])
+            writer.writerow(record.values())
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()  # the header, when there were no rows
+
+
+def export_columns(course: Course) -> Iterator[str]:
+    for chunk in iter_chunks(course):
+        records = [_jsonable(row) for row in chunk]
+        yield json.dumps({col: [r[col] for r in records] for col in COLUMNS}) + '\n'
+
+
+class _Sink:
+    """Write-only file for pyarrow that hands back whatever was written since the last ``drain``."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.position += len(data)
+        return self.buffer.write(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+def export_parquet(course: Course) -> Iterator[bytes]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable('Parquet export needs pyarrow (pip install pyarrow).')
+    schema = pa.schema([
+        ('kind', pa.string()), ('question_id', pa.string()), ('question', pa.string()),
+        ('response_id', pa.string()), ('created_at', pa.timestamp('us', tz='UTC')),
+        ('answer', pa.int16()), ('team', pa.string()),
+        ('ranking', pa.list_(pa.int16())), ('predictions', pa.list_(pa.int16())), ('text', pa.string()),
+    ])
+
+    def stream():
+        sink = _Sink()
+        with pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema) as writer:
+            for chunk in iter_chunks(course):
+                writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, row)) for row in chunk], schema=schema))
+                yield sink.drain()
+        yield sink.drain()  # the footer
+
+    return stream()
+
+
+# format: (exporter, content type, file extension)
+EXPORTERS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (export_csv, 'text/csv', 'csv'),
+    'columns': (export_columns, 'application/x-ndjson', 'columns.ndjson'),
+    'parquet': (export_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export(course: Course, fmt: str) -> Iterator:
+    """Return an iterator of ``str`` (``bytes`` for parquet) chunks; raises ``ExportUnavailable``."""
+    if fmt not in EXPORTERS:
+        raise ExportUnavailable(f'Unknown export format {fmt!r}; use one of {", ".join(EXPORTERS)}.')
+    return EXPORTERS[fmt][0](course)
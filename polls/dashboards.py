@@ -0,0 +1,39 @@
+"""Query-optimized rows for the professor and student dashboards.
+
+Each function returns a queryset for one list on the index, manage or student
+home page, so the number of queries does not grow with the number of polls,
+tickets or courses: enrollment filters stay in the database as subqueries
+instead of id lists.
+"""
+from django.db.models import Q, QuerySet
+
+from .models import Course, Document, Enrollment, ExitTicket, Poll
+
+
+def professor_polls(user) -> QuerySet:
+    return Poll.objects.filter(course__created_by=user).order_by('-created_at')
+
+
+def professor_tickets(user) -> QuerySet:
+    return ExitTicket.objects.filter(course__created_by=user).order_by('-created_at')
+
+
+def professor_courses(user) -> QuerySet:
+    return Course.objects.filter(created_by=user).order_by('name')
+
+
+def professor_documents(user, limit: int = 50) -> QuerySet:
+    docs = Document.objects.filter(Q(course__created_by=user) | Q(course__isnull=True))
+    return docs.order_by('-uploaded_at')[:limit]
+
+
+def enrolled_course_ids(user) -> QuerySet:
+    return Enrollment.objects.filter(user=user).values('course_id')
+
+
+def student_polls(user) -> QuerySet:
+    return Poll.objects.filter(active=True, course_id__in=enrolled_course_ids(user)).order_by('-created_at')
+
+
+def student_tickets(user) -> QuerySet:
+    return ExitTicket.objects.filter(active=True, course_id__in=enrolled_course_ids(user)).order_by('-created_at')
@@ -0,0 +1,84 @@
+"""Paging and export of exit-ticket responses.
+
+Pages are keyset-paginated, newest first, on ``(created_at, id)``: a cursor
+names the last row shown, and the next page is read from the
+``(ticket, created_at, id)`` index starting just after it. Every page costs the
+same however deep it is, unlike OFFSET paging. Exports stream every response
+oldest first with ``.iterator()``, so memory stays flat for any ticket size.
+"""
+import base64
+import csv
+import json
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from django.db.models import Q
+
+from .models import ExitTicket, ExitTicketResponse
+
+PAGE_SIZE = 200
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ('id', 'created_at', 'answer')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(response: ExitTicketResponse) -> str:
+    raw = f'{response.created_at.isoformat()}|{response.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def response_page(ticket: ExitTicket, cursor: Optional[str] = None,
+                  size: Optional[int] = None) -> Tuple[List[ExitTicketResponse], Optional[str]]:
+    """Return up to ``size`` responses older than ``cursor`` (newest first) and the next page's cursor."""
+    size = size or PAGE_SIZE
+    rows = ticket.responses.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # the redundant created_at <= bound lets the database seek into the index
+        rows = rows.filter(Q(created_at__lt=created_at) | Q(id__lt=pk), created_at__lte=created_at)
+    page = list(rows[:size + 1])
+    if len(page) > size:
+        return page[:size], encode_cursor(page[size - 1])
+    return page, None
+
+
+def _rows(ticket: ExitTicket) -> Iterator[tuple]:
+    rows = ticket.responses.order_by('created_at', 'id').values_list(*EXPORT_FIELDS)
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``'s caller."""
+    def write(self, value):
+        return value
+
+
+def export_csv(ticket: ExitTicket) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for pk, created_at, answer in _rows(ticket):
+        yield writer.writerow((pk, created_at.isoformat(), answer))
+
+
+def export_ndjson(ticket: ExitTicket) -> Iterator[str]:
+    for pk, created_at, answer in _rows(ticket):
+        yield json.dumps({'id': str(pk), 'created_at': created_at.isoformat(), 'answer': answer}) + '\n'
+
+
+EXPORTERS = {
+    'csv': (export_csv, 'text/csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,196 @@
+"""Buffered vote ingestion (VOTE_INGEST_MODE = 'buffered').
+
+Votes validated by ``views.poll_vote`` are appended to an in-process buffer and
+written in batches: one ``bulk_create`` plus one tally update per poll and
+flush. A flush happens when the buffer holds VOTE_BUFFER_SIZE votes (in the
+request that filled it), every VOTE_BUFFER_INTERVAL seconds (from a background
+thread), and at interpreter exit.
+
+Delivery semantics:
+
+* A student is acknowledged once the vote is buffered, before it is stored. A
+  process that dies without exiting cleanly (SIGKILL, OOM, power loss) loses the
+  votes buffered since the last flush: at most VOTE_BUFFER_SIZE votes, or
+  VOTE_BUFFER_INTERVAL seconds' worth.
+* Each poll's batch is written in one transaction, so it is stored completely
+  or not at all. It is never stored twice. If a write fails, the batch goes back
+  to the front of the buffer and is retried on the next flush. After
+  VOTE_FLUSH_RETRIES failed flushes the poll's votes are written one by one, so
+  one bad row cannot hold back the rest; votes that still fail are logged in
+  full to the ``polls.ingest.dead_letter`` logger and dropped. A vote that fails
+  because the database is unreachable is never dropped: it goes back to the
+  buffer with the rest of the unwritten votes. Votes for a poll deleted in the
+  meantime are dropped. Per poll, votes keep their arrival
+  order, and ``created_at`` records when the vote arrived.
+* The buffer holds at most VOTE_BUFFER_MAX votes. While the database is failing
+  and the buffer is full, votes are written in their own request, as in direct
+  mode, so students see the error instead of the buffer growing without bound.
+  If putting a failed batch back would overfill the buffer, the newest votes
+  beyond the cap go to the dead-letter logger.
+* Results, the live feed and exports see a vote only after its flush. Until
+  then they lag by at most VOTE_BUFFER_INTERVAL.
+* Every web worker process has its own buffer. Nothing is shared between
+  processes or machines.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+from .models import Poll, PollResponse
+from .tallies import record_votes
+
+logger = logging.getLogger(__name__)
+dead_letter = logging.getLogger(__name__ + '.dead_letter')
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_buffer: List[Tuple[object, PollResponse]] = []
+_flusher: threading.Thread | None = None
+# consecutive failed flushes per poll id, reset once the poll's votes are written
+_failures: Dict[object, int] = {}
+
+
+def buffered() -> bool:
+    return settings.VOTE_INGEST_MODE == 'buffered'
+
+
+def submit(poll, choice) -> None:
+    """Buffer a validated vote; flushes inline once the buffer is full.
+
+    If earlier flushes failed and VOTE_BUFFER_MAX votes are already waiting, the
+    vote is written right away instead, and a database error reaches the caller.
+    """
+    _ensure_flusher()
+    response = PollResponse.from_choice(choice, poll_id=poll.id)
+    with _lock:
+        overflow = len(_buffer) >= settings.VOTE_BUFFER_MAX
+        if not overflow:
+            _buffer.append((poll, response))
+        full = len(_buffer) >= settings.VOTE_BUFFER_SIZE
+    if overflow:
+        record_votes(poll, [response])
+    elif full:
+        flush()
+
+
+def pending() -> int:
+    with _lock:
+        return len(_buffer)
+
+
+def flush() -> int:
+    """Write everything buffered so far. Returns the number of votes stored.
+
+    Votes that were neither stored nor dropped go back to the front of the
+    buffer, even if the flush itself fails.
+    """
+    with _flush_lock:
+        with _lock:
+            batch = _buffer[:]
+            _buffer.clear()
+        if not batch:
+            return 0
+        by_poll: 'OrderedDict[object, Tuple[object, List[PollResponse]]]' = OrderedDict()
+        for poll, response in batch:
+            by_poll.setdefault(poll.id, (poll, []))[1].append(response)
+
+        stored = 0
+        settled = set()  # ids of the responses stored or dropped
+        try:
+            for poll, responses in by_poll.values():
+                try:
+                    record_votes(poll, responses)
+                except Exception:
+                    if _deleted(poll):
+                        logger.warning('Dropping %d buffered votes for deleted poll %s', len(responses), poll.id)
+                        _failures.pop(poll.id, None)
+                        settled.update(id(r) for r in responses)
+                        continue
+                    _failures[poll.id] = _failures.get(poll.id, 0) + 1
+                    if _failures[poll.id] < settings.VOTE_FLUSH_RETRIES:
+                        logger.exception('Flushing %d votes for poll %s failed; will retry', len(responses), poll.id)
+                        continue
+                    logger.exception('Flushing %d votes for poll %s failed %d times; writing them one by one',
+                                     len(responses), poll.id, _failures.pop(poll.id))
+                    done = _store_one_by_one(poll, responses)
+                    stored += sum(1 for _, ok in done if ok)
+                    settled.update(id(r) for r, _ in done)
+                else:
+                    stored += len(responses)
+                    _failures.pop(poll.id, None)
+                    settled.update(id(r) for r in responses)
+        finally:
+            _requeue([(poll, r) for poll, r in batch if id(r) not in settled])
+        return stored
+
+
+def _deleted(poll) -> bool:
+    try:
+        return not Poll.objects.filter(id=poll.id).exists()
+    except Exception:
+        return False  # the database is unreachable as well; keep the votes
+
+
+def _requeue(entries: List[Tuple[object, PollResponse]]) -> None:
+    if not entries:
+        return
+    with _lock:
+        _buffer[:0] = entries
+        overflow = _buffer[settings.VOTE_BUFFER_MAX:]
+        del _buffer[settings.VOTE_BUFFER_MAX:]
+    for poll, response in overflow:
+        _dead_letter(poll, response, 'the vote buffer is full')
+
+
+def _dead_letter(poll, response: PollResponse, reason: str) -> None:
+    dead_letter.error('Dropped vote for poll %s (%s): choice=%r created_at=%s',
+                      poll.id, reason, response.value, response.created_at.isoformat())
+
+
+def _store_one_by_one(poll, responses: List[PollResponse]) -> List[Tuple[PollResponse, bool]]:
+    """Write ``responses`` singly; ``(response, stored)`` for each one that was stored or dead-lettered.
+
+    Stops at the first error that means the database is unreachable, leaving
+    the rest to be put back in the buffer.
+    """
+    done = []
+    for response in responses:
+        try:
+            record_votes(poll, [response])
+        except (OperationalError, InterfaceError):
+            logger.exception('Database unavailable while writing votes for poll %s one by one', poll.id)
+            break
+        except Exception as e:
+            _dead_letter(poll, response, str(e)[:200])
+            done.append((response, False))
+        else:
+            done.append((response, True))
+    return done
+
+
+def _run_flusher() -> None:
+    while True:
+        time.sleep(settings.VOTE_BUFFER_INTERVAL)
+        if not pending():
+            continue
+        try:
+            flush()
+        except Exception:
+            logger.exception('Vote flush failed')
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name='vote-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
@@ -0,0 +1,227 @@
+"""Background processing of uploaded documents.
+
+Uploads are queued by setting ``Document.status`` to ``queued``; the
+``process_documents`` management command claims queued documents one at a time,
+extracts their text and generates questions, moving the status through
+``extracting`` -> ``generating`` -> ``done`` (or ``failed`` with ``error`` set).
+Documents left mid-processing by a crashed worker are requeued by ``requeue_stale``
+until they have been claimed DOCUMENT_MAX_ATTEMPTS times. A live worker refreshes
+``status_changed_at`` between stages and for every streamed question, so only
+a document whose single extraction or generation call outlasts the stale
+timeout can be requeued while still running; the worker then notices at its
+next heartbeat and stops.
+"""
+import logging
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import content_cache, llm_client, prompt_packing, question_index, view_cache
+from .models import Document, GeneratedQuestion
+from .utils import extract_text_from_file
+
+logger = logging.getLogger(__name__)
+
+MAX_QUESTIONS = 6
+MAX_TICKETS = 3
+# MCQs asked of each chunk in chunked generation, so long documents get more questions
+QUESTIONS_PER_CHUNK = 3
+# In single-prompt mode, extraction reads this many prompts' worth of text for packing to choose from
+PACKING_WINDOW = 4
+
+
+class Abandoned(Exception):
+    """The document was deleted, or requeued for another worker, while this one was processing it."""
+
+
+def _heartbeat(doc: Document) -> None:
+    """Refresh ``status_changed_at`` so ``requeue_stale`` sees the document is still being worked on."""
+    alive = Document.objects.filter(id=doc.id, status=doc.status).update(status_changed_at=timezone.now())
+    if not alive:
+        raise Abandoned(doc.id)
+
+
+def _set_status(doc: Document, status: str, error: str = '') -> None:
+    doc.status = status
+    doc.status_changed_at = timezone.now()
+    doc.error = error
+    doc.save(update_fields=['status', 'status_changed_at', 'error'])
+    view_cache.documents_changed()
+
+
+def _store_result(doc: Document, result: llm_client.GenerationResult) -> None:
+    doc.generation_source = result.source
+    doc.generation_model = (result.model or '')[:200]
+    doc.generation_latency = result.latency
+    doc.prompt_tokens = result.prompt_tokens
+    doc.completion_tokens = result.completion_tokens
+    doc.generation_errors = '\n'.join(result.errors)
+    doc.save(update_fields=['generation_source', 'generation_model', 'generation_latency', 'prompt_tokens',
+                            'completion_tokens', 'generation_errors'])
+
+
+def _store_packing(doc: Document, packed: prompt_packing.Packed) -> None:
+    logger.info('Document %s: material packed from %d to %d tokens (%d saved)',
+                doc.id, packed.tokens_before, packed.tokens_after, packed.tokens_saved)
+    doc.material_tokens = packed.tokens_before
+    doc.packed_tokens = packed.tokens_after
+    doc.save(update_fields=['material_tokens', 'packed_tokens'])
+
+
+def _question(doc: Document, kind: str, item: dict) -> GeneratedQuestion:
+    choices = item.get('choices', []) if kind == 'mcq' else []
+    return GeneratedQuestion(document=doc, text=item.get('text'), choices=choices, kind=kind)
+
+
+def _stream_questions(doc: Document, text: str, chunked: bool) -> Tuple[dict, llm_client.GenerationResult]:
+    """Generate with streaming, storing each question the moment it arrives so the review page fills in early."""
+    if chunked:
+        items = llm_client.stream_chunked_from_text(
+            text, max_questions=MAX_QUESTIONS, max_tickets=MAX_TICKETS, questions_per_chunk=QUESTIONS_PER_CHUNK
+        )
+    else:
+        items = llm_client.stream_all_from_text(text, max_questions=MAX_QUESTIONS, max_tickets=MAX_TICKETS)
+    generated = {'mcq': [], 'exit': []}
+    for kind, item in items:
+        _heartbeat(doc)
+        generated[kind].append(item)
+        question_index.add_questions(doc, [_question(doc, kind, item)])
+    return generated, items.result
+
+
+def enqueue_document(doc: Document) -> None:
+    """Queue ``doc`` for the worker, or process it right away with PROCESS_DOCUMENTS_INLINE."""
+    doc.attempts = 0
+    doc.save(update_fields=['attempts'])
+    _set_status(doc, 'queued')
+    if settings.PROCESS_DOCUMENTS_INLINE:
+        process_document(doc)
+
+
+def claim_next_document() -> Optional[Document]:
+    """Atomically move the oldest queued document to ``extracting`` and return it.
+
+    The conditional UPDATE acts as a compare-and-set, so several workers can poll
+    the same queue without processing a document twice.
+    """
+    candidates = Document.objects.filter(status='queued').order_by('uploaded_at').values_list('id', flat=True)[:10]
+    for doc_id in candidates:
+        claimed = Document.objects.filter(id=doc_id, status='queued').update(
+            status='extracting', status_changed_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            view_cache.documents_changed()
+            return Document.objects.get(id=doc_id)
+    return None
+
+
+def requeue_stale(older_than: timedelta) -> int:
+    """Put documents whose worker died mid-processing back on the queue.
+
+    A document already claimed DOCUMENT_MAX_ATTEMPTS times is marked ``failed``
+    instead, since it is likely what crashed the worker.
+    """
+    max_attempts = settings.DOCUMENT_MAX_ATTEMPTS
+    stale = Document.objects.filter(
+        status__in=('extracting', 'generating'), status_changed_at__lt=timezone.now() - older_than
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed', status_changed_at=timezone.now(),
+        error=f'Processing was interrupted {max_attempts} times; giving up.',
+    )
+    if failed:
+        logger.warning('Gave up on %d document(s) interrupted %d times', failed, max_attempts)
+    requeued = stale.update(status='queued', status_changed_at=timezone.now())
+    if failed or requeued:
+        view_cache.documents_changed()
+    return requeued
+
+
+def process_document(doc: Document) -> None:
+    """Extract text from ``doc`` and store generated MCQs and exit tickets.
+
+    Both generations run concurrently on the shared LLM client; with
+    CHUNKED_GENERATION long documents are covered chunk by chunk, and with
+    STREAM_GENERATION each question is stored as soon as it is generated. The
+    extracted text is cleaned and, in single-prompt mode, packed into the
+    prompt's token budget first (``prompt_packing``). Results are
+    cached by file content, so an identical re-upload skips extraction and
+    generation entirely.
+    How the generation went (``llm_client.GenerationResult``) is saved on ``doc``.
+    """
+    try:
+        _set_status(doc, 'extracting')
+        # a requeued document starts over; questions streamed before the crash would come back as duplicates
+        doc.generated_questions.all().delete()
+        path = doc.file.path
+        digest = content_cache.file_digest(path)
+        # chunked generation reads the whole document; otherwise a single prompt's
+        # budget is packed from the first PACKING_WINDOW budgets' worth of text
+        chunked = settings.CHUNKED_GENERATION
+        budget = llm_client.prompt_budget()
+        max_chars = None if chunked else (
+            PACKING_WINDOW * budget * prompt_packing.CHARS_PER_TOKEN if budget > 0 else llm_client.MATERIAL_CHAR_LIMIT
+        )
+        generation_key = [digest, llm_client.generation_fingerprint(), f'mcq={MAX_QUESTIONS}', f'exit={MAX_TICKETS}',
+                          f'chunked={QUESTIONS_PER_CHUNK}' if chunked else 'single']
+        generated = content_cache.get('questions', generation_key)
+        stored = False
+        if generated is not None:
+            result = llm_client.GenerationResult('cache', model=generated.get('model'))
+        else:
+            text_key = [digest, f'max_chars={max_chars}']
+            text = content_cache.get('text', text_key)
+            if text is None:
+                text = extract_text_from_file(
+                    path, max_chars=max_chars,
+                    workers=settings.EXTRACTION_WORKERS, min_parallel_pages=settings.EXTRACTION_PARALLEL_MIN_PAGES,
+                )
+                content_cache.put('text', text_key, text)
+            _heartbeat(doc)
+            if budget > 0:
+                packed = prompt_packing.prepare(text, None if chunked else budget)
+                text = packed.text
+                _store_packing(doc, packed)
+
+            _set_status(doc, 'generating')
+            if settings.STREAM_GENERATION:
+                generated, result = _stream_questions(doc, text, chunked)
+                stored = True
+            else:
+                if chunked:
+                    generated_mcq, generated_exit, result = llm_client.generate_chunked_from_text(
+                        text, max_questions=MAX_QUESTIONS, max_tickets=MAX_TICKETS,
+                        questions_per_chunk=QUESTIONS_PER_CHUNK,
+                    )
+                else:
+                    generated_mcq, generated_exit, result = llm_client.generate_all_from_text(
+                        text, max_questions=MAX_QUESTIONS, max_tickets=MAX_TICKETS
+                    )
+                generated = {'mcq': generated_mcq, 'exit': generated_exit}
+            _heartbeat(doc)
+            # never cache fallback content; the next upload should retry the LLM
+            if result.source != 'mock':
+                content_cache.put('questions', generation_key, dict(generated, model=result.model))
+
+        _store_result(doc, result)
+        if not stored:
+            # near-duplicates of the course's earlier questions are flagged or dropped (QUESTION_DEDUP)
+            question_index.add_questions(
+                doc, [_question(doc, 'mcq', item) for item in generated['mcq']]
+                + [_question(doc, 'exit', item) for item in generated['exit']]
+            )
+        _set_status(doc, 'done')
+    except Abandoned:
+        logger.warning('Document %s was deleted or requeued while being processed; stopping', doc.id)
+    except Exception as e:
+        logger.exception('Processing document %s failed', doc.id)
+        try:
+            with transaction.atomic():
+                _set_status(doc, 'failed', error=str(e)[:500])
+        except DatabaseError:
+            # the document was deleted mid-processing (update_fields matched no row)
+            logger.warning('Could not mark document %s failed', doc.id, exc_info=True)
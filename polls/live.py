@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from .models import Poll
+
+# Long-poll waiters in this process, per (poll id, feed). A change wakes only the
+# waiters of that poll, and the waiters of one channel share a single fetch per
+# wakeup or re-check interval. Waiters in other worker processes pick the change
+# up on their next periodic re-check.
+_lock = threading.Lock()
+_channels: Dict[Tuple[str, str], '_Channel'] = {}
+
+
+class _Channel:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.waiters = 0
+        self.generation = 0  # bumped by every notify
+        self.fetching = False
+        self.payload: Optional[Dict] = None
+        self.payload_generation = -1
+        self.fetched_at = 0.0
+
+    def get(self, fetch: Callable[[], Optional[Dict]], max_age: float) -> Optional[Dict]:
+        """The payload fetched since the last notify and within ``max_age`` seconds, fetching it if there is none."""
+        with self.cond:
+            while True:
+                if self.payload_generation == self.generation and time.monotonic() - self.fetched_at < max_age:
+                    return self.payload
+                if not self.fetching:
+                    break
+                self.cond.wait()  # another waiter is fetching; use its result
+            self.fetching = True
+            generation = self.generation
+        payload, fetched = None, False
+        try:
+            payload, fetched = fetch(), True
+        finally:
+            with self.cond:
+                self.fetching = False
+                if fetched:
+                    self.payload, self.payload_generation, self.fetched_at = payload, generation, time.monotonic()
+                self.cond.notify_all()
+        return payload
+
+
+def notify_changed(poll_id) -> None:
+    """Wake the waiters on ``poll_id`` in this process."""
+    with _lock:
+        channels = [channel for (key, _), channel in _channels.items() if key == str(poll_id)]
+    for channel in channels:
+        with channel.cond:
+            channel.generation += 1
+            channel.cond.notify_all()
+
+
+def wait_for_change(poll_id, feed: str, fetch: Callable[[], Optional[Dict]], since: str, timeout: float,
+                    interval: float = 1.0) -> Optional[Dict]:
+    """Call ``fetch`` until its ``version`` differs from ``since`` or ``timeout`` expires.
+
+    ``fetch`` runs again when ``notify_changed(poll_id)`` is called, or every
+    ``interval`` seconds to see changes made by other processes, and its result
+    is shared by every waiter on the same ``(poll_id, feed)``. Returns the last
+    fetched payload (``None`` if the object disappeared).
+    """
+    deadline = time.monotonic() + timeout
+    key = (str(poll_id), feed)
+    with _lock:
+        channel = _channels.setdefault(key, _Channel())
+        channel.waiters += 1
+    try:
+        current = channel.get(fetch, interval)
+        while current is not None and current['version'] == since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with channel.cond:
+                seen = channel.generation
+                channel.cond.wait_for(lambda: channel.generation != seen, min(interval, remaining))
+            current = channel.get(fetch, interval)
+        return current
+    finally:
+        with _lock:
+            channel.waiters -= 1
+            if not channel.waiters:
+                del _channels[key]
+
+
+def poll_state(active: bool, countdown_started: bool, countdown_start_time) -> Dict:
+    """Return the live fields students wait on, plus a version token for change detection."""
+    start = countdown_start_time
+    return {
+        'active': active,
+        'countdown_started': countdown_started,
+        'countdown_start_time': start.isoformat() if start else None,
+        'version': f"{int(active)}{int(countdown_started)}-{start.timestamp() if start else 0}",
+    }
+
+
+def get_poll_state(poll_id) -> Optional[Dict]:
+    row = Poll.objects.filter(id=poll_id).values('active', 'countdown_started', 'countdown_start_time').first()
+    return poll_state(**row) if row else None
@@ -1,7 +1,16 @@
 import os
+import hashlib
+import itertools
 import json
+import queue
 import re
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Callable, List, Dict, Iterator, NamedTuple, Tuple
+
+from . import llm_guard, prompt_packing, providers
+from .utils import PAGE_BREAK
 
 try:
     from groq import Groq
@@ -10,8 +19,8 @@ except Exception:
 
 
 DEFAULT_MODEL = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
-LAST_SOURCE = 'mock'  # 'groq' when API returns usable items
-LAST_ERROR: str | None = None
+# Size of one prompt's material, and of each chunk in chunked generation
+MATERIAL_CHAR_LIMIT = 12000
 
 
 def _get_api_key() -> str | None:
@@ -23,6 +32,76 @@ def _get_model() -> str:
     return os.getenv('GROQ_MODEL', DEFAULT_MODEL)
 
 
+def _race_fallbacks() -> bool:
+    # Send the fallback models at the same time as the primary instead of after it fails.
+    # Cuts latency when the primary is down, at the cost of extra (billed) requests.
+    return os.getenv('GROQ_RACE_FALLBACKS', '0') == '1'
+
+
+def _default_deadline() -> float | None:
+    value = os.getenv('GROQ_GENERATION_DEADLINE')
+    return float(value) if value else None
+
+
+def _max_chunks() -> int:
+    # Upper bound on LLM requests per document in chunked mode; longer material is sampled
+    return int(os.getenv('GROQ_MAX_CHUNKS', '12'))
+
+
+def _chunk_budget(max_tickets: int) -> int:
+    # GROQ_MAX_CHUNKS, or fewer when the rate limiter could not admit that many
+    # requests plus the exit tickets' within GROQ_QUEUE_TIMEOUT (see llm_guard)
+    admissible = llm_guard.capacity()
+    if admissible is None:
+        return _max_chunks()
+    return max(1, min(_max_chunks(), admissible - max_tickets))
+
+
+def _max_in_flight() -> int:
+    # Chunk requests one document may have running at once on the shared pool
+    return int(os.getenv('GROQ_MAX_IN_FLIGHT', '4'))
+
+
+def prompt_budget() -> int:
+    """Tokens of material per prompt (LLM_PROMPT_TOKENS); 0 sends the first MATERIAL_CHAR_LIMIT characters as they are."""
+    return int(os.getenv('LLM_PROMPT_TOKENS', str(MATERIAL_CHAR_LIMIT // prompt_packing.CHARS_PER_TOKEN)))
+
+
+def _max_retries() -> int:
+    # Retries inside the Groq SDK bypass the rate limiter and circuit breaker (see llm_guard)
+    return int(os.getenv('GROQ_MAX_RETRIES', '0'))
+
+
+_client_lock = threading.Lock()
+_clients: Dict[Tuple[str, str | None], 'Groq'] = {}
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_client(api_key: str):
+    """Return the process-wide Groq client for ``api_key``.
+
+    The client (and its HTTP connection pool) is built once and shared by all
+    threads, so repeated generations reuse warm keep-alive connections.
+    """
+    base_url = os.getenv('GROQ_BASE_URL')
+    with _client_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = Groq(api_key=api_key, base_url=base_url, max_retries=_max_retries())
+            _clients[(api_key, base_url)] = client
+        return client
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _client_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('GROQ_MAX_WORKERS', '8')), thread_name_prefix='llm'
+            )
+        return _executor
+
+
 MOCK_QUESTIONS: List[Dict] = [
     {
         'text': 'Which statement best describes formative assessment?',
@@ -44,6 +123,51 @@ MOCK_QUESTIONS: List[Dict] = [
     },
 ]
 
+MOCK_EXIT_TICKETS: List[Dict] = [
+    {'text': 'In 2–3 sentences, explain one new concept you learned today and how you might apply it next week.', 'choices': []},
+    {'text': 'Describe a real-world scenario where today’s topic would be useful. What steps would you take?', 'choices': []},
+    {'text': 'What part of today’s lesson still feels unclear, and how would you try to resolve it?', 'choices': []},
+]
+
+MCQ_SYSTEM = (
+    "You generate clear, concise multiple-choice questions from provided teaching materials. "
+    "Only output valid JSON as requested; do not include prose or markdown."
+)
+MCQ_PROMPT = (
+    "From the material below, write up to {n} multiple-choice questions.\n"
+    "Each item must be a JSON object with keys: text (string), choices (array of exactly 4 strings).\n"
+    "Return a single JSON array only. No explanations.\n\n"
+    "MATERIAL:\n{material}"
+)
+EXIT_SYSTEM = (
+    "You generate concise, open-ended exit ticket prompts that require students to apply the material. "
+    "Only output JSON as requested; no prose."
+)
+EXIT_PROMPT = (
+    "From the material below, write up to {n} exit ticket prompts that require short written responses.\n"
+    "Each item must be a JSON object with key: text (string prompt). Do not include choices.\n"
+    "Return a single JSON array only. No explanations.\n\n"
+    "MATERIAL:\n{material}"
+)
+
+
+# Changes whenever a prompt changes, so cached generations from old prompts are not reused
+PROMPT_VERSION = hashlib.sha256(''.join([MCQ_SYSTEM, MCQ_PROMPT, EXIT_SYSTEM, EXIT_PROMPT]).encode()).hexdigest()[:12]
+
+
+def generation_fingerprint() -> str:
+    """Identify the providers, models and prompts that would generate questions, for cache keys.
+
+    Enabling another provider or changing any provider's models changes the
+    fingerprint, so questions cached from one setup are not served for another.
+    """
+    tasks = (mcq_task('', 1), exit_task('', 1))
+    routes = ';'.join(
+        f"{provider.name}={','.join(dict.fromkeys(m for task in tasks for m in provider.models(task)))}"
+        for provider in providers.enabled()
+    )
+    return f'{routes or "none"}:{PROMPT_VERSION}:tokens={prompt_budget()}'
+
 
 def _extract_json_array(s: str) -> str | None:
     if not s:
@@ -52,6 +176,81 @@ def _extract_json_array(s: str) -> str | None:
     return m.group(0) if m else None
 
 
+def parse_json_array(content: str) -> List:
+    """The JSON array in a model reply, tolerating prose around it; empty if there is none."""
+    try:
+        data = json.loads(content)
+    except Exception:
+        arr = _extract_json_array(content)
+        data = json.loads(arr) if arr else []
+    return data if isinstance(data, list) else []
+
+
+class JsonArrayParser:
+    """Incremental parser for a JSON array arriving in pieces, as from a streamed completion.
+
+    ``feed`` returns the array elements completed by the new text, so each
+    question can be used as soon as its closing brace arrives. Like
+    ``_extract_json_array``, anything before the first ``[`` is skipped, and so
+    is everything after the array closes. Elements that are not valid JSON are
+    dropped.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.buffer: List[str] = []
+
+    def _flush(self, out: List) -> None:
+        raw = ''.join(self.buffer).strip()
+        self.buffer = []
+        if raw:
+            try:
+                out.append(json.loads(raw))
+            except ValueError:
+                pass
+
+    def feed(self, text: str) -> List:
+        out: List = []
+        for ch in text:
+            if self.finished:
+                break
+            if not self.started:
+                self.started = ch == '['
+                continue
+            if self.in_string:
+                self.buffer.append(ch)
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+                self.buffer.append(ch)
+            elif ch in '[{':
+                self.depth += 1
+                self.buffer.append(ch)
+            elif ch in ']}':
+                if self.depth == 0:  # the array itself closed
+                    self._flush(out)
+                    self.finished = True
+                    continue
+                self.depth -= 1
+                self.buffer.append(ch)
+                if self.depth == 0:
+                    self._flush(out)
+            elif ch == ',' and self.depth == 0:
+                self._flush(out)
+            else:
+                self.buffer.append(ch)
+        return out
+
+
 def _normalize_items(items: List[Dict]) -> List[Dict]:
     out: List[Dict] = []
     for it in items:
@@ -62,151 +261,736 @@ def _normalize_items(items: List[Dict]) -> List[Dict]:
     return out
 
 
-def generate_exit_tickets_from_text(text: str, max_tickets: int = 3) -> List[Dict]:
-    """Create short-response exit ticket prompts from text using Groq.
+def _normalize_exit_items(items: List[Dict]) -> List[Dict]:
+    out: List[Dict] = []
+    for it in items:
+        t = it.get('text') or it.get('prompt') or it.get('question')
+        if t:
+            out.append({'text': str(t).strip(), 'choices': []})
+    return out
+
+
+class Task(NamedTuple):
+    """One generation request: a prompt plus the ordered models to try it on.
 
-    Returns a list of dicts with keys: text (prompt), choices is empty list.
-    Falls back to a small mock set when the API key is missing or on errors.
+    Every provider takes the same tasks; ``models`` is Groq's chain and other
+    providers choose their own models for it.
     """
-    global LAST_SOURCE, LAST_ERROR
-    api_key = _get_api_key()
-    model = _get_model()
-    if not api_key or Groq is None:
-        LAST_SOURCE = 'mock'
-        LAST_ERROR = None if api_key else 'Missing GROQ_API_KEY'
-        return [
-            {'text': 'In 2–3 sentences, explain one new concept you learned today and how you might apply it next week.', 'choices': []},
-            {'text': 'Describe a real-world scenario where today’s topic would be useful. What steps would you take?', 'choices': []},
-            {'text': 'What part of today’s lesson still feels unclear, and how would you try to resolve it?', 'choices': []},
-        ][:max_tickets]
+    models: List[str]
+    system_msg: str
+    user_prompt: str
+    max_tokens: int
+    normalize: Callable[[List[Dict]], List[Dict]]
+    limit: int
 
-    client = Groq(api_key=api_key)
-
-    system_msg = (
-        "You generate concise, open-ended exit ticket prompts that require students to apply the material. "
-        "Only output JSON as requested; no prose."
-    )
-    user_prompt = (
-        "From the material below, write up to {n} exit ticket prompts that require short written responses.\n"
-        "Each item must be a JSON object with key: text (string prompt). Do not include choices.\n"
-        "Return a single JSON array only. No explanations.\n\n"
-        "MATERIAL:\n{material}"
-    ).format(n=max_tickets, material=(text or '')[:12000])
 
+def _model_chain(model: str, candidates: Tuple[str, ...]) -> List[str]:
+    # Try the requested model, then a small set of known fallbacks
     fallbacks = []
     fb_env = os.getenv('GROQ_FALLBACK_MODEL')
     if fb_env and fb_env != model:
         fallbacks.append(fb_env)
-    for cand in ('llama-3.2-11b-text-preview', 'mixtral-8x7b-32768'):
+    for cand in candidates:
         if cand != model and cand not in fallbacks:
             fallbacks.append(cand)
+    return [model] + fallbacks
+
+
+def _material(text: str) -> str:
+    budget = prompt_budget()
+    if budget <= 0:
+        return (text or '')[:MATERIAL_CHAR_LIMIT]
+    return prompt_packing.pack(text, budget)
+
+
+def mcq_task(text: str, max_questions: int) -> Task:
+    """The task asking for up to ``max_questions`` multiple-choice questions about ``text``."""
+    return Task(
+        models=_model_chain(_get_model(), ('llama-3.1-8b-instant',)),
+        system_msg=MCQ_SYSTEM,
+        user_prompt=MCQ_PROMPT.format(n=max_questions, material=_material(text)),
+        max_tokens=1200,
+        normalize=_normalize_items,
+        limit=max_questions,
+    )
+
+
+def exit_task(text: str, max_tickets: int) -> Task:
+    """The task asking for up to ``max_tickets`` exit ticket prompts about ``text``."""
+    return Task(
+        models=_model_chain(_get_model(), ('llama-3.2-11b-text-preview', 'mixtral-8x7b-32768')),
+        system_msg=EXIT_SYSTEM,
+        user_prompt=EXIT_PROMPT.format(n=max_tickets, material=_material(text)),
+        max_tokens=800,
+        normalize=_normalize_exit_items,
+        limit=max_tickets,
+    )
+
+
+def _messages(task: Task) -> List[Dict]:
+    return [
+        {"role": "system", "content": task.system_msg},
+        {"role": "user", "content": task.user_prompt},
+    ]
+
+
+def _usage(usage) -> providers.Usage:
+    # token counts as Groq reports them; missing from some responses
+    if usage is None:
+        return providers.Usage()
+    return providers.Usage(getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def complete(model: str, task: Task) -> providers.Completion:
+    """The Groq completion of ``task`` on ``model`` (the ``providers`` interface)."""
+    resp = _get_client(_get_api_key()).chat.completions.create(
+        model=model,
+        temperature=0.2,
+        messages=_messages(task),
+        max_tokens=task.max_tokens,
+    )
+    text = resp.choices[0].message.content if resp.choices else ''
+    return providers.Completion(text or '', _usage(getattr(resp, 'usage', None)))
+
 
-    errors: list[str] = []
-    for m in [model] + fallbacks:
+def stream(model: str, task: Task) -> Iterator:
+    """Streaming ``complete``: yield the completion text as it arrives, then its ``Usage`` if reported."""
+    chunks = _get_client(_get_api_key()).chat.completions.create(
+        model=model,
+        temperature=0.2,
+        messages=_messages(task),
+        max_tokens=task.max_tokens,
+        stream=True,
+    )
+    usage = None
+    try:
+        for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+            # Groq reports usage on the last chunk, under x_groq
+            usage = getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+        if usage is not None:
+            yield _usage(usage)
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()  # stop reading (and paying for) tokens nobody will use
+
+
+providers.register(providers.Provider(
+    name='groq',
+    available=lambda: Groq is not None and bool(_get_api_key()),
+    models=lambda task: task.models,
+    complete=complete,
+    stream=stream,
+    guard=llm_guard.call,
+    down=llm_guard.circuit_open,
+))
+
+
+class _Outcome(NamedTuple):
+    """What one task produced: its items (empty on failure), the errors on the way, and the provider and model used."""
+    items: List[Dict]
+    errors: List[str]
+    source: str | None = None
+    model: str | None = None
+    usage: providers.Usage = providers.Usage()
+
+
+class GenerationResult(NamedTuple):
+    """How one generation went. It is returned with the generated items, and the worker stores it on the Document.
+
+    ``source`` is the provider that produced the items ('groq', 'anthropic', or
+    several joined with '+'), 'mock' when any part fell back to mock content,
+    or 'cache' for a reused cached generation. ``latency`` is in seconds. Token
+    counts cover every attempt whose usage the provider reported, failed ones
+    included, but not hedged or raced requests that lost.
+    """
+    source: str
+    model: str | None = None
+    latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    errors: Tuple[str, ...] = ()
+
+    @property
+    def error(self) -> str | None:
+        return '; '.join(self.errors)[:300] or None
+
+
+def _try_model(provider: providers.Provider, model: str, task: Task) -> _Outcome:
+    """Run ``task`` on one model of ``provider``, recording its latency."""
+    start = time.monotonic()
+    name = f"{provider.name}/{model}"
+    try:
+        completion = provider.guard(provider.complete, model, task)
+    except llm_guard.Unavailable as e:
+        return _Outcome([], [f"{name}: {e}"])  # never sent, so nothing to measure
+    except Exception as e:
+        providers.record(provider.name, model, time.monotonic() - start, False)
+        return _Outcome([], [f"{name}: {str(e)[:200]}"])
+    items = task.normalize(parse_json_array(completion.text))
+    providers.record(provider.name, model, time.monotonic() - start, bool(items))
+    if items:
+        return _Outcome(items[:task.limit], [], provider.name, model, completion.usage)
+    return _Outcome([], [f"{name}: Empty or unparseable model output"], usage=completion.usage)
+
+
+def _walk(provider: providers.Provider, models: List[str], task: Task) -> _Outcome:
+    errors: List[str] = []
+    usage = providers.Usage()
+    for m in models:
+        outcome = _try_model(provider, m, task)
+        usage += outcome.usage
+        if outcome.items:
+            return outcome._replace(errors=errors, usage=usage)
+        errors.extend(outcome.errors)
+        if provider.down():  # the other models are behind the same provider
+            break
+    return _Outcome([], errors, usage=usage)
+
+
+def _try_chain(task: Task) -> _Outcome:
+    """Try ``task`` on each provider's models in ``providers.plan`` order until one produces items.
+
+    With LLM_HEDGE, each provider's models are walked on a thread of their own,
+    and the next provider is started once the current one has been slower
+    than its hedge delay, rather than only after it failed.
+    """
+    plan = providers.plan(task)
+    if not plan:
+        return _Outcome([], [CIRCUIT_OPEN])
+    errors: List[str] = []
+    usage = providers.Usage()
+    if providers.hedge_after(plan[0][0]) is None:
+        for provider, models in plan:
+            outcome = _walk(provider, models, task)
+            usage += outcome.usage
+            if outcome.items:
+                return outcome._replace(errors=errors + outcome.errors, usage=usage)
+            errors.extend(outcome.errors)
+        return _Outcome([], errors, usage=usage)
+
+    done: queue.Queue = queue.Queue()
+    pending = list(plan)
+
+    def start_next() -> float | None:
+        provider, models = pending.pop(0)
+        # a plain thread: hedges must not wait for a worker of the pool that is running this task
+        threading.Thread(target=lambda: done.put(_walk(provider, models, task)), daemon=True).start()
+        return providers.hedge_after(provider)
+
+    delay = start_next()
+    started, finished = 1, 0
+    while finished < started:
         try:
-            resp = client.chat.completions.create(
-                model=m,
-                temperature=0.2,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": user_prompt},
-                ],
-                max_tokens=800,
-            )
-            content = resp.choices[0].message.content if resp.choices else ''
+            outcome = done.get(timeout=delay if pending else None)
+        except queue.Empty:
+            delay = start_next()  # hedge: the slower request keeps going, first usable answer wins
+            started += 1
+            continue
+        finished += 1
+        usage += outcome.usage
+        if outcome.items:
+            return outcome._replace(errors=errors + outcome.errors, usage=usage)
+        errors.extend(outcome.errors)
+        if pending and finished == started:
+            delay = start_next()
+            started += 1
+    return _Outcome([], errors, usage=usage)
+
+
+def _stream_model(provider: providers.Provider, model: str, task: Task,
+                  emit: Callable[[Dict], None], stop: threading.Event) -> providers.Usage:
+    """Stream ``task`` from one model, passing each item to ``emit`` as it closes. Returns the tokens used."""
+    emitted = 0
+    usage = providers.Usage()
+    parser = JsonArrayParser()
+    chunks = provider.stream(model, task)
+    try:
+        for delta in chunks:
+            if isinstance(delta, providers.Usage):
+                usage = delta
+                continue
+            for obj in parser.feed(delta):
+                for item in task.normalize([obj]) if isinstance(obj, dict) else []:
+                    emit(item)
+                    emitted += 1
+            if emitted >= task.limit or stop.is_set():
+                break
+    finally:
+        chunks.close()
+    return usage
+
+
+def _stream_chain(task: Task, emit: Callable[[Dict], None], stop: threading.Event) -> _Outcome:
+    """``_try_chain`` for streaming: the next model is tried only while nothing has been emitted.
+
+    The returned outcome counts the items, since they were already handed to ``emit``.
+    """
+    plan = providers.plan(task)
+    if not plan:
+        return _Outcome([], [CIRCUIT_OPEN])
+    errors: List[str] = []
+    emitted: List[Dict] = []
+    usage = providers.Usage()
+
+    def counted(item: Dict) -> None:
+        emitted.append(item)
+        emit(item)
+
+    for provider, models in plan:
+        for m in models:
+            start = time.monotonic()
             try:
-                data = json.loads(content)
-            except Exception:
-                arr = _extract_json_array(content)
-                data = json.loads(arr) if arr else []
-            # normalize: map to text + empty choices
-            out: List[Dict] = []
-            for it in data if isinstance(data, list) else []:
-                t = it.get('text') or it.get('prompt') or it.get('question')
-                if t:
-                    out.append({'text': str(t).strip(), 'choices': []})
-            if out:
-                LAST_SOURCE = 'groq'
-                LAST_ERROR = None
-                return out[:max_tickets]
-            errors.append(f"{m}: Empty or unparseable model output")
-        except Exception as e:
-            errors.append(f"{m}: {str(e)[:200]}")
+                usage += provider.guard(_stream_model, provider, m, task, counted, stop)
+                providers.record(provider.name, m, time.monotonic() - start, bool(emitted))
+                if not emitted:
+                    errors.append(f"{provider.name}/{m}: Empty or unparseable model output")
+            except llm_guard.Unavailable as e:
+                errors.append(f"{provider.name}/{m}: {e}")
+            except Exception as e:
+                # a stream that fails part way keeps what it emitted; those items are already in use
+                providers.record(provider.name, m, time.monotonic() - start, False)
+                errors.append(f"{provider.name}/{m}: {str(e)[:200]}")
+            if emitted:
+                return _Outcome(emitted, errors, provider.name, m, usage)
+            if stop.is_set():
+                return _Outcome([], errors, usage=usage)
+            if provider.down():
+                break
+    return _Outcome([], errors, usage=usage)
+
+
+CIRCUIT_OPEN = 'Every LLM provider is down (circuit breaker open); skipped'
+
+
+def _all_down() -> bool:
+    enabled = providers.enabled()
+    return bool(enabled) and all(p.down() for p in enabled)
+
+
+def _skipped(tasks: List[Task]) -> List[_Outcome] | None:
+    # While every provider is down nothing is queued, so the caller goes straight to the mocks
+    return [_Outcome([], [CIRCUIT_OPEN]) for _ in tasks] if _all_down() else None
+
+
+def _run_tasks(tasks: List[Task], deadline: float | None, race: bool) -> List[_Outcome]:
+    """Run ``tasks`` concurrently on the shared pool and collect an outcome per task.
+
+    Without ``race`` each task walks its provider plan in order on one worker.
+    With ``race`` every (task, provider, model) is submitted at once and the
+    first in plan order that produced items wins. Work still running at
+    ``deadline`` seconds is abandoned and reported as an error.
+    """
+    skipped = _skipped(tasks)
+    if skipped:
+        return skipped
+    executor = _get_executor()
+    end = time.monotonic() + deadline if deadline is not None else None
+
+    def remaining() -> float | None:
+        return None if end is None else max(0.0, end - time.monotonic())
+
+    if race:
+        pending = [[executor.submit(_try_model, provider, m, task)
+                    for provider, models in providers.plan(task) for m in models] for task in tasks]
+    else:
+        pending = [[executor.submit(_try_chain, task)] for task in tasks]
+
+    results: List[_Outcome] = []
+    for futures in pending:
+        outcome = _Outcome([], [] if futures else [CIRCUIT_OPEN])
+        i = -1
+        for i, future in enumerate(futures):
+            try:
+                got = future.result(timeout=remaining())
+            except FutureTimeout:
+                outcome = outcome._replace(errors=outcome.errors + ['Generation deadline exceeded'])
+                break
+            if not race:
+                outcome = got
+            else:
+                got = got._replace(errors=outcome.errors + got.errors, usage=outcome.usage + got.usage)
+                outcome = got
+                if got.items:
+                    break
+        for future in futures[i + 1:]:
+            future.cancel()
+        results.append(outcome)
+    return results
 
-    LAST_SOURCE = 'mock'
-    LAST_ERROR = '; '.join(errors)[:300] if errors else 'Unknown error'
-    return [
-        {'text': 'In 2–3 sentences, explain one new concept you learned today and how you might apply it next week.', 'choices': []},
-        {'text': 'Describe a real-world scenario where today’s topic would be useful. What steps would you take?', 'choices': []},
-        {'text': 'What part of today’s lesson still feels unclear, and how would you try to resolve it?', 'choices': []},
-    ][:max_tickets]
 
+def _run_bounded(tasks: List[Task], deadline: float | None, limit: int) -> List[_Outcome]:
+    """Like ``_run_tasks`` without racing, but with at most ``limit`` tasks in flight.
 
-def generate_questions_from_text(text: str, max_questions: int = 6) -> List[Dict]:
-    """Create multiple-choice questions from text using Groq chat completions.
+    The next task is submitted as soon as one finishes, so a long document
+    neither floods the shared pool nor waits for whole batches to complete.
+    """
+    skipped = _skipped(tasks)
+    if skipped:
+        return skipped
+    executor = _get_executor()
+    end = time.monotonic() + deadline if deadline is not None else None
+    results: List[_Outcome] = [_Outcome([], ['Generation deadline exceeded'])] * len(tasks)
+    queued = iter(enumerate(tasks))
+    running = {}
+
+    def submit_next() -> None:
+        for index, task in queued:
+            running[executor.submit(_try_chain, task)] = index
+            return
+
+    for _ in range(max(1, limit)):
+        submit_next()
+    while running:
+        timeout = None if end is None else max(0.0, end - time.monotonic())
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            results[running.pop(future)] = future.result()
+            submit_next()
+    for future in running:
+        future.cancel()
+    return results
 
-    Returns a list of dicts with keys: text, choices (list[str]).
-    Falls back to a small mock set when the API key is missing or on errors.
+
+def split_into_chunks(text: str, limit: int = MATERIAL_CHAR_LIMIT) -> List[str]:
+    """Pack whole pages/slides (separated by ``PAGE_BREAK``) into chunks of at most ``limit`` characters.
+
+    Pages longer than ``limit`` are cut at line breaks, or mid-line as a last resort.
     """
-    global LAST_SOURCE, LAST_ERROR
-    api_key = _get_api_key()
-    model = _get_model()
-    if not api_key or Groq is None:
-        LAST_SOURCE = 'mock'
-        LAST_ERROR = None if api_key else 'Missing GROQ_API_KEY'
-        return MOCK_QUESTIONS[:max_questions]
+    pieces: List[str] = []
+    for page in (text or '').split(PAGE_BREAK):
+        page = page.strip()
+        if len(page) <= limit:
+            pieces.append(page)
+            continue
+        current = ''
+        for line in page.split('\n'):
+            while len(line) > limit:
+                pieces.extend([current, line[:limit]] if current else [line[:limit]])
+                current, line = '', line[limit:]
+            if current and len(current) + 1 + len(line) > limit:
+                pieces.append(current)
+                current = line
+            else:
+                current = f'{current}\n{line}' if current else line
+        pieces.append(current)
+
+    chunks: List[str] = []
+    current = ''
+    for piece in filter(None, pieces):
+        if current and len(current) + 2 + len(piece) > limit:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f'{current}\n\n{piece}' if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
 
-    client = Groq(api_key=api_key)
 
-    system_msg = (
-        "You generate clear, concise multiple-choice questions from provided teaching materials. "
-        "Only output valid JSON as requested; do not include prose or markdown."
+def _spread(chunks: List[str], n: int) -> List[str]:
+    # n chunks evenly spaced from first to last, so sampling still covers the whole document
+    if len(chunks) <= n:
+        return chunks
+    if n <= 1:
+        return chunks[:1]
+    return [chunks[round(i * (len(chunks) - 1) / (n - 1))] for i in range(n)]
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def merge_generated(per_chunk: List[List[Dict]], limit: int | None = None, threshold: float = 0.8) -> List[Dict]:
+    """Interleave per-chunk items round-robin, dropping near-duplicates.
+
+    An item is a duplicate when the Jaccard similarity of its word set with an
+    earlier item reaches ``threshold``. Round-robin order keeps a ``limit`` cut
+    spread across the whole document instead of favouring the first chunks.
+    """
+    merged: List[Dict] = []
+    seen: List[set] = []
+    for row in itertools.zip_longest(*per_chunk):
+        for item in row:
+            if item is None:
+                continue
+            words = _words(item['text'])
+            if any(len(words & other) >= threshold * len(words | other) for other in seen):
+                continue
+            seen.append(words)
+            merged.append(item)
+            if limit is not None and len(merged) >= limit:
+                return merged
+    return merged
+
+
+def _unconfigured(started: float) -> GenerationResult | None:
+    """The mock result when no LLM provider is configured, else None."""
+    if providers.enabled():
+        return None
+    return GenerationResult('mock', latency=time.monotonic() - started,
+                            errors=() if _get_api_key() else ('Missing GROQ_API_KEY',))
+
+
+def _joined(values) -> str | None:
+    return '+'.join(sorted({v for value in values if value for v in value.split('+')})) or None
+
+
+def _combine(outcomes: List[_Outcome], items: List[Dict]) -> _Outcome:
+    # merge per-chunk outcomes into one, for _finish
+    return _Outcome(
+        items, [e for o in outcomes for e in o.errors], _joined(o.source for o in outcomes),
+        _joined(o.model for o in outcomes), sum((o.usage for o in outcomes), providers.Usage()),
     )
 
-    user_prompt = (
-        "From the material below, write up to {n} multiple-choice questions.\n"
-        "Each item must be a JSON object with keys: text (string), choices (array of exactly 4 strings).\n"
-        "Return a single JSON array only. No explanations.\n\n"
-        "MATERIAL:\n{material}"
-    ).format(n=max_questions, material=(text or '')[:12000])
 
-    # Try the requested model, then a small set of known fallbacks
-    fallbacks = []
-    fb_env = os.getenv('GROQ_FALLBACK_MODEL')
-    if fb_env and fb_env != model:
-        fallbacks.append(fb_env)
-    for cand in ('llama-3.1-8b-instant'):
-        if cand != model and cand not in fallbacks:
-            fallbacks.append(cand)
+def _finish(
+    results: List[_Outcome], mocks: List[List[Dict]], started: float
+) -> Tuple[List[List[Dict]], GenerationResult]:
+    """Substitute mock items for failed tasks, and describe the whole generation."""
+    errors = tuple(e for result in results for e in result.errors if e)
+    fell_back = not all(result.items for result in results)
+    usage = sum((result.usage for result in results), providers.Usage())
+    generation = GenerationResult(
+        source='mock' if fell_back else _joined(result.source for result in results) or 'groq',
+        model=_joined(result.model for result in results),
+        latency=time.monotonic() - started,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        errors=errors or (('Unknown error',) if fell_back else ()),
+    )
+    return [result.items or mock for result, mock in zip(results, mocks)], generation
+
+
+class GenerationStream:
+    """The ``(kind, item)`` pairs of a streaming generation; ``result`` is set once they are exhausted."""
+
+    def __init__(self, items: Iterator[Tuple[str, Dict]]):
+        self._items = items
+        self.result: GenerationResult | None = None
+
+    def __iter__(self):
+        self.result = yield from self._items
+
+
+def _stream(
+    tasks: List[Tuple[str, Task]], mocks: Dict[str, List[Dict]], limits: Dict[str, int | None],
+    deadline: float | None, in_flight: int,
+) -> Iterator[Tuple[str, Dict]]:
+    """Run ``(kind, task)`` pairs with at most ``in_flight`` at once and yield ``(kind, item)`` as items arrive.
+
+    Items are yielded in the calling thread, so the caller can store each one
+    straight away. Near-duplicates of an item already yielded for the same kind
+    are dropped, and at most ``limits[kind]`` items are yielded per kind. When
+    everything has finished, or ``deadline`` seconds have passed, a kind that
+    produced nothing yields its mock items instead. Returns the ``GenerationResult``.
+    """
+    started = time.monotonic()
+    unconfigured = _unconfigured(started)
+    if unconfigured:
+        for kind, items in mocks.items():
+            for item in items:
+                yield kind, item
+        return unconfigured
 
-    errors: list[str] = []
-    for m in [model] + fallbacks:
+    yielded: Dict[str, List[Dict]] = {kind: [] for kind in mocks}
+    outcomes: Dict[str, List[_Outcome]] = {kind: [] for kind in mocks}
+    if _all_down():
+        for kind in mocks:
+            outcomes[kind].append(_Outcome([], [CIRCUIT_OPEN]))
+        tasks = []
+
+    executor = _get_executor()
+    end = time.monotonic() + deadline if deadline is not None else None
+    out: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    queued = iter(tasks)
+    running = 0
+    unfinished = {kind: sum(k == kind for k, _ in tasks) for kind in mocks}
+
+    def run(kind: str, task: Task) -> None:
         try:
-            resp = client.chat.completions.create(
-                model=m,
-                temperature=0.2,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": user_prompt},
-                ],
-                max_tokens=1200,
-            )
-            content = resp.choices[0].message.content if resp.choices else ''
-            try:
-                data = json.loads(content)
-            except Exception:
-                arr = _extract_json_array(content)
-                data = json.loads(arr) if arr else []
-            normalized = _normalize_items(data)
-            if normalized:
-                LAST_SOURCE = 'groq'
-                LAST_ERROR = None
-                return normalized[:max_questions]
-            errors.append(f"{m}: Empty or unparseable model output")
+            outcome = _stream_chain(task, lambda item: out.put(('item', kind, item)), stop)
         except Exception as e:
-            msg = str(e)
-            errors.append(f"{m}: {msg[:200]}")
+            outcome = _Outcome([], [str(e)[:200]])
+        out.put(('done', kind, outcome))
+
+    def submit_next() -> int:
+        for kind, task in queued:
+            executor.submit(run, kind, task)
+            return 1
+        return 0
+
+    for _ in range(max(1, in_flight)):
+        running += submit_next()
+    seen: Dict[str, List[set]] = {kind: [] for kind in mocks}
+    try:
+        while running:
+            timeout = None if end is None else max(0.0, end - time.monotonic())
+            try:
+                event, kind, payload = out.get(timeout=timeout)
+            except queue.Empty:
+                for kind, count in unfinished.items():
+                    if count:
+                        outcomes[kind].append(_Outcome([], ['Generation deadline exceeded']))
+                break
+            if event == 'done':
+                outcomes[kind].append(payload)
+                unfinished[kind] -= 1
+                running -= 1
+                running += submit_next()
+                continue
+            limit = limits.get(kind)
+            words = _words(payload['text'])
+            if (limit is not None and len(yielded[kind]) >= limit) or any(
+                len(words & other) >= 0.8 * len(words | other) for other in seen[kind]
+            ):
+                continue
+            seen[kind].append(words)
+            yielded[kind].append(payload)
+            yield kind, payload
+    finally:
+        stop.set()
+
+    results = [_combine(outcomes[kind], yielded[kind]) for kind in mocks]
+    final, generation = _finish(results, list(mocks.values()), started)
+    for kind, result, items in zip(mocks, results, final):
+        if not result.items:
+            for item in items:
+                yield kind, item
+    return generation
+
+
+def stream_all_from_text(
+    text: str, max_questions: int = 6, max_tickets: int = 3, deadline: float | None = None
+) -> GenerationStream:
+    """Streaming ``generate_all_from_text``: yields ``('mcq' | 'exit', item)`` as each item is generated.
+
+    Both prompts are streamed at once, and each question is yielded as soon as
+    its JSON object closes rather than when the whole completion is done.
+    """
+    return GenerationStream(_stream(
+        [('mcq', mcq_task(text, max_questions)), ('exit', exit_task(text, max_tickets))],
+        {'mcq': MOCK_QUESTIONS[:max_questions], 'exit': MOCK_EXIT_TICKETS[:max_tickets]},
+        {}, deadline if deadline is not None else _default_deadline(), 2,
+    ))
+
+
+def stream_chunked_from_text(
+    text: str, max_questions: int = 6, max_tickets: int = 3, questions_per_chunk: int = 3,
+    deadline: float | None = None,
+) -> GenerationStream:
+    """Streaming ``generate_chunked_from_text``: the chunk requests stream, and items are yielded as they close.
+
+    Items come in arrival order rather than round-robin over the chunks, so
+    the first questions of a long document show up after one chunk's worth of
+    tokens.
+    """
+    chunks = _spread(split_into_chunks(text), _chunk_budget(max_tickets))
+    if len(chunks) <= 1:
+        return stream_all_from_text(text, max_questions=max_questions, max_tickets=max_tickets, deadline=deadline)
+    return GenerationStream(_stream(
+        [('mcq', mcq_task(chunk, questions_per_chunk)) for chunk in chunks]
+        + [('exit', exit_task(chunk, 1)) for chunk in _spread(chunks, max_tickets)],
+        {'mcq': MOCK_QUESTIONS[:max_questions], 'exit': MOCK_EXIT_TICKETS[:max_tickets]},
+        {'exit': max_tickets}, deadline if deadline is not None else _default_deadline(), _max_in_flight(),
+    ))
+
+
+def generate_all_from_text(
+    text: str, max_questions: int = 6, max_tickets: int = 3, deadline: float | None = None
+) -> Tuple[List[Dict], List[Dict], GenerationResult]:
+    """Generate MCQs and exit tickets concurrently on the enabled LLM providers (see ``providers``).
+
+    Returns ``(questions, exit_tickets, result)`` once both finish or
+    ``deadline`` seconds (default ``GROQ_GENERATION_DEADLINE``) pass; anything
+    not ready by then falls back to the mock set.
+    """
+    started = time.monotonic()
+    mocks = [MOCK_QUESTIONS[:max_questions], MOCK_EXIT_TICKETS[:max_tickets]]
+    unconfigured = _unconfigured(started)
+    if unconfigured:
+        return mocks[0], mocks[1], unconfigured
+    results = _run_tasks(
+        [mcq_task(text, max_questions), exit_task(text, max_tickets)],
+        deadline if deadline is not None else _default_deadline(),
+        _race_fallbacks(),
+    )
+    (questions, tickets), generation = _finish(results, mocks, started)
+    return questions, tickets, generation
+
+
+def generate_chunked_from_text(
+    text: str, max_questions: int = 6, max_tickets: int = 3, questions_per_chunk: int = 3,
+    deadline: float | None = None,
+) -> Tuple[List[Dict], List[Dict], GenerationResult]:
+    """Map-reduce generation covering the whole material, not just one prompt's worth of it.
 
-    LAST_SOURCE = 'mock'
-    LAST_ERROR = '; '.join(errors)[:300] if errors else 'Unknown error'
-    return MOCK_QUESTIONS[:max_questions]
+    The text is split at page/slide boundaries into chunks (at most
+    ``GROQ_MAX_CHUNKS``, fewer if the rate limiter could not admit them in time,
+    sampled evenly over the document). Each chunk gets its
+    own MCQ request for ``questions_per_chunk`` questions, and ``max_tickets``
+    spread-out chunks get an exit ticket request. The requests run with at most
+    ``GROQ_MAX_IN_FLIGHT`` in flight, and the results are merged with
+    near-duplicates dropped. Material that fits in one chunk is handled by
+    ``generate_all_from_text``.
+    """
+    started = time.monotonic()
+    chunks = _spread(split_into_chunks(text), _chunk_budget(max_tickets))
+    if len(chunks) <= 1:
+        return generate_all_from_text(text, max_questions=max_questions, max_tickets=max_tickets, deadline=deadline)
+    mocks = [MOCK_QUESTIONS[:max_questions], MOCK_EXIT_TICKETS[:max_tickets]]
+    unconfigured = _unconfigured(started)
+    if unconfigured:
+        return mocks[0], mocks[1], unconfigured
+
+    mcq_tasks = [mcq_task(chunk, questions_per_chunk) for chunk in chunks]
+    exit_tasks = [exit_task(chunk, 1) for chunk in _spread(chunks, max_tickets)]
+    results = _run_bounded(
+        mcq_tasks + exit_tasks,
+        deadline if deadline is not None else _default_deadline(), _max_in_flight(),
+    )
+    mcq_results, exit_results = results[:len(mcq_tasks)], results[len(mcq_tasks):]
+    merged = [
+        _combine(mcq_results, merge_generated([r.items for r in mcq_results])),
+        _combine(exit_results, merge_generated([r.items for r in exit_results], limit=max_tickets)),
+    ]
+    (questions, tickets), generation = _finish(merged, mocks, started)
+    return questions, tickets, generation
+
+
+def generate_exit_tickets_from_text(text: str, max_tickets: int = 3) -> Tuple[List[Dict], GenerationResult]:
+    """Create short-response exit ticket prompts from text.
+
+    Returns ``(tickets, result)``; each ticket is a dict with keys: text
+    (prompt), choices (an empty list). Falls back to a small mock set when no
+    provider is configured or on errors.
+    """
+    started = time.monotonic()
+    unconfigured = _unconfigured(started)
+    if unconfigured:
+        return MOCK_EXIT_TICKETS[:max_tickets], unconfigured
+    results = _run_tasks([exit_task(text, max_tickets)], _default_deadline(), _race_fallbacks())
+    (tickets,), generation = _finish(results, [MOCK_EXIT_TICKETS[:max_tickets]], started)
+    return tickets, generation
+
+
+def generate_questions_from_text(text: str, max_questions: int = 6) -> Tuple[List[Dict], GenerationResult]:
+    """Create multiple-choice questions from text.
+
+    Returns ``(questions, result)``; each question is a dict with keys: text,
+    choices (list[str]). Falls back to a small mock set when no provider is
+    configured or on errors.
+    """
+    started = time.monotonic()
+    unconfigured = _unconfigured(started)
+    if unconfigured:
+        return MOCK_QUESTIONS[:max_questions], unconfigured
+    results = _run_tasks([mcq_task(text, max_questions)], _default_deadline(), _race_fallbacks())
+    (questions,), generation = _finish(results, [MOCK_QUESTIONS[:max_questions]], started)
+    return questions, generation
@@ -0,0 +1,265 @@
+"""Process-wide admission control for LLM requests.
+
+Every call to the provider goes through ``call``, which applies three limits
+shared by all threads of the process:
+
+* a token bucket: GROQ_RATE_LIMIT requests per second on average, with bursts
+  of up to GROQ_RATE_BURST (0 turns the limit off)
+* a cap of GROQ_MAX_CONCURRENT requests in flight at once
+* a circuit breaker that opens after GROQ_BREAKER_THRESHOLD consecutive
+  provider failures (HTTP 429, 5xx, connection errors and timeouts)
+
+While the breaker is open, calls raise ``Unavailable`` at once instead of
+waiting out a timeout per fallback model, and generation uses the mock
+content. After GROQ_BREAKER_COOLDOWN seconds a single probe request is let
+through: success closes the breaker, failure opens it for another cooldown.
+A 429 with a ``Retry-After`` header also holds the bucket for that long.
+
+A call that cannot get a slot and a token within GROQ_QUEUE_TIMEOUT seconds
+raises ``Unavailable`` without being sent. The limits are per process, so with
+several worker processes divide the provider's quota between them.
+
+Each provider gets its own guard from ``get(name)``, configured the same way
+from its own prefix (ANTHROPIC_RATE_LIMIT and so on), so a Groq outage does not
+open Claude's breaker or spend its quota. ``call`` guards Groq.
+
+The defaults follow Groq's free tier (30 requests a minute): 0.5 requests per
+second, a burst of a full minute's quota, and a queue timeout of a minute, so a
+request waits for the next minute's quota rather than failing. Chunked
+generation sends up to GROQ_MAX_CHUNKS requests plus one per exit ticket for a
+single upload, so it asks ``capacity`` first and samples fewer chunks when the
+bucket could not admit them all in time. Otherwise a second upload right after
+a long one would time out in the queue and get mock content without the
+provider being tried.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class Unavailable(Exception):
+    """The request was not sent: the breaker is open or the queue timed out."""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.held_until = 0.0
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def _take(self) -> float:
+        # Take a token if one is available; otherwise return how long until one is
+        now = time.monotonic()
+        if now < self.held_until:
+            return self.held_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting up to ``timeout`` seconds. Returns False if none frees up in time."""
+        end = time.monotonic() + timeout
+        queued = False
+        try:
+            while True:
+                with self.lock:
+                    delay = self._take()
+                    if delay and not queued:
+                        self.waiting += 1
+                        queued = True
+                if not delay:
+                    return True
+                if time.monotonic() + delay > end:
+                    return False
+                time.sleep(delay)
+        finally:
+            if queued:
+                with self.lock:
+                    self.waiting -= 1
+
+    def capacity(self, within: float) -> Optional[int]:
+        """How many more requests could get a token within ``within`` seconds, after those already waiting.
+
+        None when there is no limit.
+        """
+        with self.lock:
+            if self.rate <= 0:
+                return None
+            now = time.monotonic()
+            tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+            refill = max(0.0, now + within - max(now, self.held_until)) * self.rate
+            return max(0, int(tokens + refill) - self.waiting)
+
+    def hold(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (the provider asked us to back off)."""
+        with self.lock:
+            self.held_until = max(self.held_until, time.monotonic() + seconds)
+            self.tokens, self.updated = 0.0, self.held_until
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in the half-open state only one probe at a time is."""
+        if self.threshold <= 0:
+            return True
+        with self.lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self.lock:
+            self.failures, self.opened_at, self.probing = 0, None, False
+
+    def failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.threshold > 0 and (self.probing or self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def cancel(self) -> None:
+        # An allowed request was not sent after all, so the probe slot is free again
+        with self.lock:
+            self.probing = False
+
+
+def _status(exc: Exception) -> Optional[int]:
+    return getattr(exc, 'status_code', None)
+
+
+def is_provider_failure(exc: Exception) -> bool:
+    """Whether ``exc`` means the provider is overloaded or unreachable (not that the request was bad)."""
+    status = _status(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    return isinstance(exc, (OSError, TimeoutError)) or bool(names & {'APIConnectionError', 'APITimeoutError'})
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    if _status(exc) != 429:
+        return None
+    response = getattr(exc, 'response', None)
+    try:
+        return float(response.headers['retry-after'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class Guard:
+    def __init__(self, rate: float, burst: int, concurrency: int, threshold: int, cooldown: float,
+                 queue_timeout: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self.breaker = CircuitBreaker(threshold, cooldown)
+        self.queue_timeout = queue_timeout
+
+    def capacity(self) -> Optional[int]:
+        """Requests the rate limit can admit within the queue timeout, or None without a limit."""
+        return self.bucket.capacity(self.queue_timeout)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        if not self.breaker.allow():
+            raise Unavailable('circuit open')
+        end = time.monotonic() + self.queue_timeout
+        if self.slots is not None and not self.slots.acquire(timeout=self.queue_timeout):
+            self.breaker.cancel()
+            raise Unavailable('too many requests in flight')
+        try:
+            if not self.bucket.acquire(max(0.0, end - time.monotonic())):
+                self.breaker.cancel()
+                raise Unavailable('rate limited')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if is_provider_failure(e):
+                    self.breaker.failure()
+                    delay = retry_after(e)
+                    if delay:
+                        self.bucket.hold(min(delay, self.queue_timeout))
+                else:
+                    self.breaker.success()  # the provider answered, it just rejected this request
+                raise
+            self.breaker.success()
+            return result
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+
+
+# Per-provider (rate, burst) defaults: Groq's free tier of 30 requests a minute and
+# Anthropic's first tier of 50; the other limits share GROQ_'s defaults
+RATE_DEFAULTS = {'groq': ('0.5', '30'), 'anthropic': ('0.8', '50')}
+
+_lock = threading.Lock()
+_guards: Dict[str, Guard] = {}
+
+
+def get(provider: str = 'groq') -> Guard:
+    """Return ``provider``'s process-wide guard, configured from <PROVIDER>_* env vars on first use."""
+    with _lock:
+        guard = _guards.get(provider)
+        if guard is None:
+            prefix = provider.upper()
+            rate, burst = RATE_DEFAULTS.get(provider, RATE_DEFAULTS['groq'])
+            guard = Guard(
+                rate=float(os.getenv(f'{prefix}_RATE_LIMIT', rate)),
+                burst=int(os.getenv(f'{prefix}_RATE_BURST', burst)),
+                concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENT', '6')),
+                threshold=int(os.getenv(f'{prefix}_BREAKER_THRESHOLD', '5')),
+                cooldown=float(os.getenv(f'{prefix}_BREAKER_COOLDOWN', '30')),
+                queue_timeout=float(os.getenv(f'{prefix}_QUEUE_TIMEOUT', '60')),
+            )
+            _guards[provider] = guard
+        return guard
+
+
+def reset() -> None:
+    """Drop every guard and its state; the next call rebuilds it from the environment."""
+    with _lock:
+        _guards.clear()
+
+
+def call(fn: Callable, *args, **kwargs):
+    return get().call(fn, *args, **kwargs)
+
+
+def capacity(provider: str = 'groq') -> Optional[int]:
+    return get(provider).capacity()
+
+
+def circuit_open(provider: str = 'groq') -> bool:
+    return get(provider).breaker.state == 'open'
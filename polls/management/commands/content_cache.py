@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from polls import content_cache
+from polls.models import ContentCacheEntry, ContentCacheStat
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the upload content cache, or evict/clear it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help='Apply the age and size limits now.')
+        parser.add_argument('--clear', action='store_true', help='Delete every entry and reset the counters.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            ContentCacheEntry.objects.all().delete()
+            ContentCacheStat.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS('Content cache cleared.'))
+            return
+        if options['evict']:
+            self.stdout.write(f'Evicted {content_cache.evict()} entr(ies).')
+
+        stats = content_cache.stats()
+        if not stats:
+            self.stdout.write('Content cache is empty.')
+        for kind, s in sorted(stats.items()):
+            lookups = s['hits'] + s['misses']
+            rate = f"{s['hits'] / lookups:.0%}" if lookups else 'n/a'
+            self.stdout.write(
+                f"{kind:<10} hits={s['hits']} misses={s['misses']} hit_rate={rate} "
+                f"entries={s['entries']} size={s['bytes'] / 1024:.1f} KiB"
+            )
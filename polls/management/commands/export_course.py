@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import course_export
+from polls.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Stream every poll and exit-ticket response of a course as NDJSON, CSV or columnar output.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id')
+        parser.add_argument('--format', default='ndjson', choices=list(course_export.EXPORTERS))
+        parser.add_argument('--output', '-o', help='Write to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(id=options['course_id'])
+        except (Course.DoesNotExist, ValueError):
+            raise CommandError(f"No course with id {options['course_id']}.")
+        try:
+            chunks = course_export.export(course, options['format'])
+        except course_export.ExportUnavailable as e:
+            raise CommandError(str(e))
+
+        binary = options['format'] == 'parquet'
+        if options['output']:
+            with open(options['output'], 'wb' if binary else 'w', **({} if binary else {'newline': ''})) as out:
+                for chunk in chunks:
+                    out.write(chunk)
+            self.stderr.write(f"Wrote {options['output']}")
+        elif binary:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from polls.models import GeneratedQuestion
+from polls.question_index import index_existing
+
+
+class Command(BaseCommand):
+    help = 'Add generated questions stored before the near-duplicate index existed to it.'
+
+    def handle(self, *args, **options):
+        pending = GeneratedQuestion.objects.filter(buckets__isnull=True, document__course__isnull=False).select_related('document').order_by('created_at')
+        count = index_existing(pending.iterator())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} question(s).'))
@@ -0,0 +1,41 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from polls.jobs import claim_next_document, process_document, requeue_stale
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Worker that extracts text and generates questions for queued document uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling forever.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait between polls of an empty queue.')
+        parser.add_argument('--stale-minutes', type=float, default=30,
+                            help='Requeue documents stuck extracting/generating for this long (crashed worker).')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        while True:
+            doc = claim_next_document()
+            if doc is None:
+                requeued = requeue_stale(stale_after)
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale document(s).'))
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            self.stdout.write(f'Processing {doc.id} ({doc.title})')
+            try:
+                process_document(doc)
+            except Exception:
+                # one bad document must not stop the worker; requeue_stale retries it later
+                logger.exception('Worker error on document %s', doc.id)
+                continue
+            self.stdout.write(f'{doc.id}: {doc.status}')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.models import Poll
+from polls.tallies import rebuild_tally, tally_drift
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stored poll tallies from raw responses, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('poll_ids', nargs='*', help='Limit to these poll ids (default: all polls).')
+        parser.add_argument('--verify', action='store_true', help='Only report drift; exit non-zero if any is found.')
+
+    def handle(self, *args, **options):
+        polls = Poll.objects.all()
+        if options['poll_ids']:
+            polls = polls.filter(id__in=options['poll_ids'])
+
+        drifted = 0
+        for poll in polls.iterator():
+            if options['verify']:
+                drift = tally_drift(poll)
+                if drift:
+                    drifted += 1
+                    details = ', '.join(f'{k}: stored={s} actual={a}' for k, (s, a) in drift.items())
+                    self.stdout.write(self.style.WARNING(f'{poll.id}: {details}'))
+            else:
+                tally = rebuild_tally(poll)
+                self.stdout.write(f'{poll.id}: rebuilt ({tally.total} responses)')
+
+        if options['verify']:
+            if drifted:
+                raise CommandError(f'{drifted} poll tally(ies) out of sync; run rebuild_tallies to fix.')
+            self.stdout.write(self.style.SUCCESS('All poll tallies match their responses.'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_merge_20251116_0206'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollTally',
+            fields=[
+                ('poll', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tally', serialize=False, to='polls.poll')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('left_total', models.PositiveIntegerField(default=0)),
+                ('left_correct', models.PositiveIntegerField(default=0)),
+                ('right_total', models.PositiveIntegerField(default=0)),
+                ('right_correct', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PollTallyCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('choice_index', models.PositiveSmallIntegerField()),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('prediction_sum', models.BigIntegerField(default=0)),
+                ('tally', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cells', to='polls.polltally')),
+            ],
+            options={
+                'unique_together': {('tally', 'choice_index', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_polltally_polltallycell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polltally',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='polltallycell',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_tally_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('extracting', 'Extracting text'), ('generating', 'Generating questions'), ('done', 'Done'), ('failed', 'Failed')], default='done', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['status', 'uploaded_at'], name='polls_docum_status_6f0d1e_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_document_processing_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentCacheEntry',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('text', 'Extracted text'), ('questions', 'Generated questions')], max_length=20)),
+                ('value', models.JSONField()),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ContentCacheStat',
+            fields=[
+                ('kind', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('hits', models.PositiveBigIntegerField(default=0)),
+                ('misses', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,153 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:14
+
+import json
+import struct
+
+from django.db import migrations, models
+
+BATCH = 500
+EMPTY = {'answer': None, 'team': '', 'ranking': None, 'predictions': None}
+
+
+# Frozen copies of the polls.models packing helpers as of this migration, so
+# later changes to the model code cannot change what this migration writes.
+
+def pack_predictions(predictions):
+    return struct.pack(f'<{len(predictions)}h', *(max(-32768, min(32767, int(p))) for p in predictions))
+
+
+def unpack_ranking(data):
+    return list(bytes(data)) if data is not None else []
+
+
+def unpack_predictions(data):
+    data = bytes(data) if data is not None else b''
+    return list(struct.unpack(f'<{len(data) // 2}h', data))
+
+
+def typed_choice_fields(choice):
+    def is_index(v):
+        return isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= 32767
+
+    if is_index(choice):
+        return {'answer': choice}
+    if isinstance(choice, list) and all(is_index(c) and c < 256 for c in choice):
+        return {'ranking': bytes(choice)}
+    if choice in ('left', 'right'):
+        return {'team': choice}
+    if isinstance(choice, dict):
+        answer = choice.get('answer')
+        if answer is not None and not is_index(answer):
+            return {'choice': choice}
+        if choice.get('team') in ('left', 'right') and set(choice) <= {'team', 'answer'}:
+            return {'team': choice['team'], 'answer': answer}
+        predictions = choice.get('predictions')
+        if isinstance(predictions, list) and set(choice) <= {'predictions', 'answer'} \
+                and all(isinstance(p, int) and not isinstance(p, bool) for p in predictions):
+            return {'predictions': pack_predictions(predictions), 'answer': answer}
+    return {'choice': choice}
+
+
+def _convert(PollResponse, rows, fields_for):
+    """Rewrite ``rows`` (``(id, *columns)`` tuples) with ``fields_for(*columns)``, in keyset-ordered batches.
+
+    Only one batch of ids is held at a time. Within a batch, votes repeat a
+    handful of values, so there is one UPDATE per distinct value rather than
+    per row. ``fields_for`` returns None to leave a row as it is.
+    """
+    last = None
+    while True:
+        batch = rows.order_by('id')
+        if last is not None:
+            batch = batch.filter(id__gt=last)
+        batch = list(batch[:BATCH])
+        if not batch:
+            return
+        last = batch[-1][0]
+        groups = {}
+        for pk, *columns in batch:
+            fields = fields_for(*columns)
+            if fields is None:
+                continue
+            key = json.dumps(fields, sort_keys=True, default=bytes.hex)
+            groups.setdefault(key, (fields, []))[1].append(pk)
+        for fields, ids in groups.values():
+            PollResponse.objects.filter(pk__in=ids).update(**fields)
+
+
+def _typed_fields(choice):
+    fields = {**EMPTY, 'choice': None, **typed_choice_fields(choice)}
+    # None keeps the JSON of a vote with no typed representation
+    return fields if fields['choice'] is None else None
+
+
+def _json_fields(answer, team, ranking, predictions):
+    if ranking is not None:
+        choice = unpack_ranking(ranking)
+    elif predictions is not None:
+        choice = {'predictions': unpack_predictions(predictions), 'answer': answer}
+    elif team:
+        choice = {'team': team, 'answer': answer} if answer is not None else team
+    else:
+        choice = answer
+    return {**EMPTY, 'choice': choice}
+
+
+def to_typed_columns(apps, schema_editor):
+    PollResponse = apps.get_model('polls', 'PollResponse')
+    rows = PollResponse.objects.filter(choice__isnull=False).values_list('id', 'choice')
+    _convert(PollResponse, rows, _typed_fields)
+
+
+def to_json_choice(apps, schema_editor):
+    PollResponse = apps.get_model('polls', 'PollResponse')
+    rows = PollResponse.objects.filter(choice__isnull=True).values_list('id', 'answer', 'team', 'ranking', 'predictions')
+    _convert(PollResponse, rows, _json_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_content_cache'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pollresponse',
+            name='polls_pollr_poll_id_61d106_idx',
+        ),
+        migrations.AddField(
+            model_name='pollresponse',
+            name='answer',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pollresponse',
+            name='predictions',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pollresponse',
+            name='ranking',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pollresponse',
+            name='team',
+            field=models.CharField(blank=True, choices=[('left', 'Left'), ('right', 'Right')], default='', max_length=5),
+        ),
+        migrations.AlterField(
+            model_name='pollresponse',
+            name='choice',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(to_typed_columns, to_json_choice),
+        migrations.AddIndex(
+            model_name='pollresponse',
+            index=models.Index(fields=['poll', 'answer'], name='polls_pollr_poll_id_deb4bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollresponse',
+            index=models.Index(fields=['poll', 'team', 'answer'], name='polls_pollr_poll_id_79352e_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_typed_poll_responses'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exitticketresponse',
+            name='polls_exitt_ticket__8cc31c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='exitticketresponse',
+            index=models.Index(fields=['ticket', 'created_at', 'id'], name='polls_exitt_ticket__4a0469_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0015_exit_ticket_response_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exitticketresponse',
+            index=models.Index(fields=['created_at', 'id'], name='polls_exitt_created_c953d3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollresponse',
+            index=models.Index(fields=['created_at', 'id'], name='polls_pollr_created_c96d91_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollresponse',
+            index=models.Index(fields=['poll', 'created_at', 'id'], name='polls_pollr_poll_id_9c16fa_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0016_response_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedquestion',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='polls.generatedquestion'),
+        ),
+        migrations.CreateModel(
+            name='QuestionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='polls.course')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='polls.generatedquestion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'bucket'], name='polls_quest_course__84586f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0017_question_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='generation_errors',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='generation_latency',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='generation_model',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='generation_source',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0018_document_generation_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='material_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='packed_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
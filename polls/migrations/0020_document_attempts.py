@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0019_document_packed_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
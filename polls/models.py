@@ -1,20 +1,51 @@
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
+import struct
 import uuid
 
 
 class Document(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('extracting', 'Extracting text'),
+        ('generating', 'Generating questions'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.FileField(upload_to='documents/')
     title = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(default=timezone.now)
     # Optional link to a course (class)
     course = models.ForeignKey('Course', null=True, blank=True, on_delete=models.SET_NULL, related_name='documents')
+    # Background processing state, driven by the process_documents worker (see polls.jobs)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='done')
+    status_changed_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    # Times a worker has claimed the document; past DOCUMENT_MAX_ATTEMPTS a stuck document fails instead of requeueing
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # How the questions were generated (llm_client.GenerationResult); source is 'mock' on fallback, 'cache' on reuse
+    generation_source = models.CharField(max_length=40, blank=True)
+    generation_model = models.CharField(max_length=200, blank=True)
+    generation_latency = models.FloatField(null=True, blank=True)  # seconds
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    generation_errors = models.TextField(blank=True)
+    # Estimated tokens of the extracted text, and of what is left after prompt_packing cleaned and packed it
+    material_tokens = models.PositiveIntegerField(null=True, blank=True)
+    packed_tokens = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'uploaded_at'])]
 
     def __str__(self):
         return self.title or str(self.id)
 
+    @property
+    def is_processing(self):
+        return self.status in ('queued', 'extracting', 'generating')
+
 
 class GeneratedQuestion(models.Model):
     STATUS_CHOICES = [('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')]
@@ -26,11 +57,23 @@ class GeneratedQuestion(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='mcq')
     created_at = models.DateTimeField(default=timezone.now)
+    # An earlier question of the same course this one nearly repeats
+    duplicate_of = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='near_duplicates')
 
     def __str__(self):
         return f"{self.get_kind_display()} from {self.document_id}: {self.text[:60]}"
 
 
+class QuestionBucket(models.Model):
+    """One LSH band of a generated question's MinHash, for near-duplicate lookups within a course."""
+    question = models.ForeignKey(GeneratedQuestion, on_delete=models.CASCADE, related_name='buckets')
+    course = models.ForeignKey('Course', null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['course', 'bucket'])]
+
+
 class Poll(models.Model):
     FORMAT_CHOICES = [
         ('single_choice', 'Single Choice'),
@@ -54,14 +97,98 @@ class Poll(models.Model):
         return self.question_text[:80]
 
 
+def pack_ranking(ranking) -> bytes:
+    """Pack a ranking (choice indices, best first) into one byte per position."""
+    return bytes(ranking)
+
+
+def pack_predictions(predictions) -> bytes:
+    """Pack predicted percentages as little-endian int16s, clamped to that range."""
+    return struct.pack(f'<{len(predictions)}h', *(max(-32768, min(32767, int(p))) for p in predictions))
+
+
+def unpack_ranking(data) -> list:
+    return list(bytes(data)) if data is not None else []
+
+
+def unpack_predictions(data) -> list:
+    data = bytes(data) if data is not None else b''
+    return list(struct.unpack(f'<{len(data) // 2}h', data))
+
+
+def typed_choice_fields(choice) -> dict:
+    """Map a vote in its submitted JSON shape onto PollResponse's typed columns.
+
+    Shapes: ``int`` answer index, ``[choice indices by rank]``, ``{"team", "answer"}``,
+    ``{"predictions", "answer"}`` or a bare team side (old team battle rows).
+    Anything else is kept verbatim in ``choice``.
+    """
+    def is_index(v):
+        return isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= 32767
+
+    if is_index(choice):
+        return {'answer': choice}
+    if isinstance(choice, list) and all(is_index(c) and c < 256 for c in choice):
+        return {'ranking': pack_ranking(choice)}
+    if choice in ('left', 'right'):
+        return {'team': choice}
+    if isinstance(choice, dict):
+        answer = choice.get('answer')
+        if answer is not None and not is_index(answer):
+            return {'choice': choice}
+        if choice.get('team') in ('left', 'right') and set(choice) <= {'team', 'answer'}:
+            return {'team': choice['team'], 'answer': answer}
+        predictions = choice.get('predictions')
+        if isinstance(predictions, list) and set(choice) <= {'predictions', 'answer'} \
+                and all(isinstance(p, int) and not isinstance(p, bool) for p in predictions):
+            return {'predictions': pack_predictions(predictions), 'answer': answer}
+    return {'choice': choice}
+
+
 class PollResponse(models.Model):
+    TEAM_CHOICES = [('left', 'Left'), ('right', 'Right')]
+    # Columns the tallies are computed from, in the order aggregation.add_response takes them
+    TYPED_FIELDS = ('answer', 'team', 'ranking', 'predictions')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='responses')
-    choice = models.JSONField()  # For single_choice: int, For speed_ranking: list of ints [rank1_idx, rank2_idx, ...]
+    # Answer choice index: single choice, team battle and meta prediction
+    answer = models.SmallIntegerField(null=True, blank=True)
+    team = models.CharField(max_length=5, choices=TEAM_CHOICES, blank=True, default='')
+    # Speed ranking: choice indices best first, one byte each (see pack_ranking)
+    ranking = models.BinaryField(null=True, blank=True)
+    # Meta prediction: predicted percentage per choice as int16s (see pack_predictions)
+    predictions = models.BinaryField(null=True, blank=True)
+    # Only votes that don't fit the typed columns above keep their raw JSON here
+    choice = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        indexes = [models.Index(fields=['poll', 'choice'])]
+        indexes = [
+            models.Index(fields=['poll', 'answer']),
+            models.Index(fields=['poll', 'team', 'answer']),
+            # newest-first listings (admin change list, date hierarchy), overall and per poll
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['poll', 'created_at', 'id']),
+        ]
+
+    @classmethod
+    def from_choice(cls, choice, **kwargs) -> 'PollResponse':
+        """Build an unsaved response from a vote in its submitted JSON shape."""
+        return cls(**typed_choice_fields(choice), **kwargs)
+
+    @property
+    def value(self):
+        """The vote in its original JSON shape, rebuilt from the typed columns."""
+        if self.choice is not None:
+            return self.choice
+        if self.ranking is not None:
+            return unpack_ranking(self.ranking)
+        if self.predictions is not None:
+            return {'predictions': unpack_predictions(self.predictions), 'answer': self.answer}
+        if self.team:
+            return {'team': self.team, 'answer': self.answer} if self.answer is not None else self.team
+        return self.answer
 
 
 class ExitTicket(models.Model):
@@ -82,7 +209,11 @@ class ExitTicketResponse(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        indexes = [models.Index(fields=['ticket'])]
+        # keyset pagination and exports walk (created_at, id) within a ticket
+        indexes = [
+            models.Index(fields=['ticket', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
 
 
 class Profile(models.Model):
@@ -115,3 +246,55 @@ class Enrollment(models.Model):
 
     class Meta:
         unique_together = ('user', 'course')
+
+
+class PollTally(models.Model):
+    """Running totals for a poll, updated with each vote so results never rescan responses."""
+    poll = models.OneToOneField(Poll, on_delete=models.CASCADE, primary_key=True, related_name='tally')
+    total = models.PositiveIntegerField(default=0)
+    left_total = models.PositiveIntegerField(default=0)  # For team_battle
+    left_correct = models.PositiveIntegerField(default=0)
+    right_total = models.PositiveIntegerField(default=0)
+    right_correct = models.PositiveIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)  # Bumped on every change, for live result deltas
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Tally for {self.poll_id} ({self.total} responses)"
+
+
+class PollTallyCell(models.Model):
+    """Per-choice counter; position is the rank slot for speed_ranking and 0 otherwise."""
+    tally = models.ForeignKey(PollTally, on_delete=models.CASCADE, related_name='cells')
+    choice_index = models.PositiveSmallIntegerField()
+    position = models.PositiveSmallIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    prediction_sum = models.BigIntegerField(default=0)  # For meta_prediction: sum of predicted %
+    version = models.PositiveBigIntegerField(default=0)  # Tally version of the last change to this cell
+
+    class Meta:
+        unique_together = ('tally', 'choice_index', 'position')
+
+
+class ContentCacheEntry(models.Model):
+    """Extracted text or generated questions, keyed by uploaded file content (see polls.content_cache)."""
+    KIND_CHOICES = [('text', 'Extracted text'), ('questions', 'Generated questions')]
+    key = models.CharField(max_length=64, primary_key=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.JSONField()
+    size = models.PositiveIntegerField(default=0)  # bytes of serialized value, for size-based eviction
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind}:{self.key[:12]}"
+
+
+class ContentCacheStat(models.Model):
+    kind = models.CharField(max_length=20, primary_key=True)
+    hits = models.PositiveBigIntegerField(default=0)
+    misses = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind}: {self.hits} hits / {self.misses} misses"
@@ -0,0 +1,44 @@
+"""Read-through cache of poll metadata for the student hot path.
+
+``poll_display``, ``poll_vote`` and ``poll_submitted`` run for every student on
+every question, so they read the whole poll row, live state included, from
+Django's cache (``CACHES['default']``) and the database only sees the votes.
+Views that change a poll (opening or closing it, starting the countdown,
+deleting it) call ``invalidate``.
+
+With the default local-memory backend each process has its own copy, and an
+invalidation only reaches the process that made the change; other processes
+would keep showing a closed poll as open, or the waiting screen after the
+countdown started, for up to POLL_CACHE_TIMEOUT seconds. Run several web
+processes with a shared backend (CACHE_BACKEND=file or redis).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Poll
+
+# in model field order, as Poll.from_db expects
+FIELDS = (
+    'id', 'question_text', 'choices', 'question_format', 'correct_answer',
+    'active', 'countdown_started', 'countdown_start_time', 'course_id',
+)
+
+
+def _key(poll_id) -> str:
+    return f'poll-meta:{poll_id}'
+
+
+def get_poll(poll_id) -> Poll:
+    """Return the poll with its metadata fields loaded (others deferred), or raise Http404."""
+    row = cache.get(_key(poll_id))
+    if row is None:
+        row = Poll.objects.filter(id=poll_id).values_list(*FIELDS).first()
+        if row is None:
+            raise Http404('No Poll matches the given query.')
+        cache.set(_key(poll_id), row, settings.POLL_CACHE_TIMEOUT)
+    return Poll.from_db('default', FIELDS, row)
+
+
+def invalidate(poll_id) -> None:
+    cache.delete(_key(poll_id))
@@ -0,0 +1,170 @@
+"""Cleaning and packing extracted text into the prompt's token budget.
+
+Text from pdfminer and python-pptx carries a lot that costs tokens without
+telling the model anything: runs of spaces, words hyphenated across lines,
+the running header, footer and page number of every page, and boilerplate
+lines repeated from slide to slide. ``clean`` removes those:
+
+* whitespace is collapsed, and words split by a hyphen at a line end are joined
+* a line that is among the first or last EDGE_LINES lines of at least
+  REPEATED_SHARE of the pages is a header or footer and is dropped everywhere;
+  in lines of up to NUMBERED_WORDS words the digits are ignored, so
+  "Page 3 of 12" counts as repeated
+* lines wrapped mid-sentence are rejoined, and a line that already appeared
+  earlier in the document is dropped
+
+``pack`` then fits the text into a token budget by choosing sentences, not
+by cutting it off at a character count. Sentences are scored SumBasic-style:
+a content word weighs its frequency in the document, a sentence scores the
+mean weight of its content words (plus a little for length), and once a
+sentence is chosen the weights of its words are squared, so the next picks
+cover other topics. Chosen sentences keep their document order and page breaks.
+
+Token counts are estimates (CHARS_PER_TOKEN characters per token), close
+enough for budgeting across the Llama and Claude tokenizers.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+from .utils import PAGE_BREAK
+
+CHARS_PER_TOKEN = 4
+EDGE_LINES = 2
+REPEATED_SHARE = 0.5
+MIN_PAGES_FOR_HEADERS = 3
+NUMBERED_WORDS = 4
+
+_STOPWORDS = frozenset('''
+a about above after again all also an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our out over
+own same she should so some such than that the their them then there these they this those through to too under
+until up very was we were what when where which while who whom why will with would you your
+'''.split())
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“(\[])')
+_BULLET = re.compile(r'^[-•*▪◦‣·–]\s*')
+
+
+class Packed(NamedTuple):
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or '') + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _lines(page: str) -> List[str]:
+    page = re.sub(r'(\w)-[ \t]*\n[ \t]*([a-z])', r'\1\2', page.replace('\xa0', ' '))
+    return [line for line in (re.sub(r'\s+', ' ', raw).strip() for raw in page.splitlines()) if line]
+
+
+def _key(line: str) -> str:
+    line = line.lower()
+    return re.sub(r'\d+', '#', line) if len(line.split()) <= NUMBERED_WORDS else line
+
+
+def _join(lines: List[str]) -> List[str]:
+    # A line starting in lower case continues the one before (pdfminer wraps sentences)
+    joined: List[str] = []
+    for line in lines:
+        if joined and line[:1].islower() and not _BULLET.match(line):
+            joined[-1] += ' ' + line
+        else:
+            joined.append(line)
+    return joined
+
+
+def clean(text: str) -> str:
+    """Normalize whitespace and drop repeated headers, footers and lines (see the module docstring)."""
+    pages = [_lines(page) for page in (text or '').split(PAGE_BREAK)]
+    repeated = set()
+    if len(pages) >= MIN_PAGES_FOR_HEADERS:
+        edges = Counter(key for lines in pages for key in {_key(line) for line in lines[:EDGE_LINES] + lines[-EDGE_LINES:]})
+        repeated = {key for key, count in edges.items() if count >= REPEATED_SHARE * len(pages)}
+    seen = set()
+    cleaned = []
+    for lines in pages:
+        body = [line for i, line in enumerate(lines)
+                if not ((i < EDGE_LINES or i >= len(lines) - EDGE_LINES) and _key(line) in repeated)]
+        kept = []
+        for line in _join(body):
+            if line.lower() not in seen:
+                seen.add(line.lower())
+                kept.append(line)
+        if kept:
+            cleaned.append('\n'.join(kept))
+    return PAGE_BREAK.join(cleaned)
+
+
+def _units(page: str) -> List[str]:
+    # Sentences, with slide bullets and title lines as units of their own
+    return [s for line in page.split('\n') for s in _SENTENCE_END.split(line) if s]
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in re.findall(r'[a-z][a-z0-9]+', text.lower()) if len(w) > 2 and w not in _STOPWORDS]
+
+
+def pack(text: str, budget: int) -> str:
+    """The most informative sentences of ``text`` that fit in ``budget`` tokens, in document order.
+
+    Text that already fits is returned unchanged.
+    """
+    text = text or ''
+    if estimate_tokens(text) <= budget:
+        return text
+    units = [(page_no, unit) for page_no, page in enumerate(text.split(PAGE_BREAK)) for unit in _units(page)]
+    words = [set(_content_words(unit)) for _, unit in units]
+    counts = Counter(w for unit_words in words for w in unit_words)
+    total = sum(counts.values()) or 1
+    weight: Dict[str, float] = {w: n / total for w, n in counts.items()}
+
+    def score(i: int) -> float:
+        if not words[i]:
+            return 0.0
+        # a little credit for length, so a bare heading does not beat the sentence explaining it
+        return sum(weight[w] for w in words[i]) / len(words[i]) * math.log(2 + len(words[i]))
+
+    # Lazy greedy: weights only ever go down, so a stale score is an upper bound
+    heap = [(-score(i), i) for i in range(len(units))]
+    heapq.heapify(heap)
+    remaining = budget * CHARS_PER_TOKEN
+    chosen = set()
+    while heap and remaining > 0:
+        stale, i = heapq.heappop(heap)
+        cost = len(units[i][1]) + 1
+        if cost > remaining:
+            continue
+        fresh = -score(i)
+        if heap and fresh > heap[0][0] + 1e-12:
+            heapq.heappush(heap, (fresh, i))
+            continue
+        chosen.add(i)
+        remaining -= cost
+        for w in words[i]:
+            weight[w] *= weight[w]
+    if not chosen:
+        # not even one sentence fits: cut the first at a word boundary
+        return text[:budget * CHARS_PER_TOKEN].rsplit(' ', 1)[0]
+
+    pages: Dict[int, List[str]] = {}
+    for i in sorted(chosen):
+        page_no, unit = units[i]
+        pages.setdefault(page_no, []).append(unit)
+    return PAGE_BREAK.join('\n'.join(page) for _, page in sorted(pages.items()))
+
+
+def prepare(text: str, budget: Optional[int]) -> Packed:
+    """``clean`` the extracted text, then ``pack`` it into ``budget`` tokens unless ``budget`` is None."""
+    cleaned = clean(text)
+    packed = pack(cleaned, budget) if budget is not None else cleaned
+    return Packed(packed, estimate_tokens(text), estimate_tokens(packed))
@@ -0,0 +1,193 @@
+"""LLM providers behind one interface, ordered by measured latency and health.
+
+A provider is registered by its client module (``llm_client`` for Groq,
+``claude_client`` for Anthropic) and offers the same few callables: whether it
+is configured, which models to try for a generation task, a blocking
+``complete`` returning a ``Completion``, and a streaming ``stream`` yielding the
+text as it arrives and then, if the API reports it, a ``Usage``. Both take
+``(model, task)``.
+LLM_PROVIDERS (default ``groq``; ``groq,anthropic`` adds Claude) chooses which
+ones generation may use.
+
+Every attempt's latency and outcome is recorded per provider and per model,
+over the last STATS_WINDOW attempts. Once it has MIN_SAMPLES attempts, a
+provider or model whose error rate is above UNHEALTHY_ERROR_RATE counts as
+unhealthy, as does a provider that reports itself down (Groq's open circuit
+breaker). ``plan`` puts healthy providers first, fastest p50 first. A
+provider with too few samples to judge ranks first so that it gets measured,
+and so does one with no attempt in STALE_AFTER seconds, so a backend that
+recovers wins its traffic back. Within a provider the task's models keep
+their order, since that is a quality preference, but unhealthy models move
+to the end.
+
+With LLM_HEDGE=1 a generation still running after the first provider's p95
+latency (LLM_HEDGE_AFTER seconds until it has MIN_SAMPLES) is also sent to the
+next provider, and the first usable answer wins.
+"""
+import importlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+STATS_WINDOW = 100
+MIN_SAMPLES = 5
+UNHEALTHY_ERROR_RATE = 0.5
+# Stats with no new attempt for this many seconds are too old to judge by
+STALE_AFTER = 60
+
+# LLM_PROVIDERS name -> module that registers the provider when imported
+MODULES = {'groq': 'polls.llm_client', 'anthropic': 'polls.claude_client'}
+
+
+def _never_down() -> bool:
+    return False
+
+
+def _direct(fn: Callable, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+class Usage(NamedTuple):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def __add__(self, other: 'Usage') -> 'Usage':
+        return Usage(self.prompt_tokens + other.prompt_tokens, self.completion_tokens + other.completion_tokens)
+
+
+class Completion(NamedTuple):
+    text: str
+    usage: Usage = Usage()
+
+
+class Provider(NamedTuple):
+    name: str
+    available: Callable[[], bool]
+    models: Callable[[Any], List[str]]
+    complete: Callable[[str, Any], Completion]
+    stream: Callable[[str, Any], Iterator[Any]]
+    # wraps each request, e.g. in a rate limiter; and whether the provider is known to be down
+    guard: Callable = _direct
+    down: Callable[[], bool] = _never_down
+
+
+_lock = threading.Lock()
+_registered: Dict[str, Provider] = {}
+
+
+def register(provider: Provider) -> None:
+    with _lock:
+        _registered[provider.name] = provider
+
+
+def enabled() -> List[Provider]:
+    """The providers named in LLM_PROVIDERS that are configured (API key set, SDK installed), in that order."""
+    providers = []
+    for name in [n.strip() for n in os.getenv('LLM_PROVIDERS', 'groq').split(',') if n.strip()]:
+        if name not in _registered and name in MODULES:
+            importlib.import_module(MODULES[name])
+        provider = _registered.get(name)
+        if provider is not None and provider.available():
+            providers.append(provider)
+    return providers
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Stats:
+    """Latency and outcome of the last STATS_WINDOW attempts."""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=STATS_WINDOW)
+        self.updated = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self.lock:
+            self.samples.append((latency, ok))
+            self.updated = time.monotonic()
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = list(self.samples)
+            stale = time.monotonic() - self.updated > STALE_AFTER
+        latencies = [latency for latency, ok in samples if ok]
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            'calls': len(samples),
+            'stale': stale,
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+            'error_rate': errors / len(samples) if samples else 0.0,
+        }
+
+
+_stats: Dict[Tuple[str, Optional[str]], Stats] = {}
+
+
+def _get_stats(provider: str, model: Optional[str] = None) -> Stats:
+    with _lock:
+        return _stats.setdefault((provider, model), Stats())
+
+
+def record(provider: str, model: str, latency: float, ok: bool) -> None:
+    _get_stats(provider).record(latency, ok)
+    _get_stats(provider, model).record(latency, ok)
+
+
+def summary() -> Dict[str, Dict[str, Any]]:
+    """Stats per provider (``groq``) and per model (``groq/llama-3.1-8b-instant``)."""
+    with _lock:
+        keys = list(_stats)
+    return {provider if model is None else f'{provider}/{model}': _get_stats(provider, model).summary()
+            for provider, model in sorted(keys, key=lambda k: (k[0], k[1] or ''))}
+
+
+def _judged(stats: Dict[str, Any]) -> bool:
+    return stats['calls'] >= MIN_SAMPLES and not stats['stale']
+
+
+def _healthy(provider: str, model: Optional[str] = None) -> bool:
+    stats = _get_stats(provider, model).summary()
+    return not _judged(stats) or stats['error_rate'] <= UNHEALTHY_ERROR_RATE
+
+
+def _speed(provider: Provider) -> float:
+    stats = _get_stats(provider.name).summary()
+    if not _judged(stats) or stats['p50'] is None:
+        return 0.0  # unmeasured: try it, so it gets measured
+    return stats['p50']
+
+
+def plan(task) -> List[Tuple[Provider, List[str]]]:
+    """``(provider, models)`` to try for ``task``, best first; empty when every provider is down."""
+    providers = [p for p in enabled() if not p.down()]
+    providers.sort(key=lambda p: (not _healthy(p.name), _speed(p)))
+    ordered = []
+    for provider in providers:
+        models = provider.models(task)
+        ordered.append((provider, sorted(models, key=lambda m: not _healthy(provider.name, m))))
+    return ordered
+
+
+def hedge_after(provider: Provider) -> Optional[float]:
+    """Seconds to wait on ``provider`` before hedging to the next one, or None without LLM_HEDGE."""
+    if os.getenv('LLM_HEDGE', '0') != '1':
+        return None
+    stats = _get_stats(provider.name).summary()
+    if _judged(stats) and stats['p95'] is not None:
+        return stats['p95']
+    return float(os.getenv('LLM_HEDGE_AFTER', '5'))
+
+
+def reset() -> None:
+    """Forget all latency and error stats."""
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,126 @@
+"""Near-duplicate detection for generated questions, per course.
+
+Each question's word set gets a MinHash signature (NUM_PERM 32-bit minimums).
+The signature is cut into BANDS bands that are hashed into ``QuestionBucket``
+rows, indexed on ``(course, bucket)``. Questions sharing any bucket are
+candidates, and a candidate is a near duplicate when the exact Jaccard
+similarity of the two word sets reaches THRESHOLD. A lookup reads only the
+matching buckets, so its cost does not grow with the number of questions
+already in the course.
+
+With 16 bands of 4 rows, a pair at similarity 0.8 shares a bucket with
+probability 0.9998; pairs below 0.5 rarely become candidates at all.
+
+QUESTION_DEDUP chooses what happens to a near duplicate at generation time:
+``flag`` (default) links it to the earlier question with ``duplicate_of``,
+``suppress`` drops it, and ``off`` stores it unchecked.
+
+Uploads without a course are only checked against each other, not indexed:
+unrelated uploaders' questions would otherwise share one index.
+"""
+import hashlib
+import random
+import re
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Document, GeneratedQuestion, QuestionBucket
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+# Signatures are stored, so the permutations must never change between runs
+_rng = random.Random(20240917)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r'[a-z0-9]+', (text or '').lower()))
+
+
+def signature(tokens: set) -> Tuple[int, ...]:
+    hashes = [zlib.crc32(t.encode()) for t in tokens] or [0]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) & _MASK for a, b in _PERMS)
+
+
+def similarity(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def buckets(tokens: set, kind: str) -> List[int]:
+    """The LSH bucket per band of the word set, as signed 64-bit ints; MCQs and exit tickets never share one."""
+    sig = signature(tokens)
+    keys = []
+    for band in range(BANDS):
+        raw = struct.pack(f'<I{ROWS}I', band, *sig[band * ROWS:(band + 1) * ROWS]) + kind.encode()
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little', signed=True))
+    return keys
+
+
+def find_duplicate(course_id, tokens: set, keys: Iterable[int]) -> Optional[GeneratedQuestion]:
+    """Return the stored question of ``course_id`` most similar to ``tokens``, if it reaches THRESHOLD."""
+    candidates = QuestionBucket.objects.filter(course_id=course_id, bucket__in=list(keys)).values('question_id')
+    best, best_score = None, THRESHOLD
+    for question in GeneratedQuestion.objects.filter(id__in=candidates).only('id', 'text'):
+        score = similarity(tokens, _tokens(question.text))
+        if score >= best_score:
+            best, best_score = question, score
+    return best
+
+
+def _index(question: GeneratedQuestion, course_id, keys: List[int]) -> List[QuestionBucket]:
+    return [QuestionBucket(question=question, course_id=course_id, bucket=key) for key in keys]
+
+
+def add_questions(doc: Document, questions: List[GeneratedQuestion]) -> List[GeneratedQuestion]:
+    """Store ``questions`` for ``doc``, checking each against its course's earlier questions and each other.
+
+    Returns the questions that were stored (all of them unless QUESTION_DEDUP is ``suppress``).
+    """
+    mode = settings.QUESTION_DEDUP
+    if mode == 'off':
+        return GeneratedQuestion.objects.bulk_create(questions)
+
+    indexed = doc.course_id is not None
+    kept, rows = [], []
+    batch: Dict[int, List[Tuple[GeneratedQuestion, set]]] = {}  # bucket -> this upload's questions
+    for question in questions:
+        tokens = _tokens(question.text)
+        keys = buckets(tokens, question.kind)
+        duplicate = find_duplicate(doc.course_id, tokens, keys) if indexed else None
+        if duplicate is None:  # or an earlier question of this same upload
+            duplicate = next((q for key in keys for q, other in batch.get(key, ()) if similarity(tokens, other) >= THRESHOLD), None)
+        if duplicate is not None:
+            if mode == 'suppress':
+                continue
+            question.duplicate_of = duplicate
+        kept.append(question)
+        if indexed:
+            rows.extend(_index(question, doc.course_id, keys))
+        for key in keys:
+            batch.setdefault(key, []).append((question, tokens))
+
+    with transaction.atomic():
+        GeneratedQuestion.objects.bulk_create(kept)
+        QuestionBucket.objects.bulk_create(rows)
+    return kept
+
+
+def index_existing(questions: Iterable[GeneratedQuestion]) -> int:
+    """Index questions stored before the index existed; returns how many were indexed."""
+    count = 0
+    for question in questions:
+        if question.document.course_id is None:
+            continue
+        keys = buckets(_tokens(question.text), question.kind)
+        QuestionBucket.objects.bulk_create(_index(question, question.document.course_id, keys))
+        count += 1
+    return count
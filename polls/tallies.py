@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from .aggregation import add_response, build_results_context, compute_tallies, empty_tallies, live_values
+from .live import notify_changed
+from .models import PollResponse, PollTally, PollTallyCell
+
+SCALAR_FIELDS = ('total', 'left_total', 'left_correct', 'right_total', 'right_correct')
+
+
+def _cells_from_tallies(tallies: Dict) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """Map raw tallies onto ``{(choice_index, position): (count, prediction_sum)}``."""
+    cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    for i, count in enumerate(tallies.get('counts', [])):
+        cells[(i, 0)] = (count, 0)
+    for i, row in enumerate(tallies.get('rank_counts', [])):
+        for pos, count in enumerate(row):
+            cells[(i, pos)] = (count, 0)
+    if 'actual_counts' in tallies:
+        for i, (count, pred) in enumerate(zip(tallies['actual_counts'], tallies['prediction_totals'])):
+            cells[(i, 0)] = (count, pred)
+    return cells
+
+
+def _tallies_from_model(poll, tally: PollTally, cells: Optional[Sequence[PollTallyCell]] = None) -> Dict:
+    tallies = empty_tallies(poll)
+    for field in SCALAR_FIELDS:
+        if field in tallies:
+            tallies[field] = getattr(tally, field)
+    num_choices = len(poll.choices)
+    for cell in tally.cells.all() if cells is None else cells:
+        i, pos = cell.choice_index, cell.position
+        if i >= num_choices or pos >= num_choices:
+            continue
+        if 'counts' in tallies and pos == 0:
+            tallies['counts'][i] = cell.count
+        elif 'rank_counts' in tallies:
+            tallies['rank_counts'][i][pos] = cell.count
+        elif 'actual_counts' in tallies and pos == 0:
+            tallies['actual_counts'][i] = cell.count
+            tallies['prediction_totals'][i] = cell.prediction_sum
+    return tallies
+
+
+def _write_tally(poll, tally: PollTally, tallies: Dict) -> None:
+    for field in SCALAR_FIELDS:
+        setattr(tally, field, tallies.get(field, 0))
+    # every cell is stamped with the new version so live clients resync fully
+    tally.version += 1
+    tally.updated_at = timezone.now()
+    tally.save()
+    tally.cells.all().delete()
+    PollTallyCell.objects.bulk_create([
+        PollTallyCell(tally=tally, choice_index=i, position=pos, count=count, prediction_sum=pred, version=tally.version)
+        for (i, pos), (count, pred) in _cells_from_tallies(tallies).items()
+    ])
+
+
+def rebuild_tally(poll) -> PollTally:
+    """Recompute the stored tally for ``poll`` from its raw responses."""
+    with transaction.atomic():
+        transaction.on_commit(lambda: notify_changed(poll.id))
+        tally, _ = PollTally.objects.select_for_update().get_or_create(poll=poll)
+        _write_tally(poll, tally, compute_tallies(poll))
+    return tally
+
+
+def tally_drift(poll) -> Dict:
+    """Return ``{name: (stored, actual)}`` for every counter that disagrees with the responses."""
+    actual = compute_tallies(poll)
+    try:
+        tally = PollTally.objects.get(poll=poll)
+    except PollTally.DoesNotExist:
+        return {'missing': (None, actual['total'])} if actual['total'] else {}
+    stored = _tallies_from_model(poll, tally)
+    drift = {}
+    for field in SCALAR_FIELDS:
+        if stored.get(field) != actual.get(field):
+            drift[field] = (stored.get(field), actual.get(field))
+    stored_cells, actual_cells = _cells_from_tallies(stored), _cells_from_tallies(actual)
+    for key in actual_cells:
+        if stored_cells.get(key) != actual_cells[key]:
+            drift[f'cell{key}'] = (stored_cells.get(key), actual_cells[key])
+    return drift
+
+
+def record_vote(poll, choice) -> PollResponse:
+    """Store a response and fold it into the poll's tally in the same transaction."""
+    return record_votes(poll, [PollResponse.from_choice(choice, poll=poll)])[0]
+
+
+def record_votes(poll, responses: Sequence[PollResponse]) -> List[PollResponse]:
+    """Insert unsaved ``responses`` to ``poll`` with one ``bulk_create`` and fold
+    them into the tally in the same transaction.
+
+    Counters are bumped with ``F()`` expressions so concurrent votes never lose
+    updates. The first vote on a poll without a tally builds it from scratch.
+    """
+    with transaction.atomic():
+        transaction.on_commit(lambda: notify_changed(poll.id))
+        responses = PollResponse.objects.bulk_create(responses)
+        tally, created = PollTally.objects.get_or_create(poll=poll)
+        if created:
+            _write_tally(poll, tally, compute_tallies(poll))
+            return responses
+
+        delta = empty_tallies(poll)
+        for response in responses:
+            add_response(poll, delta, *(getattr(response, field) for field in PollResponse.TYPED_FIELDS))
+        PollTally.objects.filter(pk=tally.pk).update(
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+            **{field: F(field) + delta[field] for field in SCALAR_FIELDS if delta.get(field)},
+        )
+        changed = {key: val for key, val in _cells_from_tallies(delta).items() if any(val)}
+        if changed:
+            match = Q()
+            count_whens, pred_whens = [], []
+            for (i, pos), (count, pred) in changed.items():
+                cond = Q(choice_index=i, position=pos)
+                match |= cond
+                count_whens.append(When(cond, then=Value(count)))
+                pred_whens.append(When(cond, then=Value(pred)))
+            PollTallyCell.objects.filter(match, tally=tally).update(
+                count=F('count') + Case(*count_whens, default=Value(0), output_field=IntegerField()),
+                prediction_sum=F('prediction_sum') + Case(*pred_whens, default=Value(0), output_field=IntegerField()),
+                version=Subquery(PollTally.objects.filter(pk=OuterRef('tally_id')).values('version')),
+            )
+    return responses
+
+
+def read_tallies(poll) -> Dict:
+    """Return raw tallies for ``poll``, from the stored tally when one exists."""
+    try:
+        tally = poll.tally
+    except PollTally.DoesNotExist:
+        return compute_tallies(poll)
+    return _tallies_from_model(poll, tally)
+
+
+def tally_version(poll_id) -> int:
+    return PollTally.objects.filter(poll_id=poll_id).values_list('version', flat=True).first() or 0
+
+
+def tally_feed(poll, since: Optional[int] = None) -> Dict:
+    """Return the counters that changed after tally version ``since``.
+
+    The payload has the same shape for every question format: ``counters`` maps
+    the scalar names (``total``, ``left_total``, ...) and ``count:<choice>:<position>``
+    / ``prediction_sum:<choice>:<position>`` to their current values. ``full`` is true
+    when every counter is included because ``since`` was missing or unknown.
+    Whenever anything changed, ``derived`` carries every value the results page
+    computes from the counters (``aggregation.live_values``).
+    """
+    try:
+        tally = PollTally.objects.get(poll=poll)
+    except PollTally.DoesNotExist:
+        tally = rebuild_tally(poll)
+    full = since is None or since > tally.version
+    changed = full or tally.version > since
+    counters: Dict[str, int] = {}
+    derived: Dict[str, str] = {}
+    if changed:
+        counters.update({field: getattr(tally, field) for field in SCALAR_FIELDS})
+        # derived values depend on every cell, so all of them are read; only changed ones are sent
+        cells = list(tally.cells.all())
+        derived = live_values(build_results_context(poll, _tallies_from_model(poll, tally, cells)))
+        for cell in cells:
+            if not full and cell.version <= since:
+                continue
+            counters[f'count:{cell.choice_index}:{cell.position}'] = cell.count
+            if poll.question_format == 'meta_prediction':
+                counters[f'prediction_sum:{cell.choice_index}:{cell.position}'] = cell.prediction_sum
+    return {
+        'poll': str(poll.id),
+        'format': poll.question_format,
+        'version': tally.version,
+        'full': full,
+        'counters': counters,
+        'derived': derived,
+    }
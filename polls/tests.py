@@ -1,6 +1,8 @@
 from django.test import TestCase
 import tempfile
 import os
+import time
+from io import StringIO
 from .utils import extract_text_from_file
 
 
@@ -18,3 +20,1247 @@ class UtilsTests(TestCase):
                 os.unlink(path)
             except Exception:
                 pass
+
+    def test_extraction_stops_at_page_and_char_budget(self):
+        from pptx import Presentation
+        from .utils import PAGE_BREAK, iter_text_from_file
+        prs = Presentation()
+        for i in range(5):
+            prs.slides.add_slide(prs.slide_layouts[5]).shapes.title.text = f'Slide {i}'
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'deck.pptx')
+            prs.save(path)
+            self.assertEqual(list(iter_text_from_file(path)), [f'Slide {i}' for i in range(5)])
+            self.assertEqual(extract_text_from_file(path, max_pages=2), f'Slide 0{PAGE_BREAK}Slide 1')
+            self.assertEqual(extract_text_from_file(path, max_chars=10), f'Slide 0{PAGE_BREAK}Sl')
+            # the process pool reassembles page ranges in document order
+            self.assertEqual(extract_text_from_file(path, workers=2, min_parallel_pages=2),
+                             PAGE_BREAK.join(f'Slide {i}' for i in range(5)))
+
+
+class ResultsAggregationTests(TestCase):
+    def _poll(self, fmt, responses, correct_answer=None):
+        from .models import Poll, PollResponse
+        poll = Poll.objects.create(
+            question_text='Q?', choices=['a', 'b', 'c'], question_format=fmt, correct_answer=correct_answer
+        )
+        PollResponse.objects.bulk_create([PollResponse.from_choice(c, poll=poll) for c in responses])
+        return poll
+
+    def _reference_tallies(self, poll):
+        """Fold every response one at a time, the obvious way."""
+        from .aggregation import add_response, empty_tallies
+        from .models import PollResponse
+        tallies = empty_tallies(poll)
+        for values in poll.responses.values_list(*PollResponse.TYPED_FIELDS):
+            add_response(poll, tallies, *values)
+        return tallies
+
+    def _assert_matches_python(self, poll):
+        from .aggregation import compute_tallies
+        with self.assertNumQueries(1):
+            tallies = compute_tallies(poll)
+        self.assertEqual(tallies, self._reference_tallies(poll))
+        return tallies
+
+    def test_single_choice(self):
+        poll = self._poll('single_choice', [0, 1, 1, 2, 1])
+        self.assertEqual(self._assert_matches_python(poll)['counts'], [1, 3, 1])
+
+    def test_speed_ranking(self):
+        poll = self._poll('speed_ranking', [[0, 1, 2], [1, 0, 2], [0, 2, 1]])
+        tallies = self._assert_matches_python(poll)
+        self.assertEqual(tallies['rank_counts'][0], [2, 1, 0])
+
+    def test_team_battle_with_legacy_rows(self):
+        poll = self._poll('team_battle', [
+            {'team': 'left', 'answer': 1}, {'team': 'left', 'answer': 0},
+            {'team': 'right', 'answer': 1}, 'right',
+        ], correct_answer=1)
+        tallies = self._assert_matches_python(poll)
+        self.assertEqual((tallies['left_total'], tallies['left_correct']), (2, 1))
+        self.assertEqual((tallies['right_total'], tallies['right_correct']), (2, 1))
+
+    def test_meta_prediction(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .aggregation import compute_tallies
+        poll = self._poll('meta_prediction', [
+            {'predictions': [50, 30, 20], 'answer': 0}, {'predictions': [10, 60, 30], 'answer': 1},
+        ])
+        tallies = self._assert_matches_python(poll)
+        self.assertEqual(tallies['actual_counts'], [1, 1, 0])
+        # the packed predictions are nearly unique per response; never group on them
+        with CaptureQueriesContext(connection) as ctx:
+            compute_tallies(poll)
+        self.assertNotIn('GROUP BY', ctx.captured_queries[0]['sql'])
+        self.assertEqual(tallies['prediction_totals'], [60, 90, 50])
+
+    def test_legacy_json_rows_migrate_to_typed_columns_and_back(self):
+        import importlib
+        from unittest import mock
+        from django.apps import apps
+        from .models import Poll, PollResponse
+        migration = importlib.import_module('polls.migrations.0014_typed_poll_responses')
+        poll = Poll.objects.create(question_text='Q?', choices=['a', 'b', 'c'], question_format='team_battle')
+        shapes = [1, [2, 0, 1], {'team': 'left', 'answer': 2}, {'predictions': [50, 30, 20], 'answer': 0}, 'right', 'odd']
+        PollResponse.objects.bulk_create([PollResponse(poll=poll, choice=c) for c in shapes])  # pre-migration rows
+
+        with mock.patch.object(migration, 'BATCH', 4):  # shapes span two keyset batches
+            migration.to_typed_columns(apps, None)
+        self.assertEqual(list(PollResponse.objects.filter(choice__isnull=False).values_list('choice', flat=True)), ['odd'])
+        self.assertEqual(bytes(PollResponse.objects.get(ranking__isnull=False).ranking), bytes([2, 0, 1]))
+        self.assertEqual(PollResponse.objects.get(team='left').answer, 2)
+        self.assertCountEqual([r.value for r in PollResponse.objects.all()], shapes)
+
+        with mock.patch.object(migration, 'BATCH', 4):
+            migration.to_json_choice(apps, None)
+        self.assertCountEqual(PollResponse.objects.values_list('choice', flat=True), shapes)
+
+
+class PollTallyTests(TestCase):
+    def _poll(self, fmt):
+        from .models import Poll
+        return Poll.objects.create(question_text='Q?', choices=['a', 'b', 'c'], question_format=fmt, correct_answer=1,
+                                   active=True)
+
+    def test_incremental_tally_matches_responses(self):
+        from .aggregation import compute_tallies
+        from .tallies import read_tallies, record_vote, tally_drift
+        votes = {
+            'single_choice': [0, 1, 1],
+            'speed_ranking': [[0, 1, 2], [2, 1, 0], [0, 2, 1]],
+            'team_battle': [{'team': 'left', 'answer': 1}, {'team': 'right', 'answer': 0}, {'team': 'left', 'answer': 2}],
+            'meta_prediction': [{'predictions': [50, 30, 20], 'answer': 0}, {'predictions': [10, 60, 30], 'answer': 2}],
+        }
+        for fmt, choices in votes.items():
+            poll = self._poll(fmt)
+            for choice in choices:
+                record_vote(poll, choice)
+            poll.refresh_from_db()
+            self.assertEqual(read_tallies(poll), compute_tallies(poll), fmt)
+            self.assertEqual(tally_drift(poll), {}, fmt)
+
+    def test_read_is_independent_of_response_count(self):
+        from .tallies import read_tallies, record_vote
+        poll = self._poll('speed_ranking')
+        for _ in range(20):
+            record_vote(poll, [0, 1, 2])
+        poll.refresh_from_db()
+        with self.assertNumQueries(2):
+            self.assertEqual(read_tallies(poll)['rank_counts'][0], [20, 0, 0])
+
+    def test_verify_command_reports_and_rebuild_fixes_drift(self):
+        from django.core.management import call_command, CommandError
+        from .models import PollResponse
+        from .tallies import record_vote
+        poll = self._poll('single_choice')
+        record_vote(poll, 1)
+        PollResponse.from_choice(2, poll=poll).save()  # bypasses the tally
+        with self.assertRaises(CommandError):
+            call_command('rebuild_tallies', '--verify', stdout=StringIO())
+        call_command('rebuild_tallies', str(poll.id), stdout=StringIO())
+        call_command('rebuild_tallies', '--verify', stdout=StringIO())
+
+    def test_results_feed_sends_only_changed_counters(self):
+        from .tallies import record_vote
+        poll = self._poll('single_choice')
+        record_vote(poll, 0)
+        url = f'/poll/{poll.id}/results/feed/'
+        snapshot = self.client.get(url).json()
+        self.assertTrue(snapshot['full'])
+        self.assertEqual(snapshot['counters']['count:0:0'], 1)
+        self.assertIn('count:2:0', snapshot['counters'])
+
+        record_vote(poll, 2)
+        delta = self.client.get(url, {'since': snapshot['version']}).json()
+        self.assertFalse(delta['full'])
+        self.assertGreater(delta['version'], snapshot['version'])
+        self.assertEqual(delta['counters']['count:2:0'], 1)
+        self.assertEqual(delta['counters']['total'], 2)
+        self.assertNotIn('count:0:0', delta['counters'])
+
+        unchanged = self.client.get(url, {'since': delta['version']}).json()
+        self.assertEqual((unchanged['counters'], unchanged['derived']), ({}, {}))
+
+    def test_results_feed_sends_derived_values(self):
+        from .tallies import record_vote
+        poll = self._poll('team_battle')
+        record_vote(poll, {'team': 'left', 'answer': 1})
+        url = f'/poll/{poll.id}/results/feed/'
+        snapshot = self.client.get(url).json()
+        self.assertEqual(snapshot['derived']['winner'], 'left')
+
+        record_vote(poll, {'team': 'right', 'answer': 1})
+        record_vote(poll, {'team': 'left', 'answer': 0})
+        derived = self.client.get(url, {'since': snapshot['version']}).json()['derived']
+        # what results.html renders: 1/2 correct on the left, 1/1 on the right
+        self.assertEqual((derived['left_percentage'], derived['right_percentage']), ('50.0', '100.0'))
+        self.assertEqual((derived['winner'], derived['left_share'], derived['left_plural']), ('right', '67', 's'))
+
+    def test_buffered_votes_flush_in_batches(self):
+        from django.test import override_settings
+        from . import ingest
+        from .aggregation import compute_tallies
+        from .tallies import read_tallies, rebuild_tally
+        poll = self._poll('team_battle')
+        rebuild_tally(poll)
+        url = f'/poll/{poll.id}/vote/'
+        with override_settings(VOTE_INGEST_MODE='buffered', VOTE_BUFFER_SIZE=3, VOTE_BUFFER_INTERVAL=3600):
+            self.client.post(url, {'team_side': 'left', 'answer_choice': 1})
+            self.client.post(url, {'team_side': 'right', 'answer_choice': 0})
+            self.assertEqual((poll.responses.count(), ingest.pending()), (0, 2))
+            # the third vote fills the buffer: one INSERT and one tally UPDATE (the poll is cached)
+            with self.assertNumQueries(5):
+                self.client.post(url, {'team_side': 'left', 'answer_choice': 2})
+            self.assertEqual((poll.responses.count(), ingest.pending()), (3, 0))
+            self.client.post(url, {'team_side': 'left', 'answer_choice': 1})
+            self.assertEqual(ingest.flush(), 1)
+        poll.refresh_from_db()
+        self.assertEqual(read_tallies(poll), compute_tallies(poll))
+        self.assertEqual(read_tallies(poll)['left_correct'], 2)
+
+    def test_failing_flush_falls_back_to_single_rows_and_bounds_the_buffer(self):
+        from unittest import mock
+        from django.test import override_settings
+        from . import ingest, tallies
+
+        def record(poll, responses):
+            if any(r.answer == 2 for r in responses):
+                raise ValueError('bad row')
+            return tallies.record_votes(poll, responses)
+
+        poll = self._poll('single_choice')
+        with override_settings(VOTE_BUFFER_SIZE=100, VOTE_BUFFER_MAX=3, VOTE_FLUSH_RETRIES=2, VOTE_BUFFER_INTERVAL=3600), \
+                mock.patch.object(ingest, 'record_votes', side_effect=record), \
+                self.assertLogs('polls.ingest', 'ERROR') as logs:
+            for answer in (0, 2, 1):
+                ingest.submit(poll, answer)
+            self.assertEqual((ingest.flush(), ingest.pending()), (0, 3))
+            # the buffer is full, so this vote is written in the request
+            ingest.submit(poll, 1)
+            self.assertEqual((poll.responses.count(), ingest.pending()), (1, 3))
+            # second failure: the batch is written row by row and the bad row dead-lettered
+            self.assertEqual((ingest.flush(), ingest.pending()), (2, 0))
+        self.assertEqual(sorted(poll.responses.values_list('answer', flat=True)), [0, 1, 1])
+        self.assertTrue(any(r.name == 'polls.ingest.dead_letter' and 'choice=2' in r.getMessage() for r in logs.records))
+
+    def test_database_outage_keeps_buffered_votes(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from django.test import override_settings
+        from . import ingest
+        from .models import Poll
+
+        poll = self._poll('single_choice')
+        with override_settings(VOTE_BUFFER_SIZE=100, VOTE_FLUSH_RETRIES=2, VOTE_BUFFER_INTERVAL=3600):
+            for answer in (0, 1):
+                ingest.submit(poll, answer)
+            with mock.patch.object(ingest, 'record_votes', side_effect=OperationalError('server closed')), \
+                    mock.patch.object(Poll.objects, 'filter', side_effect=OperationalError('server closed')), \
+                    self.assertLogs('polls.ingest', 'ERROR') as logs:
+                for _ in range(3):  # past VOTE_FLUSH_RETRIES, so the one-by-one fallback runs too
+                    self.assertEqual((ingest.flush(), ingest.pending()), (0, 2))
+            self.assertFalse(any(r.name == 'polls.ingest.dead_letter' for r in logs.records))
+            self.assertEqual(ingest.flush(), 2)
+        self.assertEqual(sorted(poll.responses.values_list('answer', flat=True)), [0, 1])
+
+
+class PollStateTests(TestCase):
+    def test_state_endpoint_long_polls_until_change(self):
+        from django.test import override_settings
+        from .models import Poll
+        poll = Poll.objects.create(question_text='Q?', choices=['a', 'b'], question_format='speed_ranking', active=True)
+        url = f'/poll/{poll.id}/state/'
+        state = self.client.get(url).json()
+        self.assertFalse(state['countdown_started'])
+
+        with override_settings(LIVE_LONG_POLL_TIMEOUT=0.2, LIVE_LONG_POLL_INTERVAL=0.05):
+            # unchanged state: held until the timeout, then echoed back
+            held = self.client.get(url, {'wait': '1', 'since': state['version']}).json()
+            self.assertEqual(held['version'], state['version'])
+            self.client.post(f'/poll/{poll.id}/start-countdown/')
+            changed = self.client.get(url, {'wait': '1', 'since': state['version']}).json()
+        self.assertTrue(changed['countdown_started'])
+        self.assertNotEqual(changed['version'], state['version'])
+
+    def test_waiters_share_one_fetch_and_wake_only_for_their_poll(self):
+        import threading
+        from .live import notify_changed, wait_for_change
+
+        state = {'version': 'v1', 'fetches': 0}
+
+        def fetch():
+            state['fetches'] += 1
+            return {'version': state['version']}
+
+        results = []
+        waiters = [threading.Thread(target=lambda: results.append(
+            wait_for_change('poll-a', 'state', fetch, since='v1', timeout=5, interval=10)
+        )) for _ in range(20)]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.2)
+        notify_changed('poll-b')
+        time.sleep(0.1)
+        self.assertEqual((state['fetches'], results), (1, []))
+
+        state['version'] = 'v2'
+        notify_changed('poll-a')
+        for waiter in waiters:
+            waiter.join(2)
+        self.assertEqual(results, [{'version': 'v2'}] * 20)
+        self.assertEqual(state['fetches'], 2)
+
+    def test_student_pages_read_poll_from_cache_until_it_changes(self):
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from . import ingest
+        from .models import Poll
+        poll = Poll.objects.create(question_text='Q?', choices=['a', 'b'], question_format='single_choice', active=True)
+        self.client.get(f'/poll/{poll.id}/')  # warms the cache
+        with override_settings(VOTE_INGEST_MODE='buffered', VOTE_BUFFER_SIZE=100):
+            with self.assertNumQueries(0):
+                self.client.get(f'/poll/{poll.id}/')
+                self.client.post(f'/poll/{poll.id}/vote/', {'choice': 1})
+                self.client.get(f'/poll/{poll.id}/submitted/')
+            self.assertEqual(ingest.pending(), 1)
+
+            # closing the poll invalidates the cached row, so later votes are turned away
+            self.client.force_login(User.objects.create_user('prof', password='pw'))
+            self.client.post(f'/poll/{poll.id}/toggle/')
+            self.assertFalse(self.client.get(f'/poll/{poll.id}/').context['poll'].active)
+            self.client.post(f'/poll/{poll.id}/vote/', {'choice': 0})
+            self.assertEqual(ingest.pending(), 1)
+            ingest.flush()
+        self.client.post(f'/poll/{poll.id}/toggle/')
+        self.client.logout()
+        self.client.post(f'/poll/{poll.id}/start-countdown/')
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/poll/{poll.id}/')
+        self.assertTrue(response.context['poll'].countdown_started)
+        self.client.post(f'/poll/{poll.id}/delete/')
+        self.assertEqual(self.client.get(f'/poll/{poll.id}/').status_code, 404)
+
+
+class ViewCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_list_pages_are_cached_until_their_rows_change(self):
+        from django.contrib.auth.models import User
+        from .models import Course, Enrollment, ExitTicket, Poll, Profile
+        prof = User.objects.create_user('prof', password='pw')
+        Profile.objects.create(user=prof, role='professor')
+        student = User.objects.create_user('student', password='pw')
+        course = Course.objects.create(name='Bio', created_by=prof, join_code='BIO12345')
+        Enrollment.objects.create(user=student, course=course, role='student')
+        poll = Poll.objects.create(question_text='Q?', choices=['a', 'b'], course=course, active=True)
+        ticket = ExitTicket.objects.create(prompt_text='Takeaway?', course=course)
+
+        self.client.force_login(student)
+        self.assertEqual(list(self.client.get('/student/').context['open_polls']), [poll])
+        with self.assertNumQueries(3):  # session, user and profile (nav bar)
+            self.client.get('/student/')
+
+        self.client.force_login(prof)
+        self.client.get('/manage/')
+        with self.assertNumQueries(3):
+            self.client.get('/manage/')
+        self.client.post(f'/poll/{poll.id}/toggle/')
+        self.assertFalse(self.client.get('/manage/').context['polls'][0].active)
+
+        self.client.get(f'/exit/{ticket.id}/results/')
+        self.client.post(f'/exit/{ticket.id}/submit/', {'answer': 'Light reactions'})
+        self.assertEqual(self.client.get(f'/exit/{ticket.id}/results/').context['total'], 1)
+
+        self.client.force_login(student)
+        self.assertEqual(list(self.client.get('/student/').context['open_polls']), [])
+
+
+class DashboardQueryTests(TestCase):
+    def test_dashboards_run_a_fixed_number_of_queries(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Course, Document, Enrollment, ExitTicket, ExitTicketResponse, Poll, PollResponse, Profile
+        prof = User.objects.create_user('prof', password='pw')
+        Profile.objects.create(user=prof, role='professor')
+        student = User.objects.create_user('student', password='pw')
+
+        def add_course(n):
+            course = Course.objects.create(name=f'Course {n}', created_by=prof, join_code=f'CODE{n:04d}')
+            Enrollment.objects.create(user=student, course=course, role='student')
+            poll = Poll.objects.create(question_text='Q?', choices=['a', 'b'], course=course, active=True)
+            PollResponse.from_choice(1, poll=poll).save()
+            ticket = ExitTicket.objects.create(prompt_text='Takeaway?', course=course)
+            ExitTicketResponse.objects.create(ticket=ticket, answer='ok')
+            Document.objects.create(title=f'Deck {n}', course=course)
+
+        def queries(user, url):
+            self.client.force_login(user)
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            return len(ctx), response
+
+        add_course(0)
+        baseline = {url: queries(user, url)[0] for user, url in ((prof, '/'), (prof, '/manage/'), (student, '/student/'))}
+        for n in range(1, 6):
+            add_course(n)
+        for user, url in ((prof, '/'), (prof, '/manage/'), (student, '/student/')):
+            count, response = queries(user, url)
+            self.assertEqual(count, baseline[url], url)
+        self.assertEqual(len(response.context['open_polls']), 6)  # student home
+        manage = queries(prof, '/manage/')[1]
+        self.assertEqual((len(manage.context['polls']), len(manage.context['tickets'])), (6, 6))
+
+
+class ExitTicketResponseTests(TestCase):
+    def test_results_page_through_all_responses_and_export_streams_them(self):
+        import csv
+        import json
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.cache import cache
+        from django.utils import timezone
+        from .models import ExitTicket, ExitTicketResponse
+        cache.clear()
+        ticket = ExitTicket.objects.create(prompt_text='Takeaway?')
+        now = timezone.now()
+        # pairs of responses share a timestamp, so pages must break ties on id
+        ExitTicketResponse.objects.bulk_create([
+            ExitTicketResponse(ticket=ticket, answer=f'answer {i}', created_at=now - timedelta(seconds=i // 2))
+            for i in range(7)
+        ])
+        expected = list(ticket.responses.order_by('-created_at', '-id'))
+
+        seen, url = [], f'/exit/{ticket.id}/results/'
+        with mock.patch('polls.exit_tickets.PAGE_SIZE', 3):
+            cursor = None
+            while True:
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+                seen.extend(response.context['responses'])
+                cursor = response.context['next_cursor']
+                if not cursor:
+                    break
+        self.assertEqual(seen, expected)
+        self.assertEqual(response.context['total'], 7)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+
+        export = self.client.get(f'/exit/{ticket.id}/export/')
+        self.assertTrue(export.streaming)
+        rows = list(csv.reader(b''.join(export.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'created_at', 'answer'])
+        self.assertEqual([r[2] for r in rows[1:]], [r.answer for r in reversed(expected)])
+        lines = b''.join(self.client.get(f'/exit/{ticket.id}/export/', {'format': 'ndjson'}).streaming_content).splitlines()
+        self.assertEqual(json.loads(lines[0])['answer'], expected[-1].answer)
+        self.assertEqual(len(lines), 7)
+
+
+class CourseExportTests(TestCase):
+    def test_course_responses_stream_in_every_format(self):
+        import csv
+        import json
+        from unittest import mock
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from .models import Course, ExitTicket, ExitTicketResponse, Poll, PollResponse
+        prof = User.objects.create_user('prof', password='pw')
+        course = Course.objects.create(name='Bio', created_by=prof, join_code='BIO12345')
+        other = Course.objects.create(name='Chem', created_by=prof, join_code='CHEM1234')
+        ranking = Poll.objects.create(question_text='Rank', choices=['a', 'b', 'c'], question_format='speed_ranking', course=course)
+        single = Poll.objects.create(question_text='Pick', choices=['a', 'b'], course=course)
+        ticket = ExitTicket.objects.create(prompt_text='Takeaway?', course=course)
+        for choice in ([2, 0, 1], [0, 1, 2]):
+            PollResponse.from_choice(choice, poll=ranking).save()
+        PollResponse.from_choice(1, poll=single).save()
+        PollResponse.from_choice(0, poll=Poll.objects.create(question_text='Other', choices=['a'], course=other)).save()
+        ExitTicketResponse.objects.create(ticket=ticket, answer='Light reactions')
+
+        url = f'/courses/{course.id}/export/'
+        self.client.force_login(prof)
+        with mock.patch('polls.course_export.CHUNK_SIZE', 2):
+            rows = [json.loads(line) for line in b''.join(self.client.get(url).streaming_content).splitlines()]
+            self.assertEqual([(r['kind'], r['question']) for r in rows],
+                             [('poll', 'Rank')] * 2 + [('poll', 'Pick'), ('exit_ticket', 'Takeaway?')])
+            self.assertEqual((rows[0]['ranking'], rows[2]['answer'], rows[3]['text']), ([2, 0, 1], 1, 'Light reactions'))
+
+            lines = b''.join(self.client.get(url, {'format': 'csv'}).streaming_content).decode().splitlines()
+            self.assertEqual(list(csv.DictReader(lines))[1]['ranking'], '[0, 1, 2]')
+            groups = [json.loads(line) for line in b''.join(self.client.get(url, {'format': 'columns'}).streaming_content).splitlines()]
+            self.assertEqual([len(g['kind']) for g in groups], [2, 2])  # one row group per chunk
+
+            out = StringIO()
+            call_command('export_course', str(course.id), '--format', 'ndjson', stdout=out)
+            self.assertEqual([json.loads(line) for line in out.getvalue().splitlines()], rows)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('someone', password='pw'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class HighVolumeAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+        from .models import Course, ExitTicket, ExitTicketResponse, Poll, PollResponse
+        cls.admin = User.objects.create_superuser('admin', password='pw')
+        course = Course.objects.create(name='Bio', created_by=cls.admin, join_code='BIO12345')
+        cls.polls = [Poll.objects.create(question_text=f'Q{i}', choices=['a', 'b'], course=course) for i in range(30)]
+        PollResponse.objects.bulk_create([PollResponse.from_choice(i % 2, poll=p) for p in cls.polls for i in range(20)])
+        ticket = ExitTicket.objects.create(prompt_text='Takeaway?', course=course)
+        ExitTicketResponse.objects.bulk_create([ExitTicketResponse(ticket=ticket, answer='ok') for _ in range(100)])
+
+    def changelist_queries(self, url, **params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = self.client.get(url, params)
+            elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        return response, [q['sql'] for q in ctx.captured_queries], elapsed
+
+    def test_response_change_lists_use_joins_and_estimated_counts(self):
+        from unittest import mock
+        from django.db import connection
+        self.client.force_login(self.admin)
+        url = '/admin/polls/pollresponse/'
+        small, small_queries, _ = self.changelist_queries(url, **{'poll__id__exact': self.polls[0].id})
+        large, large_queries, elapsed = self.changelist_queries(url, **{'poll__course__id__exact': self.polls[0].course_id})
+        # no query per listed row: 20 rows and 50 rows cost the same
+        self.assertEqual((len(small.context['cl'].result_list), len(large.context['cl'].result_list)), (20, 50))
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertLess(elapsed, 2.0)
+        # the sidebar lists no polls or courses, only the date filter
+        self.assertFalse([q for q in large_queries if 'FROM "polls_poll"' in q or 'FROM "polls_course"' in q])
+        self.assertEqual(len(large.context['cl'].filter_specs), 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with mock.patch('polls.admin.EstimatedCountPaginator.EXACT_BELOW', 100):
+            response, queries, _ = self.changelist_queries(url)
+            self.assertEqual(response.context['cl'].result_count, 600)  # from sqlite_stat1, not COUNT(*)
+            self.assertFalse([q for q in queries if 'COUNT(' in q.upper() and 'polls_pollresponse' in q])
+            # filtered listings still count exactly
+            response, queries, _ = self.changelist_queries(url, **{'poll__id__exact': self.polls[0].id})
+            self.assertEqual(response.context['cl'].result_count, 20)
+        self.changelist_queries('/admin/polls/exitticketresponse/', **{'ticket__course__id__exact': self.polls[0].course_id})
+
+
+class DocumentProcessingTests(TestCase):
+    def test_worker_processes_queued_upload(self):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+        from django.test import override_settings
+        from .jobs import enqueue_document
+        from .models import Document
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media), \
+                mock.patch.dict(os.environ, {'GROQ_API_KEY': ''}):
+            doc = Document.objects.create(file=SimpleUploadedFile('notes.txt', b'Photosynthesis notes'), title='Notes')
+            enqueue_document(doc)
+            doc.refresh_from_db()
+            self.assertEqual(doc.status, 'queued')
+            status = self.client.get(f'/document/{doc.id}/status/').json()
+            self.assertEqual((status['status'], status['questions']), ('queued', 0))
+
+            call_command('process_documents', '--once', stdout=StringIO())
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, 'done')
+        self.assertTrue(doc.generated_questions.filter(kind='mcq').exists())
+        self.assertTrue(doc.generated_questions.filter(kind='exit').exists())
+        self.assertEqual((doc.material_tokens, doc.packed_tokens), (5, 5))
+
+    def test_identical_upload_reuses_cached_results(self):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from . import content_cache, jobs, llm_client
+        from .models import Document
+
+        def fake_generate(text, max_questions, max_tickets, **kwargs):
+            return ([{'text': 'Q?', 'choices': ['a', 'b', 'c', 'd']}], [{'text': 'Reflect', 'choices': []}],
+                    llm_client.GenerationResult('groq', model='llama', latency=1.5, prompt_tokens=900))
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, STREAM_GENERATION=False), \
+                mock.patch.object(llm_client, 'generate_all_from_text', side_effect=fake_generate) as generate, \
+                mock.patch.object(jobs, 'extract_text_from_file', return_value='Photosynthesis') as extract:
+            for section in ('A', 'B'):
+                doc = Document.objects.create(file=SimpleUploadedFile('deck.txt', b'same bytes'), title=section)
+                jobs.process_document(doc)
+                self.assertEqual(doc.generated_questions.count(), 2)
+        self.assertEqual((extract.call_count, generate.call_count), (1, 1))
+        first = Document.objects.get(title='A')
+        self.assertEqual((first.generation_source, first.generation_model, first.prompt_tokens), ('groq', 'llama', 900))
+        self.assertEqual((doc.generation_source, doc.generation_model), ('cache', 'llama'))
+        self.assertEqual(content_cache.stats()['questions']['hits'], 1)
+
+    def test_stale_document_restarts_cleanly_and_fails_after_max_attempts(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from django.utils import timezone
+        from . import jobs
+        from .models import Document, GeneratedQuestion
+
+        def crash():
+            # a worker that claimed the document and streamed a question, then died
+            doc = jobs.claim_next_document()
+            GeneratedQuestion.objects.create(document=doc, text='Half-done?', choices=['a', 'b', 'c', 'd'])
+            Document.objects.filter(id=doc.id).update(status_changed_at=timezone.now() - timedelta(hours=1))
+            return jobs.requeue_stale(timedelta(minutes=30))
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, DOCUMENT_MAX_ATTEMPTS=2), \
+                mock.patch.dict(os.environ, {'GROQ_API_KEY': ''}):
+            doc = Document.objects.create(file=SimpleUploadedFile('notes.txt', b'Photosynthesis notes'), title='Notes')
+            jobs.enqueue_document(doc)
+            self.assertEqual(crash(), 1)
+            jobs.process_document(jobs.claim_next_document())
+            self.assertFalse(doc.generated_questions.filter(text='Half-done?').exists())
+            self.assertEqual(doc.generated_questions.filter(duplicate_of__isnull=False).count(), 0)
+
+            jobs.enqueue_document(doc)
+            self.assertEqual((crash(), crash()), (1, 0))
+        doc.refresh_from_db()
+        self.assertEqual((doc.status, doc.attempts), ('failed', 2))
+        self.assertIn('interrupted 2 times', doc.error)
+
+    def test_worker_survives_deleted_documents_and_heartbeats_long_jobs(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+        from django.test import override_settings
+        from django.utils import timezone
+        from . import jobs, llm_client
+        from .models import Document
+
+        requeued = []
+
+        def slow_extract(path, **kwargs):
+            doc = Document.objects.get(title=os.path.basename(path).split('_')[0].split('.')[0])
+            if doc.title == 'gone':
+                doc.delete()
+                raise ValueError('file vanished')  # and marking it failed cannot work either
+            # extraction took longer than the stale timeout
+            Document.objects.filter(id=doc.id).update(status_changed_at=timezone.now() - timedelta(hours=1))
+            return 'Photosynthesis'
+
+        def generate(text, max_questions, max_tickets, **kwargs):
+            requeued.append(jobs.requeue_stale(timedelta(minutes=30)))
+            return ([{'text': 'Q?', 'choices': ['a', 'b', 'c', 'd']}], [], llm_client.GenerationResult('groq'))
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, STREAM_GENERATION=False,
+                                                                       CHUNKED_GENERATION=False), \
+                mock.patch.object(jobs, 'extract_text_from_file', side_effect=slow_extract), \
+                mock.patch.object(llm_client, 'generate_all_from_text', side_effect=generate), \
+                self.assertLogs('polls.jobs', 'WARNING'):
+            for title in ('gone', 'slow'):
+                jobs.enqueue_document(Document.objects.create(
+                    file=SimpleUploadedFile(f'{title}.txt', title.encode()), title=title))
+            call_command('process_documents', '--once', stdout=StringIO())
+        doc = Document.objects.get()
+        # the deleted document did not stop the worker, and the heartbeat after extraction kept 'slow' from requeueing
+        self.assertEqual((doc.title, doc.status, doc.attempts, requeued), ('slow', 'done', 1, [0]))
+
+    def test_requeued_document_is_abandoned_by_its_old_worker(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from django.utils import timezone
+        from . import jobs
+        from .models import Document
+
+        def stalled_extract(path, **kwargs):
+            # the worker hung past the stale timeout and its document went back on the queue
+            Document.objects.update(status_changed_at=timezone.now() - timedelta(hours=1))
+            jobs.requeue_stale(timedelta(minutes=30))
+            return 'Photosynthesis'
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media), \
+                mock.patch.object(jobs, 'extract_text_from_file', side_effect=stalled_extract), \
+                self.assertLogs('polls.jobs', 'WARNING'):
+            doc = Document.objects.create(file=SimpleUploadedFile('notes.txt', b'notes'), title='Notes')
+            jobs.enqueue_document(doc)
+            jobs.process_document(jobs.claim_next_document())
+        doc.refresh_from_db()
+        self.assertEqual((doc.status, doc.generated_questions.count()), ('queued', 0))
+
+
+class PromptPackingTests(TestCase):
+    def test_clean_drops_headers_footers_and_repeated_lines(self):
+        from . import prompt_packing
+        from .utils import PAGE_BREAK
+
+        pages = [
+            f'BIO 101   Cell Biology\n\nStage {i}: the mito-\nchondria   produce ATP\nthrough respiration in stage {i}.\n'
+            f'Key idea: ATP is the energy currency.\nExample {i} follows on the next slide.\n  Page {i + 1} of 5 '
+            for i in range(5)
+        ]
+        self.assertEqual(prompt_packing.clean(PAGE_BREAK.join(pages)).split(PAGE_BREAK), [
+            f'Stage {i}: the mitochondria produce ATP through respiration in stage {i}.\n'
+            + ('Key idea: ATP is the energy currency.\n' if i == 0 else '')  # repeated lines are kept once
+            + f'Example {i} follows on the next slide.'
+            for i in range(5)
+        ])
+
+    def test_pack_keeps_whole_informative_sentences_within_the_budget(self):
+        from . import prompt_packing
+        from .utils import PAGE_BREAK
+
+        text = PAGE_BREAK.join([
+            'Photosynthesis turns light into chemical energy in the chloroplast. Thanks for listening.',
+            'Chlorophyll in the chloroplast absorbs light for photosynthesis. See you next week.',
+            'The Calvin cycle fixes carbon dioxide into sugar using chemical energy.',
+        ])
+        packed = prompt_packing.prepare(text, 35)
+        self.assertLessEqual(packed.tokens_after, 35)
+        self.assertEqual(packed.text, PAGE_BREAK.join([
+            'Photosynthesis turns light into chemical energy in the chloroplast.',
+            'The Calvin cycle fixes carbon dioxide into sugar using chemical energy.',
+        ]))
+        self.assertEqual(packed.tokens_saved, packed.tokens_before - packed.tokens_after)
+        self.assertEqual(prompt_packing.pack('Short enough.', 35), 'Short enough.')
+
+
+class QuestionIndexTests(TestCase):
+    def test_near_duplicate_questions_are_flagged_per_course(self):
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from . import question_index
+        from .models import Course, Document, GeneratedQuestion
+        prof = User.objects.create_user('prof', password='pw')
+        bio, chem = (Course.objects.create(name=n, created_by=prof, join_code=n.upper() * 2) for n in ('bio', 'chem'))
+
+        def upload(course, *texts, kind='mcq'):
+            doc = Document.objects.create(title='Deck', course=course)
+            return question_index.add_questions(doc, [GeneratedQuestion(document=doc, text=t, kind=kind) for t in texts])
+
+        original, = upload(bio, 'Which pigment absorbs most of the light used in the light reactions of photosynthesis?')
+        upload(bio, *[f'Unrelated question number {i} about topic {i * 7} and detail {i * 13}?' for i in range(200)])
+        near = 'Which pigment absorbs most of the light used in the light reactions during photosynthesis?'
+        # the document, one bucket lookup per new question, then both inserts in a savepoint,
+        # however many questions the course already has
+        with self.assertNumQueries(7):
+            again, fresh = upload(bio, near, 'What does the Calvin cycle produce?')
+        self.assertEqual((again.duplicate_of_id, fresh.duplicate_of_id), (original.id, None))
+        self.assertIsNone(upload(chem, near)[0].duplicate_of_id)  # other courses are separate
+        self.assertIsNone(upload(bio, near, kind='exit')[0].duplicate_of_id)
+        # repeats within one upload are caught too
+        first, second = upload(chem, 'Define osmosis in plant cells.', 'Define osmosis in plant cells')
+        self.assertEqual(second.duplicate_of_id, first.id)
+
+        with override_settings(QUESTION_DEDUP='suppress'):
+            self.assertEqual(upload(bio, near), [])
+        self.assertEqual(GeneratedQuestion.objects.filter(text=near, document__course=bio).count(), 2)
+
+        # uploads without a course are not pooled into one index across uploaders
+        loose, = upload(None, near)
+        self.assertIsNone(upload(None, near)[0].duplicate_of_id)
+        self.assertFalse(loose.buckets.exists())
+        first, second = upload(None, 'Define osmosis in plant cells.', 'Define osmosis in plant cells')
+        self.assertEqual(second.duplicate_of_id, first.id)
+
+
+class ConcurrentGenerationTests(TestCase):
+    def setUp(self):
+        from unittest import mock
+        from . import llm_guard, providers
+
+        patcher = mock.patch.dict(os.environ, {'GROQ_RATE_LIMIT': '0'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        llm_guard.reset()
+        self.addCleanup(llm_guard.reset)
+        providers.reset()
+
+    def _fake_client(self, delays):
+        import json
+        import time
+        from types import SimpleNamespace
+
+        def create(model, messages, **kwargs):
+            exit_ticket = 'exit ticket' in messages[1]['content']
+            time.sleep(delays['exit' if exit_ticket else 'mcq'])
+            items = [{'text': 'Reflect'}] if exit_ticket else [{'text': 'Q?', 'choices': ['a', 'b', 'c', 'd']}]
+            message = SimpleNamespace(content=json.dumps(items))
+            usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def test_generates_both_in_parallel_and_honours_deadline(self):
+        import time
+        from unittest import mock
+        from . import llm_client
+
+        with mock.patch.dict(os.environ, {'GROQ_API_KEY': 'test'}), mock.patch.object(llm_client, 'Groq', object):
+            with mock.patch.object(llm_client, '_get_client', return_value=self._fake_client({'mcq': 0.2, 'exit': 0.2})):
+                start = time.monotonic()
+                questions, tickets, result = llm_client.generate_all_from_text('material')
+                self.assertLess(time.monotonic() - start, 0.35)
+            self.assertEqual(questions[0]['text'], 'Q?')
+            self.assertEqual(tickets[0]['text'], 'Reflect')
+            self.assertEqual((result.source, result.prompt_tokens, result.completion_tokens), ('groq', 200, 40))
+
+            with mock.patch.object(llm_client, '_get_client', return_value=self._fake_client({'mcq': 0, 'exit': 1})):
+                questions, tickets, result = llm_client.generate_all_from_text('material', deadline=0.2)
+            self.assertEqual(questions[0]['text'], 'Q?')
+            self.assertEqual(tickets, llm_client.MOCK_EXIT_TICKETS)
+            self.assertEqual(result.source, 'mock')
+            self.assertIn('Generation deadline exceeded', result.errors)
+
+    def test_chunked_generation_covers_every_page_with_bounded_concurrency(self):
+        import json
+        import re
+        import threading
+        import time
+        from types import SimpleNamespace
+        from unittest import mock
+        from . import llm_client
+        from .utils import PAGE_BREAK
+
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def create(model, messages, **kwargs):
+            prompt = messages[1]['content']
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            topics = sorted(set(re.findall(r'topic(\d+)', prompt)))
+            if 'exit ticket' in prompt:
+                items = [{'text': f'Reflect on topic {topics[0]}'}]
+            else:
+                # every chunk also returns the same generic question, which must be merged away
+                items = [{'text': f'What is topic {t}?', 'choices': ['a', 'b', 'c', 'd']} for t in topics]
+                items.append({'text': 'Which slide was most important?', 'choices': ['a', 'b', 'c', 'd']})
+            message = SimpleNamespace(content=json.dumps(items))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        pages = [f'topic{i} ' + 'detail ' * 1000 for i in range(8)]  # ~7k chars each: one page per chunk
+        env = {'GROQ_API_KEY': 'test', 'GROQ_MAX_IN_FLIGHT': '3', 'GROQ_MAX_CHUNKS': '12'}
+        with mock.patch.dict(os.environ, env), mock.patch.object(llm_client, 'Groq', object), \
+                mock.patch.object(llm_client, '_get_client', return_value=client):
+            questions, tickets, result = llm_client.generate_chunked_from_text(
+                PAGE_BREAK.join(pages), max_tickets=3, questions_per_chunk=3
+            )
+        texts = [q['text'] for q in questions]
+        self.assertEqual(sorted(texts[:-1]), sorted(f'What is topic {i}?' for i in range(8)))
+        self.assertEqual(texts.count('Which slide was most important?'), 1)
+        self.assertEqual([t['text'] for t in tickets], ['Reflect on topic 0', 'Reflect on topic 4', 'Reflect on topic 7'])
+        self.assertEqual(result.source, 'groq')
+        self.assertLessEqual(state['peak'], 3)
+
+
+class LlmGuardTests(TestCase):
+    """Rate limiting, concurrency cap and circuit breaker, against a local fake Groq server."""
+
+    def setUp(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from unittest import mock
+        from . import llm_guard, providers
+
+        self.statuses = []  # status for each upcoming request; 200 once empty
+        self.requests = []
+        test = self
+
+        class FakeGroq(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                test.requests.append((time.monotonic(), body['model']))
+                status = test.statuses.pop(0) if test.statuses else 200
+                headers = {}
+                if status == 200:
+                    content = json.dumps([{'text': 'Q?', 'choices': ['a', 'b', 'c', 'd']}])
+                    payload = {
+                        'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': content}}],
+                    }
+                else:
+                    payload = {'error': {'message': f'status {status}', 'type': 'server_error'}}
+                    if status == 429:
+                        headers['Retry-After'] = '0.3'
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in {**headers, 'Content-Type': 'application/json',
+                                    'Content-Length': str(len(data))}.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGroq)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        patcher = mock.patch.dict(os.environ, {
+            'GROQ_API_KEY': 'test', 'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+            'GROQ_MODEL': 'primary', 'GROQ_FALLBACK_MODEL': 'fallback', 'GROQ_RATE_LIMIT': '0',
+            'GROQ_BREAKER_THRESHOLD': '2', 'GROQ_BREAKER_COOLDOWN': '0.3',
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        llm_guard.reset()
+        self.addCleanup(llm_guard.reset)
+        providers.reset()
+
+    def test_breaker_opens_on_server_errors_and_recovers(self):
+        from . import llm_client
+        if llm_client.Groq is None:
+            self.skipTest('groq is not installed')
+
+        self.statuses = [500, 503]
+        questions, _ = llm_client.generate_questions_from_text('material')
+        self.assertEqual(questions, llm_client.MOCK_QUESTIONS)
+        # the breaker opened after two failures, so the third model in the chain was never tried
+        self.assertEqual([model for _, model in self.requests], ['primary', 'fallback'])
+
+        questions, result = llm_client.generate_questions_from_text('material')
+        self.assertEqual(questions, llm_client.MOCK_QUESTIONS)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(result.errors, (llm_client.CIRCUIT_OPEN,))
+
+        time.sleep(0.35)  # cooldown over: one probe goes through and closes the breaker
+        questions, result = llm_client.generate_questions_from_text('material')
+        self.assertEqual(questions[0]['text'], 'Q?')
+        self.assertEqual(result.source, 'groq')
+
+    def test_rate_limited_response_holds_later_requests(self):
+        from . import llm_client
+        if llm_client.Groq is None:
+            self.skipTest('groq is not installed')
+
+        self.statuses = [429]
+        questions, _ = llm_client.generate_questions_from_text('material')
+        self.assertEqual(questions[0]['text'], 'Q?')
+        (first, _), (second, model) = self.requests
+        self.assertEqual(model, 'fallback')
+        self.assertGreaterEqual(second - first, 0.29)  # Retry-After was honoured
+
+    def test_token_bucket_and_concurrency_cap(self):
+        import threading
+        from . import llm_guard
+
+        bucket = llm_guard.TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(6):
+            self.assertTrue(bucket.acquire(timeout=1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)  # 2 from the burst, then 4 at 20/s
+        slow = llm_guard.TokenBucket(rate=0.1, burst=1)
+        self.assertTrue(slow.acquire(timeout=0))
+        self.assertFalse(slow.acquire(timeout=1))  # the next token is 10 s away: give up without waiting
+
+        guard = llm_guard.Guard(rate=0, burst=1, concurrency=2, threshold=0, cooldown=0, queue_timeout=5)
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def work():
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+
+        threads = [threading.Thread(target=guard.call, args=(work,)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(state['peak'], 2)
+
+    def test_chunked_generation_fits_its_fan_out_to_the_rate_limit(self):
+        from unittest import mock
+        from . import llm_client, llm_guard
+        from .utils import PAGE_BREAK
+        if llm_client.Groq is None:
+            self.skipTest('groq is not installed')
+
+        text = PAGE_BREAK.join(f'Page {i}: ' + 'photosynthesis ' * 800 for i in range(12))
+        with mock.patch.dict(os.environ, {'GROQ_RATE_LIMIT': '0.5', 'GROQ_RATE_BURST': '6', 'GROQ_QUEUE_TIMEOUT': '1'}):
+            llm_guard.reset()
+            self.assertEqual(llm_guard.capacity(), 6)
+            _, _, result = llm_client.generate_chunked_from_text(text, max_tickets=3)
+        # 3 chunks + 3 exit tickets fit the burst; 12 chunks would have timed out in the queue
+        self.assertEqual((result.source, len(self.requests)), ('groq', 6))
+        self.assertEqual(llm_guard.capacity(), 0)
+
+    MCQ = '[{"text": "What does \\"ATP\\" store?", "choices": ["energy", "light", "[water]", "{air}"]}, ' \
+          '{"text": "Where is chlorophyll?", "choices": ["a", "b", "c", "d"]}]'
+
+    def test_parser_emits_each_object_as_it_closes(self):
+        from .llm_client import JsonArrayParser
+
+        parser = JsonArrayParser()
+        text = 'Here you go:\n' + self.MCQ + ' trailing [prose]'
+        emitted = [(i, obj) for i, ch in enumerate(text) for obj in parser.feed(ch)]
+        self.assertEqual([obj['text'] for _, obj in emitted], ['What does "ATP" store?', 'Where is chlorophyll?'])
+        self.assertEqual(emitted[0][1]['choices'][2:], ['[water]', '{air}'])
+        self.assertEqual(text[emitted[0][0]], '}')  # not held back until the array ends
+        self.assertTrue(parser.finished)
+
+    def test_questions_arrive_before_the_completion_ends(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from unittest import mock
+        from . import llm_client, llm_guard, providers
+
+        mcq = self.MCQ
+
+        class StreamingGroq(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                content = '[{"text": "Reflect"}]' if 'exit ticket' in body['messages'][1]['content'] else mcq
+                cut = content.find('}, ') + 3
+                pieces = (content[:cut], content[cut:]) if cut > 2 else (content,)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(0.5)  # the rest of the completion is slow to arrive
+                    chunk = {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                             'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                    if i == len(pieces) - 1:
+                        chunk['x_groq'] = {'usage': {'prompt_tokens': 50, 'completion_tokens': 10, 'total_tokens': 60}}
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                    self.wfile.flush()
+                self.wfile.write(b'data: [DONE]\n\n')
+
+        if llm_client.Groq is None:
+            self.skipTest('groq is not installed')
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StreamingGroq)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        env = {'GROQ_API_KEY': 'test', 'GROQ_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+               'GROQ_RATE_LIMIT': '0'}
+        llm_guard.reset()
+        self.addCleanup(llm_guard.reset)
+        providers.reset()
+        with mock.patch.dict(os.environ, env):
+            start = time.monotonic()
+            items = llm_client.stream_all_from_text('material')
+            arrivals = [(kind, item['text'], time.monotonic() - start) for kind, item in items]
+        self.assertEqual(sorted((kind, text) for kind, text, _ in arrivals), [
+            ('exit', 'Reflect'), ('mcq', 'What does "ATP" store?'), ('mcq', 'Where is chlorophyll?'),
+        ])
+        first = next(t for kind, text, t in arrivals if kind == 'mcq')
+        self.assertLess(first, 0.4)
+        self.assertGreaterEqual(arrivals[-1][2], 0.5)
+        self.assertEqual((items.result.source, items.result.prompt_tokens, items.result.completion_tokens),
+                         ('groq', 100, 20))
+
+    def test_worker_stores_each_streamed_question(self):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from . import jobs, llm_client
+        from .models import Document
+
+        stored_before = []
+
+        def items():
+            yield 'mcq', {'text': 'Q1?', 'choices': ['a', 'b', 'c', 'd']}
+            stored_before.append(doc.generated_questions.count())  # the first is saved while the rest generate
+            yield 'mcq', {'text': 'A different second question?', 'choices': ['a', 'b', 'c', 'd']}
+            yield 'exit', {'text': 'Reflect', 'choices': []}
+            return llm_client.GenerationResult('groq', model='llama', latency=0.8)
+
+        def fake_stream(text, **kwargs):
+            return llm_client.GenerationStream(items())
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, CHUNKED_GENERATION=False), \
+                mock.patch.object(llm_client, 'stream_all_from_text', side_effect=fake_stream), \
+                mock.patch.object(jobs, 'extract_text_from_file', return_value='Photosynthesis'):
+            doc = Document.objects.create(file=SimpleUploadedFile('deck.txt', b'streamed'), title='Deck')
+            jobs.process_document(doc)
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, 'done')
+        self.assertEqual(stored_before, [1])
+        self.assertEqual((doc.generation_source, doc.generation_model, doc.generation_latency), ('groq', 'llama', 0.8))
+        self.assertEqual(sorted(doc.generated_questions.values_list('kind', 'text')), [
+            ('exit', 'Reflect'), ('mcq', 'A different second question?'), ('mcq', 'Q1?'),
+        ])
+
+
+class ProviderRoutingTests(TestCase):
+    """Routing between fake providers with different latency profiles."""
+
+    def setUp(self):
+        from unittest import mock
+        from . import providers
+
+        self.calls = []
+        self.fail = set()
+        patcher = mock.patch.dict(providers._registered, {
+            name: self._provider(name, delay) for name, delay in (('slow', 0.15), ('fast', 0.01), ('flaky', 0.0))
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        providers.reset()
+        self.addCleanup(providers.reset)
+
+    def _provider(self, name, delay):
+        import json
+        from . import providers
+
+        def complete(model, task):
+            self.calls.append(name)
+            time.sleep(delay)
+            if name in self.fail or 'broken' in task.user_prompt:
+                raise RuntimeError('503 Service Unavailable')
+            return providers.Completion(json.dumps([{'text': f'Asked {name}?', 'choices': ['a', 'b', 'c', 'd']}]),
+                                        providers.Usage(30, 12))
+
+        return providers.Provider(name=name, available=lambda: True, models=lambda task: [f'{name}-model'],
+                                  complete=complete, stream=None)
+
+    def _generate(self, env):
+        from unittest import mock
+        from . import llm_client
+
+        with mock.patch.dict(os.environ, env):
+            questions, self.result = llm_client.generate_questions_from_text('material')
+        return questions[0]['text']
+
+    def test_routes_to_the_fastest_healthy_provider(self):
+        from . import providers
+
+        env = {'LLM_PROVIDERS': 'slow,fast'}
+        for _ in range(providers.MIN_SAMPLES):
+            self.assertEqual(self._generate(env), 'Asked slow?')  # listed first, and fast is unmeasured
+        self.assertEqual(self._generate(env), 'Asked fast?')  # fast is now tried; once measured it stays ahead
+        for _ in range(providers.MIN_SAMPLES):
+            self._generate(env)
+        self.assertEqual(self.calls[-3:], ['fast', 'fast', 'fast'])
+        self.assertEqual((self.result.source, self.result.model), ('fast', 'fast-model'))
+        stats = providers.summary()
+        self.assertLess(stats['fast']['p95'], stats['slow']['p50'])
+        self.assertEqual(stats['slow/slow-model']['calls'], providers.MIN_SAMPLES)
+
+        # a provider failing most of its calls drops behind the slower healthy one
+        env = {'LLM_PROVIDERS': 'flaky,slow'}
+        self.fail.add('flaky')
+        for _ in range(providers.MIN_SAMPLES):
+            self.assertEqual(self._generate(env), 'Asked slow?')  # after falling back from flaky
+        self.calls.clear()
+        self.assertEqual(self._generate(env), 'Asked slow?')
+        self.assertEqual(self.calls, ['slow'])
+        self.assertEqual(providers.summary()['flaky']['error_rate'], 1.0)
+
+    def test_hedged_request_takes_the_first_answer(self):
+        env = {'LLM_PROVIDERS': 'slow,fast', 'LLM_HEDGE': '1', 'LLM_HEDGE_AFTER': '0.03'}
+        start = time.monotonic()
+        self.assertEqual(self._generate(env), 'Asked fast?')
+        self.assertLess(time.monotonic() - start, 0.12)  # did not wait for slow's 0.15 s
+        self.assertEqual(self.calls, ['slow', 'fast'])
+
+        env['LLM_HEDGE'] = '0'
+        self.assertEqual(self._generate(env), 'Asked slow?')  # without hedging slow has to fail first
+
+    def test_concurrent_generations_each_get_their_own_result(self):
+        import threading
+        from unittest import mock
+        from . import llm_client
+
+        results = {}
+        start = threading.Barrier(2)
+
+        def generate(text):
+            start.wait()
+            results[text] = llm_client.generate_questions_from_text(text)[1]
+
+        with mock.patch.dict(os.environ, {'LLM_PROVIDERS': 'slow'}):
+            threads = [threading.Thread(target=generate, args=(text,)) for text in ('material', 'broken material')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        ok, failed = results['material'], results['broken material']
+        self.assertEqual((ok.source, ok.model, ok.prompt_tokens, ok.completion_tokens, ok.errors),
+                         ('slow', 'slow-model', 30, 12, ()))
+        self.assertEqual((failed.source, failed.errors), ('mock', ('slow/slow-model: 503 Service Unavailable',)))
+        self.assertGreaterEqual(ok.latency, 0.15)
+
+    def test_claude_helper_returns_a_generation_result(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from . import claude_client
+
+        reply = SimpleNamespace(content=[SimpleNamespace(type='text', text='[{"text": "Why?", "choices": ["a", "b"]}]')],
+                                usage=SimpleNamespace(input_tokens=40, output_tokens=9))
+        sdk = mock.Mock()
+        sdk.Anthropic.return_value.messages.create.return_value = reply
+        with mock.patch.object(claude_client, 'anthropic', sdk), mock.patch.dict(claude_client._clients, clear=True), \
+                mock.patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'key', 'ANTHROPIC_MODEL': 'claude-test'}):
+            questions, result = claude_client.generate_questions_from_text('material')
+            self.assertEqual((questions[0]['text'], result.source, result.model), ('Why?', 'anthropic', 'claude-test'))
+            self.assertEqual((result.prompt_tokens, result.completion_tokens), (40, 9))
+
+            sdk.Anthropic.return_value.messages.create.side_effect = RuntimeError('overloaded')
+            questions, result = claude_client.generate_questions_from_text('material')
+        self.assertEqual((questions[0]['text'], result.source), (claude_client.MOCK_QUESTIONS[0]['text'], 'mock'))
+        self.assertEqual(result.errors, ('anthropic/claude-test: overloaded',))
+        self.assertEqual(sdk.Anthropic.call_count, 1)  # one client, reused
+
+    def test_claude_requests_go_through_their_own_circuit_breaker(self):
+        import importlib
+        from unittest import mock
+        from . import claude_client, llm_client, llm_guard, providers
+
+        importlib.reload(claude_client)  # register it again, an earlier test may have unregistered it
+
+        class Overloaded(Exception):
+            status_code = 529
+
+        sdk = mock.Mock()
+        create = sdk.Anthropic.return_value.messages.create
+        create.side_effect = Overloaded('overloaded')
+        env = {'LLM_PROVIDERS': 'anthropic', 'ANTHROPIC_API_KEY': 'key', 'ANTHROPIC_BREAKER_THRESHOLD': '2',
+               'ANTHROPIC_RATE_LIMIT': '0'}
+        llm_guard.reset()
+        self.addCleanup(llm_guard.reset)
+        with mock.patch.object(claude_client, 'anthropic', sdk), mock.patch.dict(claude_client._clients, clear=True), \
+                mock.patch.dict(os.environ, env):
+            anthropic, = providers.enabled()
+            for _ in range(2):
+                self.assertEqual(llm_client.generate_questions_from_text('material')[1].source, 'mock')
+            self.assertTrue(anthropic.down())
+            self.assertFalse(llm_guard.circuit_open())  # Groq's breaker is separate
+            questions, result = llm_client.generate_questions_from_text('material')
+        self.assertEqual(create.call_count, 2)  # the open breaker kept the third request from being sent
+        self.assertEqual(result.source, 'mock')
+        self.assertEqual(sdk.Anthropic.call_args.kwargs['max_retries'], 0)
+
+    def test_fingerprint_covers_every_enabled_provider_and_model(self):
+        from unittest import mock
+        from . import llm_client
+
+        def fingerprint(env):
+            with mock.patch.dict(os.environ, env):
+                return llm_client.generation_fingerprint()
+
+        self.assertIn('slow=slow-model', fingerprint({'LLM_PROVIDERS': 'slow'}))
+        self.assertIn('slow=slow-model;fast=fast-model', fingerprint({'LLM_PROVIDERS': 'slow,fast'}))
+        self.assertNotEqual(fingerprint({'LLM_PROVIDERS': 'slow'}), fingerprint({'LLM_PROVIDERS': 'fast'}))
@@ -9,17 +9,21 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('register/', views.register, name='register'),
     path('courses/', views.courses, name='courses'),
+    path('courses/<uuid:course_id>/export/', views.export_course, name='export_course'),
     path('join/', views.join_class, name='join_class'),
     path('student/', views.student_home, name='student_home'),
     path('upload/', views.upload_document, name='upload_document'),
     path('review/<uuid:doc_id>/', views.review_generated, name='review_generated'),
+    path('document/<uuid:doc_id>/status/', views.document_status, name='document_status'),
     path('document/<uuid:doc_id>/delete/', views.delete_document, name='delete_document'),
     path('manage/', views.manage_polls, name='manage_polls'),
     path('garden/', views.knowledge_garden_view, name='knowledge_garden'),
     path('poll/<uuid:poll_id>/', views.poll_display, name='poll_display'),
+    path('poll/<uuid:poll_id>/state/', views.poll_state_view, name='poll_state'),
     path('poll/<uuid:poll_id>/vote/', views.poll_vote, name='poll_vote'),
     path('poll/<uuid:poll_id>/submitted/', views.poll_submitted, name='poll_submitted'),
     path('poll/<uuid:poll_id>/results/', views.poll_results, name='poll_results'),
+    path('poll/<uuid:poll_id>/results/feed/', views.poll_results_feed, name='poll_results_feed'),
     path('poll/<uuid:poll_id>/toggle/', views.toggle_poll_open, name='toggle_poll_open'),
     path('poll/<uuid:poll_id>/toggle-active/', views.toggle_poll_open, name='toggle_poll_active'),
     path('poll/<uuid:poll_id>/delete/', views.delete_poll, name='delete_poll'),
@@ -28,6 +32,7 @@ urlpatterns = [
     path('exit/<uuid:ticket_id>/', views.exit_ticket_display, name='exit_ticket_display'),
     path('exit/<uuid:ticket_id>/submit/', views.exit_ticket_submit, name='exit_ticket_submit'),
     path('exit/<uuid:ticket_id>/results/', views.exit_ticket_results, name='exit_ticket_results'),
+    path('exit/<uuid:ticket_id>/export/', views.exit_ticket_export, name='exit_ticket_export'),
     path('submitted/', views.submitted_generic, name='submitted_generic'),
     path('exit/<uuid:ticket_id>/toggle/', views.toggle_ticket_active, name='toggle_ticket_active'),
     path('exit/<uuid:ticket_id>/delete/', views.delete_ticket, name='delete_ticket'),
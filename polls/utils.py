@@ -1,32 +1,125 @@
+import io
+import itertools
 import os
-from pdfminer.high_level import extract_text as extract_pdf_text
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
 from pptx import Presentation
 
+# Separator placed between pages/slides in extracted text (pdfminer's own page break)
+PAGE_BREAK = '\f'
 
-def extract_text_from_file(path: str) -> str:
-    """Extract text from PDF or PPTX file path. Returns concatenated text."""
-    if not os.path.exists(path):
-        return ""
-    lower = path.lower()
-    if lower.endswith('.pdf'):
-        try:
-            return extract_pdf_text(path)
-        except Exception:
-            return ''
-    if lower.endswith('.pptx') or lower.endswith('.ppt'):
+
+def _iter_pdf_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    rsrcmgr = PDFResourceManager(caching=True)
+    laparams = LAParams()
+    with open(path, 'rb') as fp:
+        for page in itertools.islice(PDFPage.get_pages(fp, caching=True), start, stop):
+            buf = io.StringIO()
+            device = TextConverter(rsrcmgr, buf, laparams=laparams)
+            try:
+                PDFPageInterpreter(rsrcmgr, device).process_page(page)
+            finally:
+                device.close()
+            yield buf.getvalue().rstrip(PAGE_BREAK)
+
+
+def _iter_pptx_slides(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    prs = Presentation(path)
+    for slide in itertools.islice(prs.slides, start, stop):
+        yield '\n'.join(shape.text for shape in slide.shapes if hasattr(shape, 'text'))
+
+
+def _is_pdf(path: str) -> bool:
+    return path.lower().endswith('.pdf')
+
+
+def _is_pptx(path: str) -> bool:
+    return path.lower().endswith(('.pptx', '.ppt'))
+
+
+def count_pages(path: str) -> int:
+    """Number of PDF pages or PPTX slides (0 for other files). Only the page tree is read."""
+    if _is_pdf(path):
+        with open(path, 'rb') as fp:
+            return sum(1 for _ in PDFPage.get_pages(fp))
+    if _is_pptx(path):
+        return len(Presentation(path).slides)
+    return 0
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    # runs in a pool worker, so it must stay a picklable module-level function
+    pages = _iter_pdf_pages(path, start, stop) if _is_pdf(path) else _iter_pptx_slides(path, start, stop)
+    return list(pages)
+
+
+def _iter_pages_parallel(path: str, total: int, workers: int) -> Iterator[str]:
+    # a few ranges per worker keeps them all busy when some pages are much heavier
+    size = max(1, -(-total // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_range, path, start, min(start + size, total))
+                   for start in range(0, total, size)]
         try:
-            prs = Presentation(path)
-            texts = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, 'text'):
-                        texts.append(shape.text)
-            return '\n'.join(texts)
-        except Exception:
-            return ''
-    # fallback: try to read as text
-    try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # the consumer may stop early or fail; don't parse ranges nobody reads
+            for future in futures:
+                future.cancel()
+
+
+def iter_text_from_file(path: str, workers: int = 1, min_parallel_pages: int = 0) -> Iterator[str]:
+    """Yield the text of a PDF page by page, or a PPTX slide by slide.
+
+    Parsing happens lazily, so callers that stop iterating early never pay for
+    the remaining pages. With ``workers > 1`` documents of at least
+    ``min_parallel_pages`` pages are split into page ranges parsed on a process
+    pool; pages are still yielded in order. Other files are yielded as a single chunk.
+    """
+    if not os.path.exists(path):
+        return
+    if (_is_pdf(path) or _is_pptx(path)) and workers > 1:
+        total = count_pages(path)
+        if total >= max(min_parallel_pages, 2):
+            yield from _iter_pages_parallel(path, total, workers)
+            return
+    if _is_pdf(path):
+        yield from _iter_pdf_pages(path)
+    elif _is_pptx(path):
+        yield from _iter_pptx_slides(path)
+    else:
         with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            return f.read()
+            yield f.read()
+
+
+def extract_text_from_file(path: str, max_chars: Optional[int] = None, max_pages: Optional[int] = None,
+                           workers: int = 1, min_parallel_pages: int = 0) -> str:
+    """Extract text from PDF or PPTX file path. Returns concatenated text.
+
+    Pages/slides are separated by ``PAGE_BREAK``. With ``max_chars`` or
+    ``max_pages`` extraction stops as soon as the budget is reached, and the
+    result is cut to ``max_chars``. ``workers``/``min_parallel_pages`` enable
+    the process pool (see ``iter_text_from_file``) for full extractions only;
+    a budget is usually met within the first few pages, which the pool would
+    not reach any sooner. Unreadable files give whatever text was extracted
+    before the error ('' if none).
+    """
+    if max_chars is not None or max_pages is not None:
+        workers = 1
+    pages = []
+    chars = 0
+    try:
+        for text in iter_text_from_file(path, workers=workers, min_parallel_pages=min_parallel_pages):
+            pages.append(text)
+            chars += len(text) + len(PAGE_BREAK)
+            if (max_pages is not None and len(pages) >= max_pages) or (max_chars is not None and chars >= max_chars):
+                break
     except Exception:
-        return ''
+        pass
+    text = PAGE_BREAK.join(pages)
+    return text[:max_chars] if max_chars is not None else text
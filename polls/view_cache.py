@@ -0,0 +1,109 @@
+"""Cached query results for the read-heavy list pages.
+
+``index``, ``manage_polls``, ``student_home`` and ``exit_ticket_results`` keep
+the rows they render in Django's cache (``CACHES['default']``, see
+CACHE_BACKEND). Rendered HTML is not cached: pages carry per-request CSRF tokens
+and messages.
+
+Entries are keyed on version counters for the scopes they depend on (a course,
+a professor, a student's enrollments, a ticket, the document list). Code that
+changes those rows calls one of the ``*_changed`` helpers, which bumps the
+counters so older entries are never read again and expire on their own after
+VIEW_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+import time
+from typing import Callable, Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Course, ExitTicket, Poll
+
+DOCUMENTS = 'documents'
+
+
+def course_scope(course_id) -> str:
+    return f'course:{course_id}'
+
+
+def professor_scope(user_id) -> str:
+    return f'professor:{user_id}'
+
+
+def student_scope(user_id) -> str:
+    return f'student:{user_id}'
+
+
+def ticket_scope(ticket_id) -> str:
+    return f'ticket:{ticket_id}'
+
+
+def _version_key(scope: str) -> str:
+    return f'view-version:{scope}'
+
+
+def _fresh_version() -> int:
+    # a lost counter restarts from the clock, never from a value an old entry was keyed on
+    return time.time_ns()
+
+
+def versions(scopes: Iterable[str]) -> List[int]:
+    """Return the current version of each scope, starting any that are missing."""
+    scopes = list(scopes)
+    found = cache.get_many([_version_key(s) for s in scopes])
+    result = []
+    for scope in scopes:
+        key = _version_key(scope)
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+        result.append(found[key])
+    return result
+
+
+def bump(*scopes: str) -> None:
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.set(_version_key(scope), _fresh_version(), None)
+
+
+def cached(name: str, scopes: Iterable[str], build: Callable):
+    """Return ``build()``, cached until one of ``scopes`` changes."""
+    scopes = list(scopes)
+    stamp = ','.join(f'{s}={v}' for s, v in zip(scopes, versions(scopes)))
+    key = f'view:{hashlib.md5(f"{name}|{stamp}".encode()).hexdigest()}'  # bounded length, safe characters
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.VIEW_CACHE_TIMEOUT)
+    return value
+
+
+def course_changed(course_id, professor_id=None) -> None:
+    """Polls or exit tickets of a course were created, changed or deleted."""
+    if course_id is None:
+        return  # only course polls and tickets are listed
+    if professor_id is None:
+        professor_id = Course.objects.filter(id=course_id).values_list('created_by_id', flat=True).first()
+    bump(course_scope(course_id), professor_scope(professor_id))
+
+
+def poll_changed(poll: Poll) -> None:
+    course_changed(poll.course_id)
+
+
+def ticket_changed(ticket: ExitTicket) -> None:
+    bump(ticket_scope(ticket.id))
+    course_changed(ticket.course_id)
+
+
+def enrollment_changed(user_id) -> None:
+    """``user_id`` joined, left or created a course."""
+    bump(student_scope(user_id), professor_scope(user_id))
+
+
+def documents_changed() -> None:
+    bump(DOCUMENTS)
@@ -1,8 +1,7 @@
-import os
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
@@ -21,12 +20,11 @@ from .models import (
     ExitTicket,
     ExitTicketResponse,
 )
-from .utils import extract_text_from_file
-from .llm_client import (
-    generate_questions_from_text,
-    generate_exit_tickets_from_text,
-    LAST_SOURCE as LLM_LAST_SOURCE,
-)
+from . import course_export, dashboards, exit_tickets, ingest, poll_cache, view_cache
+from .aggregation import build_results_context
+from .jobs import enqueue_document
+from .tallies import read_tallies, record_vote, tally_feed, tally_version
+from .live import get_poll_state, notify_changed, poll_state, wait_for_change
 
 
 # ========== EXISTING VIEWS ==========
@@ -35,7 +33,9 @@ def index(request):
     # Default landing. For professors, show their uploads; for others, a simple welcome.
     docs = []
     if request.user.is_authenticated and hasattr(request.user, 'profile') and request.user.profile.role == 'professor':
-        docs = Document.objects.filter(Q(course__created_by=request.user) | Q(course__isnull=True)).order_by('-uploaded_at')[:50]
+        docs = view_cache.cached(f'index:{request.user.id}', [view_cache.DOCUMENTS], lambda: list(
+            dashboards.professor_documents(request.user)
+        ))
     return render(request, 'polls/index.html', {'documents': docs})
 
 
@@ -108,26 +108,11 @@ def upload_document(request):
             f = form.cleaned_data['file']
             title = form.cleaned_data.get('title') or getattr(f, 'name', '')
             course = form.cleaned_data['course']
-            doc = Document.objects.create(file=f, title=title, course=course)
-            # extract text
-            text = extract_text_from_file(doc.file.path)
-            # generate multiple-choice questions
-            generated_mcq = generate_questions_from_text(text)
-            for item in generated_mcq:
-                GeneratedQuestion.objects.create(document=doc, text=item.get('text'), choices=item.get('choices', []), kind='mcq')
-            # generate exit ticket prompts (short response)
-            generated_exit = generate_exit_tickets_from_text(text, max_tickets=3)
-            for item in generated_exit:
-                GeneratedQuestion.objects.create(document=doc, text=item.get('text'), choices=[], kind='exit')
-            if LLM_LAST_SOURCE == 'groq':
-                messages.success(request, f"Generated {len(generated_mcq)} MCQs and {len(generated_exit)} exit tickets using Groq.")
-            else:
-                # Soften UX: avoid noisy error details; just inform about fallback
-                has_key = bool(os.getenv('GROQ_API_KEY'))
-                if not has_key:
-                    messages.info(request, f"Generated {len(generated_mcq)} MCQs and {len(generated_exit)} exit tickets (no API key configured).")
-                else:
-                    messages.info(request, f"Generated {len(generated_mcq)} MCQs and {len(generated_exit)} exit tickets using fallback content.")
+            doc = Document.objects.create(file=f, title=title, course=course, status='queued')
+            # text extraction and question generation run in the process_documents worker
+            enqueue_document(doc)
+            if doc.is_processing:
+                messages.info(request, f'"{title}" is being processed. Generated questions will appear here shortly.')
             return redirect('polls:review_generated', doc_id=doc.id)
     else:
         form = UploadForm()
@@ -135,9 +120,20 @@ def upload_document(request):
     return render(request, 'polls/upload.html', {'form': form})
 
 
+def document_status(request, doc_id):
+    """JSON processing status for a document; polled by the review page while it works."""
+    doc = get_object_or_404(Document, id=doc_id)
+    return JsonResponse({
+        'status': doc.status,
+        'status_display': doc.get_status_display(),
+        'error': doc.error,
+        'questions': doc.generated_questions.count(),
+    })
+
+
 def review_generated(request, doc_id):
     doc = get_object_or_404(Document, id=doc_id)
-    questions = doc.generated_questions.filter(status='pending')
+    questions = doc.generated_questions.filter(status='pending').select_related('duplicate_of')
     accepted_questions = doc.generated_questions.filter(status='accepted')
     rejected_questions = doc.generated_questions.filter(status='rejected')
     if request.method == 'POST':
@@ -168,16 +164,18 @@ def review_generated(request, doc_id):
                 correct_answer = request.POST.get('correct_answer', None)
                 if correct_answer:
                     correct_answer = int(correct_answer)
-                Poll.objects.create(
+                poll = Poll.objects.create(
                     question_text=q.text,
                     choices=q.choices,
                     question_format=question_format,
                     correct_answer=correct_answer,
                     course=q.document.course
                 )
+                view_cache.poll_changed(poll)
             else:
                 # create exit ticket
-                ExitTicket.objects.create(prompt_text=q.text, course=q.document.course)
+                ticket = ExitTicket.objects.create(prompt_text=q.text, course=q.document.course)
+                view_cache.ticket_changed(ticket)
 
             return redirect('polls:manage_polls')
         else:
@@ -190,7 +188,7 @@ def review_generated(request, doc_id):
         'questions': questions,
         'accepted_questions': accepted_questions,
         'rejected_questions': rejected_questions,
-        'groq_active': (LLM_LAST_SOURCE == 'groq')
+        'processing': doc.is_processing,
     })
 
 def knowledge_garden_view(request):
@@ -202,13 +200,39 @@ def knowledge_garden_view(request):
 
 
 def poll_display(request, poll_id):
-    poll = get_object_or_404(Poll, id=poll_id)
-    return render(request, 'polls/poll_display.html', {'poll': poll, 'hide_nav': True})
+    poll = poll_cache.get_poll(poll_id)
+    state = poll_state(poll.active, poll.countdown_started, poll.countdown_start_time)
+    return render(request, 'polls/poll_display.html', {'poll': poll, 'hide_nav': True, 'state_version': state['version']})
+
+
+@require_http_methods(['GET'])
+def poll_state_view(request, poll_id):
+    """JSON snapshot of a poll's live state.
+
+    With ``?wait=1&since=<version>`` the request is held (long-polled) until the
+    state changes or ``LIVE_LONG_POLL_TIMEOUT`` seconds pass, so waiting students
+    make one cheap request per change instead of reloading the page.
+    """
+    if request.GET.get('wait') == '1':
+        state = wait_for_change(
+            poll_id, 'state', lambda: get_poll_state(poll_id),
+            since=request.GET.get('since', ''),
+            timeout=settings.LIVE_LONG_POLL_TIMEOUT,
+            interval=settings.LIVE_LONG_POLL_INTERVAL,
+        )
+    else:
+        state = get_poll_state(poll_id)
+    if state is None:
+        raise Http404('Poll not found')
+    return JsonResponse(state)
 
 
 def poll_vote(request, poll_id):
-    poll = get_object_or_404(Poll, id=poll_id)
-    if request.method == 'POST':
+    # cached: this runs for every student at once, so the database should only see the write
+    poll = poll_cache.get_poll(poll_id)
+    if request.method == 'POST' and not poll.active:
+        messages.error(request, 'This poll is closed.')
+    elif request.method == 'POST':
         if poll.question_format == 'single_choice':
             # Single choice: store the choice index as an integer
             choice = int(request.POST.get('choice'))
@@ -251,187 +275,59 @@ def poll_vote(request, poll_id):
             choice = None
 
         if choice is not None:
-            PollResponse.objects.create(poll=poll, choice=choice)
+            if ingest.buffered():
+                ingest.submit(poll, choice)
+            else:
+                record_vote(poll, choice)
         return redirect('polls:poll_submitted', poll_id=poll.id)
     return redirect('polls:poll_display', poll_id=poll.id)
 
 
 def poll_submitted(request, poll_id):
-    poll = get_object_or_404(Poll, id=poll_id)
+    poll = poll_cache.get_poll(poll_id)
     return render(request, 'polls/submitted.html', {'poll': poll, 'hide_nav': True})
 
 
 def poll_results(request, poll_id):
+    poll = get_object_or_404(Poll.objects.select_related('tally'), id=poll_id)
+    tallies = read_tallies(poll)
+    context = build_results_context(poll, tallies)
+    context['tally_version'] = poll.tally.version if hasattr(poll, 'tally') else 0
+    return render(request, 'polls/results.html', context)
+
+
+@require_http_methods(['GET'])
+def poll_results_feed(request, poll_id):
+    """JSON feed of result counters that changed since the client's ``?since=<version>``.
+
+    Omit ``since`` for a full snapshot. With ``?wait=1`` the request is long-polled
+    until a newer version exists, so the projector can animate tallies live.
+    """
     poll = get_object_or_404(Poll, id=poll_id)
-    total = poll.responses.count()
-
-    if poll.question_format == 'single_choice':
-        # Count votes for each choice
-        counts_list = []
-        for i, _ in enumerate(poll.choices):
-            counts_list.append(poll.responses.filter(choice=i).count())
-        paired = list(zip(poll.choices, counts_list))
-        return render(request, 'polls/results.html', {
-            'poll': poll,
-            'paired': paired,
-            'total': total,
-            'format': 'single_choice'
-        })
-
-    elif poll.question_format == 'speed_ranking':
-        # For ranking: calculate how many times each choice was ranked at each position
-        num_choices = len(poll.choices)
-        # rank_counts[choice_idx][rank_position] = count
-        rank_counts = [[0] * num_choices for _ in range(num_choices)]
-
-        for response in poll.responses.all():
-            ranking = response.choice  # List of choice indices in rank order
-            for rank_pos, choice_idx in enumerate(ranking):
-                rank_counts[choice_idx][rank_pos] += 1
-
-        # Calculate average rank for each choice (lower is better)
-        avg_ranks = []
-        for choice_idx in range(num_choices):
-            total_rank = sum((rank_pos + 1) * count for rank_pos, count in enumerate(rank_counts[choice_idx]))
-            avg_rank = total_rank / total if total > 0 else 0
-            avg_ranks.append(avg_rank)
-
-        results_data = []
-        for i, choice_text in enumerate(poll.choices):
-            results_data.append({
-                'choice': choice_text,
-                'rank_counts': rank_counts[i],
-                'avg_rank': round(avg_ranks[i], 2)
-            })
-
-        return render(request, 'polls/results.html', {
-            'poll': poll,
-            'results_data': results_data,
-            'total': total,
-            'format': 'speed_ranking',
-            'num_choices': num_choices
-        })
-
-    elif poll.question_format == 'team_battle':
-        # Team battle: calculate correct answers for each side
-        left_correct = 0
-        left_total = 0
-        right_correct = 0
-        right_total = 0
-
-        for response in poll.responses.all():
-            response_data = response.choice
-
-            # Handle both old format (string) and new format (dict)
-            if isinstance(response_data, dict):
-                # New format: {"team": "left"/"right", "answer": choice_index}
-                team = response_data.get('team')
-                answer = response_data.get('answer')
-
-                if team == 'left':
-                    left_total += 1
-                    if answer == poll.correct_answer:
-                        left_correct += 1
-                elif team == 'right':
-                    right_total += 1
-                    if answer == poll.correct_answer:
-                        right_correct += 1
-            elif isinstance(response_data, str):
-                # Old format: just "left" or "right" - count as participation only
-                if response_data == 'left':
-                    left_total += 1
-                elif response_data == 'right':
-                    right_total += 1
-
-        # Calculate percentages
-        left_percentage = (left_correct / left_total * 100) if left_total > 0 else 0
-        right_percentage = (right_correct / right_total * 100) if right_total > 0 else 0
-
-        # Determine winner based on percentage of correct answers
-        if left_percentage > right_percentage:
-            winner = 'left'
-        elif right_percentage > left_percentage:
-            winner = 'right'
-        else:
-            winner = 'tie'
-
-        return render(request, 'polls/results.html', {
-            'poll': poll,
-            'left_count': left_total,
-            'right_count': right_total,
-            'left_correct': left_correct,
-            'right_correct': right_correct,
-            'left_percentage': round(left_percentage, 1),
-            'right_percentage': round(right_percentage, 1),
-            'total': total,
-            'winner': winner,
-            'format': 'team_battle'
-        })
-
-    elif poll.question_format == 'meta_prediction':
-        # Meta prediction: calculate actual percentages and average predictions
-        num_choices = len(poll.choices)
-        actual_counts = [0] * num_choices
-        avg_predictions = [0.0] * num_choices
-        prediction_totals = [0] * num_choices
-
-        for response in poll.responses.all():
-            response_data = response.choice  # {"predictions": [25, 30, 20, 25], "answer": choice_index}
-
-            # Count actual answers
-            actual_answer = response_data.get('answer')
-            actual_counts[actual_answer] += 1
-
-            # Sum up predictions for averaging
-            predictions = response_data.get('predictions', [])
-            for i, pred in enumerate(predictions):
-                prediction_totals[i] += pred
-
-        # Calculate average predictions and actual percentages
-        for i in range(num_choices):
-            avg_predictions[i] = round(prediction_totals[i] / total, 1) if total > 0 else 0
-
-        actual_percentages = []
-        for count in actual_counts:
-            actual_percentages.append(round((count / total * 100), 1) if total > 0 else 0)
-
-        # Calculate prediction accuracy (how close predictions were to reality)
-        accuracy_scores = []
-        for i in range(num_choices):
-            diff = abs(avg_predictions[i] - actual_percentages[i])
-            accuracy = max(0, 100 - diff)  # 100 = perfect, 0 = way off
-            accuracy_scores.append(round(accuracy, 1))
-
-        overall_accuracy = round(sum(accuracy_scores) / num_choices, 1) if num_choices > 0 else 0
-
-        results_data = []
-        for i in range(num_choices):
-            results_data.append({
-                'choice': poll.choices[i],
-                'predicted_pct': avg_predictions[i],
-                'actual_pct': actual_percentages[i],
-                'actual_count': actual_counts[i],
-                'accuracy': accuracy_scores[i]
-            })
-
-        return render(request, 'polls/results.html', {
-            'poll': poll,
-            'results_data': results_data,
-            'total': total,
-            'overall_accuracy': overall_accuracy,
-            'format': 'meta_prediction'
-        })
-
-    return render(request, 'polls/results.html', {'poll': poll, 'total': 0})
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
+    if since is not None and request.GET.get('wait') == '1':
+        wait_for_change(
+            poll.id, 'tally', lambda: {'version': str(tally_version(poll.id))},
+            since=str(since),
+            timeout=settings.LIVE_LONG_POLL_TIMEOUT,
+            interval=settings.LIVE_LONG_POLL_INTERVAL,
+        )
+    return JsonResponse(tally_feed(poll, since))
 
 
 def manage_polls(request):
     if not request.user.is_authenticated or not hasattr(request.user, 'profile') or request.user.profile.role != 'professor':
         messages.error(request, 'Professor access required.')
         return redirect('polls:index')
-    polls = Poll.objects.filter(course__created_by=request.user).order_by('-created_at')
-    tickets = ExitTicket.objects.filter(course__created_by=request.user).order_by('-created_at')
-    prof_courses = Course.objects.filter(created_by=request.user).order_by('name')
+    polls, tickets, prof_courses = view_cache.cached(
+        f'manage:{request.user.id}', [view_cache.professor_scope(request.user.id)], lambda: (
+            list(dashboards.professor_polls(request.user)),
+            list(dashboards.professor_tickets(request.user)),
+            list(dashboards.professor_courses(request.user)),
+        ))
     return render(request, 'polls/manage.html', {'polls': polls, 'tickets': tickets, 'courses': prof_courses})
 
 
@@ -446,6 +342,7 @@ def courses(request):
             join_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
             c = Course.objects.create(name=name, created_by=request.user, join_code=join_code)
             Enrollment.objects.create(user=request.user, course=c, role='professor')
+            view_cache.enrollment_changed(request.user.id)
             messages.success(request, f'Created class "{name}" with code {join_code}.')
             return redirect('polls:courses')
     else:
@@ -454,6 +351,23 @@ def courses(request):
     return render(request, 'polls/courses.html', {'form': form, 'courses': my_courses})
 
 
+@login_required
+def export_course(request, course_id):
+    """Stream every poll and exit-ticket response in a course (``?format=ndjson|csv|columns|parquet``)."""
+    course = get_object_or_404(Course, id=course_id)
+    if course.created_by != request.user:
+        return HttpResponseForbidden('Only the course owner can export its responses.')
+    fmt = request.GET.get('format', 'ndjson')
+    try:
+        chunks = course_export.export(course, fmt)
+    except course_export.ExportUnavailable as e:
+        return HttpResponseBadRequest(str(e))
+    _, content_type, extension = course_export.EXPORTERS[fmt]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="course-{course.id}.{extension}"'
+    return response
+
+
 @login_required
 def join_class(request):
     if request.method == 'POST':
@@ -466,6 +380,7 @@ def join_class(request):
                 messages.error(request, 'Invalid join code.')
             else:
                 Enrollment.objects.get_or_create(user=request.user, course=c, defaults={'role': 'student'})
+                view_cache.enrollment_changed(request.user.id)
                 messages.success(request, f'Joined class {c.name}.')
                 return redirect('polls:student_home')
     else:
@@ -476,10 +391,15 @@ def join_class(request):
 @login_required
 def student_home(request):
     # Show open polls across enrolled courses
-    enrolls = Enrollment.objects.filter(user=request.user).select_related('course')
-    course_ids = [e.course_id for e in enrolls]
-    open_polls = Poll.objects.filter(active=True, course_id__in=course_ids).order_by('-created_at')
-    open_tickets = ExitTicket.objects.filter(active=True, course_id__in=course_ids).order_by('-created_at')
+    user_id = request.user.id
+    course_ids = view_cache.cached(f'enrolled:{user_id}', [view_cache.student_scope(user_id)], lambda: list(
+        Enrollment.objects.filter(user=request.user).values_list('course_id', flat=True)
+    ))
+    open_polls, open_tickets = view_cache.cached(
+        f'student-home:{user_id}', [view_cache.course_scope(c) for c in course_ids], lambda: (
+            list(dashboards.student_polls(request.user)),
+            list(dashboards.student_tickets(request.user)),
+        ))
     return render(request, 'polls/student_home.html', {'open_polls': open_polls, 'open_tickets': open_tickets})
 
 
@@ -499,6 +419,9 @@ def toggle_poll_open(request, poll_id):
         else:
             p.active = not p.active
             p.save(update_fields=['active'])
+            poll_cache.invalidate(p.id)
+            view_cache.poll_changed(p)
+            notify_changed(p.id)
     return redirect('polls:manage_polls')
 
 
@@ -513,6 +436,7 @@ def exit_ticket_submit(request, ticket_id):
         answer = (request.POST.get('answer') or '').strip()
         if answer:
             ExitTicketResponse.objects.create(ticket=ticket, answer=answer)
+            view_cache.bump(view_cache.ticket_scope(ticket.id))
             # Redirect to generic thank-you page (same as MCQ submission UX)
             return redirect('polls:submitted_generic')
     return redirect('polls:exit_ticket_display', ticket_id=ticket.id)
@@ -520,9 +444,34 @@ def exit_ticket_submit(request, ticket_id):
 
 def exit_ticket_results(request, ticket_id):
     ticket = get_object_or_404(ExitTicket, id=ticket_id)
-    responses = ticket.responses.order_by('-created_at')[:200]
-    total = ticket.responses.count()
-    return render(request, 'polls/exit_ticket_results.html', {'ticket': ticket, 'responses': responses, 'total': total})
+    cursor = request.GET.get('cursor') or None
+    scopes = [view_cache.ticket_scope(ticket.id)]
+    try:
+        responses, next_cursor = view_cache.cached(
+            f'ticket-results:{ticket.id}:{cursor}', scopes, lambda: exit_tickets.response_page(ticket, cursor)
+        )
+    except exit_tickets.InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor.')
+    total = view_cache.cached(f'ticket-total:{ticket.id}', scopes, ticket.responses.count)
+    return render(request, 'polls/exit_ticket_results.html', {
+        'ticket': ticket,
+        'responses': responses,
+        'total': total,
+        'next_cursor': next_cursor,
+        'paged': cursor is not None,
+    })
+
+
+def exit_ticket_export(request, ticket_id):
+    """Stream every response to a ticket as CSV (default) or NDJSON (``?format=ndjson``)."""
+    ticket = get_object_or_404(ExitTicket, id=ticket_id)
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exit_tickets.EXPORTERS:
+        return HttpResponseBadRequest('Unknown export format.')
+    export, content_type = exit_tickets.EXPORTERS[fmt]
+    response = StreamingHttpResponse(export(ticket), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="exit-ticket-{ticket.id}.{fmt}"'
+    return response
 
 
 def submitted_generic(request):
@@ -539,6 +488,9 @@ def toggle_poll_active(request, poll_id):
             poll.countdown_started = False
             poll.countdown_start_time = None
         poll.save()
+        poll_cache.invalidate(poll.id)
+        view_cache.poll_changed(poll)
+        notify_changed(poll.id)
         status = "activated" if poll.active else "deactivated"
         messages.success(request, f'Poll "{poll.question_text[:50]}" has been {status}.')
     return redirect('polls:manage_polls')
@@ -548,6 +500,8 @@ def delete_poll(request, poll_id):
     poll = get_object_or_404(Poll, id=poll_id)
     if request.method == 'POST':
         poll.delete()
+        poll_cache.invalidate(poll_id)
+        view_cache.poll_changed(poll)
         messages.success(request, f'Poll "{poll.question_text[:50]}" has been deleted.')
     return redirect('polls:manage_polls')
 
@@ -556,6 +510,7 @@ def delete_document(request, doc_id):
     doc = get_object_or_404(Document, id=doc_id)
     if request.method == 'POST':
         doc.delete()
+        view_cache.documents_changed()
         messages.success(request, f'Document "{doc.title}" has been deleted.')
     return redirect('polls:index')
 
@@ -567,6 +522,8 @@ def start_countdown(request, poll_id):
         poll.countdown_started = True
         poll.countdown_start_time = timezone.now()
         poll.save()
+        poll_cache.invalidate(poll.id)
+        notify_changed(poll.id)
         messages.success(request, 'Countdown started! Students will see the 3-2-1-GO countdown.')
     return redirect('polls:poll_results', poll_id=poll.id)
 
@@ -577,6 +534,7 @@ def toggle_ticket_active(request, ticket_id):
     if request.method == 'POST':
         ticket.active = not ticket.active
         ticket.save()
+        view_cache.ticket_changed(ticket)
         status = "activated" if ticket.active else "deactivated"
         messages.success(request, f'Exit ticket "{ticket.prompt_text[:50]}" has been {status}.')
     return redirect('polls:manage_polls')
@@ -587,5 +545,6 @@ def delete_ticket(request, ticket_id):
     ticket = get_object_or_404(ExitTicket, id=ticket_id)
     if request.method == 'POST':
         ticket.delete()
+        view_cache.ticket_changed(ticket)
         messages.success(request, f'Exit ticket "{ticket.prompt_text[:50]}" has been deleted.')
     return redirect('polls:manage_polls')
\ No newline at end of file